@@ -12,7 +12,8 @@ CREATE TABLE IF NOT EXISTS users (
     u_name VARCHAR(255) NOT NULL UNIQUE,
     password VARCHAR(255) NOT NULL,
     register_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    is_deleted BOOLEAN DEFAULT FALSE
+    is_deleted BOOLEAN DEFAULT FALSE,
+    INDEX idx_users_active_name (is_deleted, u_name)  -- 用户名前缀搜索，只扫描未删除用户
 );
 
 -- 组织表
@@ -24,7 +25,22 @@ CREATE TABLE IF NOT EXISTS organizations (
     invite_code VARCHAR(255) NOT NULL,  -- 新增邀请码字段
     create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     is_deleted BOOLEAN DEFAULT FALSE,
-    FOREIGN KEY (creator_id) REFERENCES users(u_id)  -- 添加外键约束
+    parent_id INT UNSIGNED,  -- 父组织ID，顶级组织为空
+    invite_expire_time TIMESTAMP NULL,  -- 邀请码过期时间，为空表示不过期
+    UNIQUE KEY uk_organizations_invite_code (invite_code),  -- 按邀请码定位组织
+    FOREIGN KEY (creator_id) REFERENCES users(u_id),  -- 添加外键约束
+    FOREIGN KEY (parent_id) REFERENCES organizations(c_id)
+);
+
+-- 组织层级闭包表，保存每个组织到其所有子孙组织（含自身）的路径
+CREATE TABLE IF NOT EXISTS organization_closure (
+    ancestor_id INT UNSIGNED NOT NULL,
+    descendant_id INT UNSIGNED NOT NULL,
+    depth INT UNSIGNED NOT NULL,  -- 路径长度，自身为0
+    PRIMARY KEY (ancestor_id, descendant_id),
+    INDEX idx_closure_descendant (descendant_id, depth),
+    FOREIGN KEY (ancestor_id) REFERENCES organizations(c_id),
+    FOREIGN KEY (descendant_id) REFERENCES organizations(c_id)
 );
 
 -- 用户组织关系表
@@ -57,6 +73,26 @@ CREATE TABLE IF NOT EXISTS user_role (
     FOREIGN KEY (role_id) REFERENCES roles(role_id)
 );
 
+-- 周期任务模板表
+CREATE TABLE IF NOT EXISTS task_templates (
+    template_id INT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
+    c_id INT UNSIGNED NOT NULL,
+    publisher_id INT UNSIGNED NOT NULL,
+    task_name VARCHAR(255) NOT NULL,
+    task_desc TEXT,
+    time_limit INT,
+    priority TINYINT UNSIGNED DEFAULT 0,
+    cron_rule VARCHAR(255) NOT NULL,  -- 五段式cron规则
+    assignees JSON,  -- 轮流指派的用户ID列表，为空时发布为待接取任务
+    rotation_index INT UNSIGNED DEFAULT 0,  -- 下一次指派的轮换位置
+    next_run_time TIMESTAMP NULL,  -- 下一次尚未生成的发布时间
+    create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_deleted BOOLEAN DEFAULT FALSE,
+    INDEX idx_templates_next_run (is_deleted, next_run_time),
+    FOREIGN KEY (c_id) REFERENCES organizations(c_id),
+    FOREIGN KEY (publisher_id) REFERENCES users(u_id)
+);
+
 -- 任务表
 CREATE TABLE IF NOT EXISTS tasks (
     task_id INT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
@@ -70,7 +106,68 @@ CREATE TABLE IF NOT EXISTS tasks (
     is_deleted BOOLEAN DEFAULT FALSE,
     c_id INT UNSIGNED,
     task_desc TEXT,
+    priority TINYINT UNSIGNED DEFAULT 0,  -- 优先级，数值越大越优先
+    template_id INT UNSIGNED,  -- 由周期任务模板生成时的模板ID
+    INDEX idx_tasks_org_state_priority (c_id, task_state, priority DESC, task_id),  -- 按组织和状态统计任务、领取任务
+    INDEX idx_tasks_state_publish (task_state, publish_time),  -- 过期调度器按状态加载截止时间
+    UNIQUE KEY uk_tasks_template_occurrence (template_id, publish_time),  -- 周期任务每个发布时间只生成一次
+    FULLTEXT INDEX ft_tasks_name_desc (task_name, task_desc) WITH PARSER ngram,  -- 任务全文搜索，ngram分词支持中文
     FOREIGN KEY (publisher_id) REFERENCES users(u_id),
     FOREIGN KEY (receiver_id) REFERENCES users(u_id),
-    FOREIGN KEY (c_id) REFERENCES organizations(c_id)
+    FOREIGN KEY (c_id) REFERENCES organizations(c_id),
+    FOREIGN KEY (template_id) REFERENCES task_templates(template_id)
+);
+
+-- 组织任务计数表，与任务写操作在同一事务中增量维护
+CREATE TABLE IF NOT EXISTS org_task_counters (
+    c_id INT UNSIGNED NOT NULL,
+    task_state TINYINT UNSIGNED NOT NULL,
+    task_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (c_id, task_state)
+);
+
+-- 用户任务计数表，按任务接收者统计
+CREATE TABLE IF NOT EXISTS user_task_counters (
+    u_id INT UNSIGNED NOT NULL,
+    task_state TINYINT UNSIGNED NOT NULL,
+    task_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (u_id, task_state)
+);
+
+-- 组织成员积分表，period 为 all（全部）或 ISO 周（如 2024-W05），确认完成任务时累加
+CREATE TABLE IF NOT EXISTS member_scores (
+    c_id INT UNSIGNED NOT NULL,
+    period VARCHAR(10) NOT NULL,
+    u_id INT UNSIGNED NOT NULL,
+    score INT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (c_id, period, u_id),
+    INDEX idx_member_scores_rank (c_id, period, score)
+);
+
+-- 任务归档表，保存已结束且超过保留期的任务，结构与任务表一致，不设外键
+CREATE TABLE IF NOT EXISTS tasks_archive (
+    task_id INT UNSIGNED PRIMARY KEY,
+    task_name VARCHAR(255) NOT NULL,
+    publisher_id INT UNSIGNED NOT NULL,
+    receiver_id INT UNSIGNED,
+    task_state TINYINT UNSIGNED DEFAULT 0,
+    publish_time TIMESTAMP NULL,
+    time_limit INT,
+    completion_time TIMESTAMP NULL,
+    is_deleted BOOLEAN DEFAULT FALSE,
+    c_id INT UNSIGNED,
+    task_desc TEXT,
+    priority TINYINT UNSIGNED DEFAULT 0,
+    template_id INT UNSIGNED,
+    archived_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_tasks_archive_org (c_id, task_id)  -- 按组织分页查询历史任务
+);
+
+-- 组织分片目录，只在全局库中使用：记录组织所在分片，迁移分片期间冻结组织的写操作
+CREATE TABLE IF NOT EXISTS organization_shards (
+    c_id INT UNSIGNED PRIMARY KEY,
+    shard_name VARCHAR(64) NOT NULL,
+    is_frozen BOOLEAN NOT NULL DEFAULT FALSE,
+    update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_organization_shards_shard (shard_name)
 );
@@ -0,0 +1,82 @@
+"""
+数据库过载时的准入控制
+
+按加法增、乘法减（AIMD）调整允许同时处理的请求数：请求内数据库语句的平均耗时低于 slow_statement_ms 时
+每完成一个请求上限增加 1/上限（约每轮增加 1），语句变慢或请求超时时按 decrease_ratio 缩小（每个
+decrease_interval_seconds 最多一次）。不同优先级只能使用上限的一部分，数据库变慢时先拒绝低优先级的请求，
+登录和任务状态变更等高优先级请求最后才被拒绝。
+"""
+import threading
+import time
+
+PRIORITIES = ("high", "normal", "low")
+
+
+class AdmissionController:
+    def __init__(self, config):
+        self.min_limit = config['min_limit']
+        self.max_limit = config['max_limit']
+        self.limit = float(config['initial_limit'])
+        self.slow_statement = config['slow_statement_ms'] / 1000
+        self.decrease_ratio = config['decrease_ratio']
+        self.decrease_interval = config['decrease_interval_seconds']
+        self.retry_after = config['retry_after_seconds']
+        self.shares = config['priority_shares']
+        self.endpoints = config['endpoints']
+        self.inflight = 0
+        self.statement_seconds = 0.0
+        self.admitted = dict.fromkeys(PRIORITIES, 0)
+        self.rejected = dict.fromkeys(PRIORITIES, 0)
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def priority(self, endpoint):
+        return self.endpoints.get(endpoint, "normal")
+
+    def try_acquire(self, priority):
+        """
+        优先级的份额内还有空位时占用一个并返回 True，否则返回 False
+        """
+        with self._lock:
+            if self.inflight >= max(self.limit * self.shares[priority], 1):
+                self.rejected[priority] += 1
+                return False
+            self.inflight += 1
+            self.admitted[priority] += 1
+            return True
+
+    def release(self, db_seconds, statements, overloaded):
+        """
+        请求结束时归还名额，并根据请求内语句的平均耗时和是否超时调整上限
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.inflight -= 1
+            average = db_seconds / statements if statements else 0.0
+            # 语句平均耗时的指数移动平均，仅用于指标
+            self.statement_seconds += (average - self.statement_seconds) * 0.1
+            if overloaded or average > self.slow_statement:
+                if now - self._last_decrease >= self.decrease_interval:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_ratio)
+                    self._last_decrease = now
+            elif statements:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def metrics(self):
+        """
+        返回 Prometheus 文本格式的指标行
+        """
+        with self._lock:
+            lines = [
+                "# TYPE admission_limit gauge",
+                f"admission_limit {self.limit:.2f}",
+                "# TYPE admission_inflight gauge",
+                f"admission_inflight {self.inflight}",
+                "# TYPE admission_statement_seconds gauge",
+                f"admission_statement_seconds {self.statement_seconds:.6f}",
+                "# TYPE admission_admitted_total counter",
+            ]
+            lines += [f'admission_admitted_total{{priority="{name}"}} {count}' for name, count in self.admitted.items()]
+            lines.append("# TYPE admission_rejected_total counter")
+            lines += [f'admission_rejected_total{{priority="{name}"}} {count}' for name, count in self.rejected.items()]
+        return lines
@@ -1,17 +1,49 @@
+import asyncio
+import csv
 import datetime
-from flask import Flask, jsonify, request
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, decode_token
+import io
+import itertools
+import os
+from asgiref.sync import sync_to_async
+from flask import Flask, Response, g, jsonify, request
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, decode_token, verify_jwt_in_request
 from flask_openapi3 import OpenAPI, Info, Tag
 from pydantic import BaseModel
-from db_dao import EarthFighterDAO
+from db_async import AsyncEarthFighterDAO
+from db_dao import InviteCodeConflict
+from db_init import load_db_config
+from db_local import ThreadLocalDAO
+from db_sharding import ShardedEarthFighterDAO
+from background_jobs import JobLeader, TaskExpiryScheduler, RecurringTaskScheduler, TaskArchiver, TaskPartitionMaintainer
+from cron_rule import CronRule
+from admission import AdmissionController
+from rate_limiter import RateLimiter
+from leaderboard import Leaderboard
+from prefix_cache import PrefixCache
+from shared_cache import SharedCache
 from logger import LoggerFactory
 from config_manager import ConfigManager
 from ultils import generate_invite_code
+import request_context
 from schemas import *
 
-dao = EarthFighterDAO()
 logger = LoggerFactory.getLogger()
 cfg = ConfigManager()
+admission = AdmissionController(cfg.get_admission_config())
+user_search_config = cfg.get_user_search_config()
+user_prefix_cache = PrefixCache(user_search_config['cache_size'], user_search_config['cache_ttl_seconds'],
+                                user_search_config['max_results'])
+# 以下资源持有数据库连接、文件锁或线程，不能跨 fork 继承，由 create_app 在各进程中创建
+dao = None
+async_dao = None
+job_db_configs = None
+expiry_schedulers = None
+background_jobs = []
+job_leader = None
+leaderboard = None
+rate_limiter = None
+shared_cache = None
+_initialized_pid = None
 
 app_name =  "earth_fighter"
 
@@ -29,14 +61,161 @@ security = [{"jwt": []}]
 
 app = OpenAPI(__name__, info=info, security_schemes=security_schemes)
 jwt = JWTManager(app)
-app.config['JWT_SECRET_KEY'] = 'oa;shdpoignqopweh'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(days=7)
+# 仅用于本地开发，生产环境通过环境变量 JWT_SECRET_KEY 或 create_app 的 config 设置
+DEV_JWT_SECRET_KEY = 'oa;shdpoignqopweh'
+
+def create_app(config=None, start_jobs=True):
+    """
+    在当前进程中创建数据库连接、缓存客户端和后台任务等资源并返回应用，同一进程内重复调用直接返回
+
+    预派生的多进程部署由每个工作进程在 fork 之后调用，避免子进程继承父进程的数据库连接、文件锁和线程。
+    config 中的项覆盖 Flask 配置；start_jobs 为 True 时参与后台任务的选主，只有一个进程实际运行后台任务。
+    """
+    global dao, async_dao, job_db_configs, expiry_schedulers, background_jobs, job_leader, leaderboard, rate_limiter, \
+        shared_cache, _initialized_pid
+    if _initialized_pid == os.getpid():
+        return app
+    app.config.update(config or {})
+    if not app.config.get('JWT_SECRET_KEY'):
+        secret_key = os.environ.get('JWT_SECRET_KEY')
+        if not secret_key:
+            logger.warning("未设置环境变量JWT_SECRET_KEY，使用开发环境的默认密钥")
+            secret_key = DEV_JWT_SECRET_KEY
+        app.config['JWT_SECRET_KEY'] = secret_key
+
+    # 每个请求线程使用自己的 DAO（连接），这里先为当前线程建立连接，配置有误时启动即失败
+    dao = ThreadLocalDAO()
+    sharded = isinstance(dao.current(), ShardedEarthFighterDAO)
+    # 异步视图使用的连接在首次查询时才建立
+    async_dao = AsyncEarthFighterDAO(cfg.get_server_config()['async_dao_pool_size'])
+    # 分片部署时每个分片各运行一组后台任务，单库部署只有一组（键为 None，使用默认连接配置）
+    job_db_configs = dao.shard_db_configs() if sharded else {None: None}
+    expiry_schedulers = {shard: TaskExpiryScheduler(db_config) for shard, db_config in job_db_configs.items()}
+    background_jobs = list(expiry_schedulers.values())
+    for db_config in job_db_configs.values():
+        background_jobs += [RecurringTaskScheduler(db_config), TaskArchiver(db_config)]
+        if cfg.get_task_partitioning_config()['enabled']:
+            background_jobs.append(TaskPartitionMaintainer(db_config))
+    leaderboard = Leaderboard(dao)
+    rate_limiter = RateLimiter(cfg.get_rate_limit_config())
+    shared_cache = SharedCache.shared(load_db_config())
+    if shared_cache is not None:
+        # 其他工作进程修改或删除用户后，本进程的用户名前缀缓存同样失效
+        shared_cache.subscribe(lambda tags: user_prefix_cache.clear()
+                               if tags is None or any(tag.startswith("user") for tag in tags) else None)
+    if start_jobs:
+        server_config = cfg.get_server_config()
+        job_leader = JobLeader(background_jobs, server_config['job_lock_file'], server_config['job_lock_retry_seconds'])
+        job_leader.start()
+    _initialized_pid = os.getpid()
+    return app
+
+def shutdown_app():
+    """
+    工作进程退出前停止后台任务并关闭数据库连接
+    """
+    if job_leader is not None:
+        job_leader.stop()
+    if async_dao is not None:
+        async_dao.close()
+    if dao is not None:
+        dao.close()
 
 # 定义标签
 auth_tag = Tag(name="用户认证", description="用户认证相关操作")
 user_tag = Tag(name="用户管理", description="用户管理API")
 org_tag = Tag(name="组织管理", description="组织管理API")
 task_tag = Tag(name="任务管理", description="任务管理API")
+batch_tag = Tag(name="批量请求", description="批量请求API")
+system_tag = Tag(name="系统状态", description="系统运行状态API")
+
+def expiry_scheduler_for(c_id):
+    """
+    返回负责该组织任务过期的调度器
+    """
+    if isinstance(dao.current(), ShardedEarthFighterDAO):
+        return expiry_schedulers[dao.shard_name(c_id)]
+    return expiry_schedulers[None]
+
+@app.before_request
+def bind_request_context():
+    """
+    绑定当前请求的用户和截止时间，供读写分离判断读己之写，并限制数据库语句的执行时间
+    """
+    user_id = None
+    try:
+        if verify_jwt_in_request(optional=True):
+            user_id = get_jwt_identity()
+    except Exception:
+        # 令牌无效时由各接口的 jwt_required 返回错误，这里只按匿名请求处理
+        pass
+    deadline_config = cfg.get_request_deadline_config()
+    timeout = deadline_config['endpoints'].get(request.endpoint, deadline_config['default_seconds'])
+    request_context.begin(user_id, timeout or None)
+
+@app.after_request
+def apply_request_deadline(response):
+    # 各接口捕获异常后返回 500，这里统一改为 503，提示客户端稍后重试
+    if request_context.deadline_exceeded():
+        logger.warning(f"请求{request.method} {request.path}超过时间预算")
+        response = jsonify({"message": "请求处理超时，请稍后重试"})
+        response.status_code = 503
+    return response
+
+@app.teardown_request
+def unbind_request_context(exc):
+    request_context.end()
+
+@app.before_request
+def limit_request_rate():
+    """
+    按接口的令牌桶限流，已登录的请求按用户计数，未登录的请求按客户端 IP 计数，超过限制时返回 429
+    """
+    if request.endpoint is None:
+        return None
+    user_id = request_context.current_user_id()
+    if user_id is None:
+        # 批量请求的子请求没有真实的客户端地址，匿名子请求只计入外层请求
+        if request_context.nested():
+            return None
+        client = f"ip:{request.remote_addr}"
+    else:
+        client = f"user:{user_id}"
+    allowed, retry_after = rate_limiter.check(request.endpoint, client)
+    if not allowed:
+        logger.warning(f"{client}请求{request.method} {request.path}过于频繁")
+        response = jsonify({"message": "请求过于频繁，请稍后重试"})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+@app.before_request
+def admit_request():
+    """
+    按接口优先级做准入控制，超过当前并发上限时返回 503 和 Retry-After
+    """
+    # 批量请求的子请求已占用外层请求的名额；文档等非业务接口不做限制
+    if request_context.nested() or request.endpoint is None or '.' in request.endpoint:
+        return None
+    priority = admission.priority(request.endpoint)
+    if priority == "exempt":
+        return None
+    if not admission.try_acquire(priority):
+        logger.warning(f"服务繁忙，拒绝{priority}优先级请求{request.method} {request.path}")
+        response = jsonify({"message": "服务繁忙，请稍后重试"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(admission.retry_after)
+        return response
+    g.admitted = True
+
+# 在 unbind_request_context 之后注册，teardown 逆序执行，此时请求上下文仍可读取
+@app.teardown_request
+def release_admission(exc):
+    # 批量请求的子请求与外层请求共用 g，名额由外层请求结束时归还
+    if not request_context.nested() and g.pop('admitted', False):
+        db_seconds, statements = request_context.db_time()
+        admission.release(db_seconds, statements, request_context.deadline_exceeded())
 
 # 用户管理API
 @app.post("/users/create",
@@ -66,6 +245,7 @@ def create_user(body: UserModel):
             logger.error("添加用户时角色不存在")
             return jsonify({"message": "添加用户失败"}), 400
         dao.assign_user_role(u_id, role_id)
+        user_prefix_cache.clear()
         response = {
             "message": "User created successfully",
             "user_id": u_id,
@@ -147,6 +327,7 @@ def delete_user(path: UserPath):
         # 删除用户
         rows_affected = dao.delete_user(u_id)
         if rows_affected > 0:
+            user_prefix_cache.clear()
             return jsonify({"message": "User deleted successfully"}), 200
         else:
             return jsonify({"message": "User not found"}), 404
@@ -181,6 +362,7 @@ def update_user_name(path: UserPath, body: UserNameModel):
 
         rows_affected = dao.update_user(u_id, new_username)
         if rows_affected > 0:
+            user_prefix_cache.clear()
             return jsonify({"message": "User updated successfully"}), 200
         else:
             return jsonify({"message": "User not found"}), 404
@@ -250,6 +432,32 @@ def get_user_info(path: UserPath):
         logger.error(f"获取用户信息时发生错误: {e}")
         return jsonify({"message": "failed to get user info", "error": str(e)}), 500
 
+# 按用户名前缀搜索用户
+@app.get('/users/search',
+         tags=[user_tag],
+         summary="按用户名前缀搜索用户",
+         responses={"200": {"description": "用户搜索成功"}},
+         security=security)
+@jwt_required()
+def search_users(query: UserSearchQuery):
+    """
+    用户名自动补全，热门前缀的结果缓存在进程内
+    """
+    try:
+        prefix = query.prefix.strip()
+        if not prefix:
+            return jsonify({"message": "前缀不能为空"}), 400
+
+        users = user_prefix_cache.get(prefix, key=lambda user: user['username'])
+        if users is None:
+            # 多取一条用于判断结果是否完整，完整的结果可以直接用于更长前缀的查询
+            users = dao.search_users_by_prefix(prefix, user_search_config['max_results'] + 1)
+            user_prefix_cache.put(prefix, users)
+        return jsonify({"message": "OK", "data": users[:query.limit]}), 200
+    except Exception as e:
+        logger.error(f"搜索用户时发生错误: {e}")
+        return jsonify({"message": "搜索用户失败", "error": str(e)}), 500
+
 # 根据用户名查询用户信息
 @app.get('/users/<string:username>/info',
         tags=[user_tag],
@@ -303,13 +511,13 @@ def get_user_organizations():
          responses={"200": {"description": "用户任务列表获取成功"}},
          security=security)
 @jwt_required()
-def get_user_tasks():
+def get_user_tasks(query: TaskListQuery):
     """
-    获取用户任务列表
+    获取用户任务列表，可通过 since 只获取近期发布的任务
     """
     try:
         user_id = int(get_jwt_identity())
-        tasks = dao.get_tasks_by_user(user_id)
+        tasks = dao.get_tasks_by_user(user_id, query.since)
         if tasks:
             return jsonify({"message": "OK", "data": tasks}), 200
         else:
@@ -318,6 +526,60 @@ def get_user_tasks():
         logger.error(f"获取用户任务列表时发生错误: {e}")
         return jsonify({"message": "error", "error": str(e)}), 500
 
+# 获取用户首页概览
+@app.get('/users/me/overview',
+         tags=[user_tag],
+         summary="获取用户首页概览",
+         responses={"200": {"description": "用户首页概览获取成功"}},
+         security=security)
+@jwt_required()
+def get_user_overview(query: OverviewQuery):
+    """
+    一次请求返回用户信息、所属组织、最新的 limit 个用户任务以及各组织待接取/进行中的任务数量
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        profile = dao.get_user_all_info(user_id)
+        if not profile:
+            return jsonify({"message": "User info get fail"}), 404
+
+        organizations = dao.get_user_organizations(user_id)
+        tasks = dao.get_tasks_by_user(user_id, limit=query.limit + 1)
+
+        # 对所有组织批量统计任务数量，避免逐个组织查询
+        task_status = cfg.get_task_status()
+        states = {task_status['pending']: 'pending', task_status['in_progress']: 'in_progress'}
+        counts = dao.get_task_counts_by_organizations([org['c_id'] for org in organizations], list(states))
+        for org in organizations:
+            org_counts = counts.get(org['c_id'], {})
+            org['task_counts'] = {name: org_counts.get(state, 0) for state, name in states.items()}
+        user_counts = dao.get_user_task_counters(user_id)
+
+        data = {
+            "profile": profile,
+            "organizations": organizations,
+            "tasks": tasks[:query.limit],
+            "tasks_has_more": len(tasks) > query.limit,
+            "task_counts": {name: user_counts.get(state, 0) for name, state in task_status.items()}
+        }
+        return jsonify({"message": "OK", "data": data}), 200
+    except Exception as e:
+        logger.error(f"获取用户首页概览时发生错误: {e}")
+        return jsonify({"message": "error", "error": str(e)}), 500
+
+def with_new_invite_code(operation):
+    """
+    生成新的邀请码并执行 operation(invite_code)，邀请码与已有组织冲突时重新生成，返回(邀请码, operation的返回值)
+    """
+    config = cfg.get_invite_code_config()
+    for _ in range(config['max_attempts']):
+        invite_code = generate_invite_code(config['length'])
+        try:
+            return invite_code, operation(invite_code)
+        except InviteCodeConflict:
+            logger.warning(f"邀请码{invite_code}已被使用，重新生成")
+    raise RuntimeError("生成邀请码失败，请重试")
+
 # 组织管理API
 @app.post('/organizations/create',
          tags=[org_tag],
@@ -337,15 +599,25 @@ def create_organization(body: OrganizationModel):
         if dao.check_organization_exists(body.c_name):
             return jsonify({"message": "组织名已存在"}), 400
 
-        # 生成随机邀请码
-        invite_code = generate_invite_code()
-
         # 校验类型是否有效
         if not cfg.is_org_type_valid(body.c_type):
             return jsonify({"message": "无效的组织类型"}), 400
 
+        # 校验父组织，只有父组织的创建者才能在其下创建更低层级的组织
+        if body.parent_id is not None:
+            parent = dao.get_organization(body.parent_id)
+            if not parent:
+                return jsonify({"message": "父组织不存在"}), 404
+            if not dao.is_organization_creator(body.parent_id, creator_id):
+                return jsonify({"message": "只有父组织的创建者才能创建子组织"}), 403
+            if not cfg.can_be_child_of(body.c_type, parent['c_type']):
+                return jsonify({"message": "组织类型不能作为该父组织的下级"}), 400
+
         # 使用参数化查询防止 SQL 注入
-        c_id = dao.add_organization(body.c_name, body.c_type, creator_id, invite_code)
+        # 生成不重复的随机邀请码
+        invite_ttl = cfg.get_invite_code_config()['ttl_seconds']
+        invite_code, c_id = with_new_invite_code(
+            lambda code: dao.add_organization(body.c_name, body.c_type, creator_id, code, body.parent_id, invite_ttl))
 
         # 自动将创建者加入组织
         dao.add_user_to_organization(creator_id, c_id)
@@ -355,7 +627,8 @@ def create_organization(body: OrganizationModel):
             "c_id": c_id,
             "c_name": body.c_name,
             "c_type": body.c_type,
-            "invite_code": invite_code 
+            "invite_code": invite_code,
+            "parent_id": body.parent_id
         }
         return jsonify(response), 201
     except Exception as e:
@@ -419,13 +692,123 @@ def delete_organization(path: OrgPath):
         logger.error(f"删除组织时发生错误: {e}")
         return jsonify({"message": "删除组织失败", "error": str(e)}), 500
 
+@app.put('/organizations/<int:c_id>/move',
+         tags=[org_tag],
+         summary="移动组织",
+         responses={"200": {"description": "组织移动成功"}},
+         security=security)
+@jwt_required()
+def move_organization(path: OrgPath, body: OrgMoveModel):
+    """
+    将组织及其子组织移动到新的父组织下
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        org_info = dao.get_organization(c_id)
+        if not org_info:
+            return jsonify({"message": "组织不存在"}), 404
+        if not dao.is_organization_creator(c_id, user_id):
+            return jsonify({"message": "只有组织的创建者才能移动该组织"}), 403
+
+        parent_id = body.parent_id
+        if parent_id is not None:
+            parent = dao.get_organization(parent_id)
+            if not parent:
+                return jsonify({"message": "父组织不存在"}), 404
+            if not dao.is_organization_creator(parent_id, user_id):
+                return jsonify({"message": "只有父组织的创建者才能移入子组织"}), 403
+            if dao.is_descendant_organization(parent_id, c_id):
+                return jsonify({"message": "不能移动到自身或子组织下"}), 400
+            if not cfg.can_be_child_of(org_info['c_type'], parent['c_type']):
+                return jsonify({"message": "组织类型不能作为该父组织的下级"}), 400
+
+        dao.move_organization(c_id, parent_id)
+        return jsonify({"message": "Organization moved successfully"}), 200
+    except Exception as e:
+        logger.error(f"移动组织时发生错误: {e}")
+        return jsonify({"message": "移动组织失败", "error": str(e)}), 500
+
+@app.get('/organizations/<int:c_id>/subtree/tasks',
+         tags=[org_tag],
+         summary="获取组织子树任务列表",
+         responses={"200": {"description": "组织子树任务列表获取成功"}},
+         security=security)
+@jwt_required()
+def get_subtree_tasks(path: OrgPath, query: SubtreeTaskQuery):
+    """
+    获取组织及其所有子孙组织中的任务
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "无权限"}), 403
+
+        offset = (query.page - 1) * query.page_size
+        tasks = dao.get_subtree_tasks(c_id, query.task_state, query.page_size, offset, query.since)
+        return jsonify({"message": "OK", "data": tasks}), 200
+    except Exception as e:
+        logger.error(f"获取组织子树任务列表时发生错误: {e}")
+        return jsonify({"message": "获取组织子树任务列表失败", "error": str(e)}), 500
+
+@app.get('/organizations/<int:c_id>/subtree/members',
+         tags=[org_tag],
+         summary="获取组织子树成员列表",
+         responses={"200": {"description": "组织子树成员列表获取成功"}},
+         security=security)
+@jwt_required()
+def get_subtree_members(path: OrgPath, query: PageQuery):
+    """
+    获取组织及其所有子孙组织中的成员
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "无权限"}), 403
+
+        offset = (query.page - 1) * query.page_size
+        members = dao.get_subtree_members(c_id, query.page_size, offset)
+        return jsonify({"message": "OK", "data": members}), 200
+    except Exception as e:
+        logger.error(f"获取组织子树成员列表时发生错误: {e}")
+        return jsonify({"message": "获取组织子树成员列表失败", "error": str(e)}), 500
+
+@app.get('/organizations/<int:c_id>/subtree/stats',
+         tags=[org_tag],
+         summary="获取组织子树统计",
+         responses={"200": {"description": "组织子树统计获取成功"}},
+         security=security)
+@jwt_required()
+def get_subtree_stats(path: OrgPath):
+    """
+    统计组织及其所有子孙组织的组织数、成员数和各状态任务数
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "无权限"}), 403
+
+        stats = dao.get_subtree_stats(c_id)
+        state_names = {value: name for name, value in cfg.get_task_status().items()}
+        stats['task_counts'] = {state_names.get(state, state): count for state, count in stats['task_counts'].items()}
+        return jsonify({"message": "OK", "data": stats}), 200
+    except Exception as e:
+        logger.error(f"获取组织子树统计时发生错误: {e}")
+        return jsonify({"message": "获取组织子树统计失败", "error": str(e)}), 500
+
 @app.put('/organizations/<int:c_id>/join',
         tags=[org_tag],
         summary="加入组织",
         responses={"200": {"description": "组织加入成功"}},
         security=security)
 @jwt_required()
-def join_organization(path: OrgPath,body: OrganizationModel):
+async def join_organization(path: OrgPath,body: OrganizationModel):
     """
     加入组织
     """
@@ -437,26 +820,94 @@ def join_organization(path: OrgPath,body: OrganizationModel):
         if not org_id or not invite_code:
             return jsonify({"message": "组织ID和邀请码不能为空"}), 400
 
+        if request_context.nested():
+            # 批量请求的子请求在外层事务中执行，需在请求线程的连接上查询才能看到前序子请求未提交的写入
+            org_info, db_now, is_member = await sync_to_async(lambda: (
+                dao.get_organization(org_id),
+                dao.get_db_now(),
+                dao.is_user_in_organization(user_id, org_id)))()
+        else:
+            # 组织信息、数据库时间和成员关系相互独立，并发查询
+            org_info, db_now, is_member = await asyncio.gather(
+                async_dao.get_organization(org_id),
+                async_dao.get_db_now(),
+                async_dao.is_user_in_organization(user_id, org_id))
         # 校验组织是否存在
-        org_info = dao.get_organization(org_id)
         if not org_info:
             return jsonify({"message": "组织不存在"}), 404
 
         # 校验邀请码是否匹配
         if org_info['invite_code'] != invite_code:
             return jsonify({"message": "邀请码不匹配"}), 403
+        if org_info['invite_expire_time'] and org_info['invite_expire_time'] <= db_now:
+            return jsonify({"message": "邀请码已过期"}), 403
 
         # 校验用户是否已经加入该组织
-        if dao.is_user_in_organization(user_id, org_id):
+        if is_member:
             return jsonify({"message": "用户已经加入该组织"}), 409
 
-        # 加入组织
-        dao.add_user_to_organization(user_id, org_id)
+        # 加入组织，写入在请求线程的连接上执行，批量请求中与其他子请求处于同一事务
+        await sync_to_async(lambda: dao.add_user_to_organization(user_id, org_id))()
         return jsonify({"message": "成功加入组织", "data": org_info}), 200
     except Exception as e:
         logger.error(f"user:{user_id}加入组织{org_id}时发生错误: {e}")
         return jsonify({"message": "加入组织失败", "error": str(e)}), 500
 
+@app.post('/organizations/join',
+          tags=[org_tag],
+          summary="凭邀请码加入组织",
+          responses={"200": {"description": "组织加入成功"}},
+          security=security)
+@jwt_required()
+def join_organization_by_invite_code(body: InviteCodeModel):
+    """
+    只凭邀请码加入组织，邀请码通过唯一索引定位组织
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        invite_code = body.invite_code.strip()
+
+        c_id, joined = dao.join_organization_by_invite_code(user_id, invite_code)
+        if c_id is None:
+            return jsonify({"message": "邀请码无效或已过期"}), 404
+        if not joined:
+            # 未写入时区分已是成员和邀请码恰好在两步之间失效
+            if dao.is_user_in_organization(user_id, c_id):
+                return jsonify({"message": "用户已经加入该组织"}), 409
+            return jsonify({"message": "邀请码无效或已过期"}), 404
+        return jsonify({"message": "成功加入组织", "data": dao.get_organization(c_id)}), 200
+    except Exception as e:
+        logger.error(f"凭邀请码加入组织时发生错误: {e}")
+        return jsonify({"message": "加入组织失败", "error": str(e)}), 500
+
+@app.post('/organizations/<int:c_id>/invite-code/rotate',
+          tags=[org_tag],
+          summary="更换组织邀请码",
+          responses={"200": {"description": "邀请码更换成功"}},
+          security=security)
+@jwt_required()
+def rotate_invite_code(path: OrgPath):
+    """
+    生成新的邀请码并重置过期时间，旧邀请码立即失效
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 只有组织的创建者才能更换邀请码
+        if not dao.is_organization_creator(c_id, user_id):
+            return jsonify({"message": "只有组织的创建者才能更换邀请码"}), 403
+
+        invite_ttl = cfg.get_invite_code_config()['ttl_seconds']
+        invite_code, rows_affected = with_new_invite_code(lambda code: dao.rotate_invite_code(c_id, code, invite_ttl))
+        if rows_affected == 0:
+            return jsonify({"message": "组织不存在"}), 404
+        org_info = dao.get_organization(c_id)
+        data = {"invite_code": invite_code, "invite_expire_time": org_info['invite_expire_time'] if org_info else None}
+        return jsonify({"message": "邀请码更换成功", "data": data}), 200
+    except Exception as e:
+        logger.error(f"更换邀请码时发生错误: {e}")
+        return jsonify({"message": "更换邀请码失败", "error": str(e)}), 500
+
 @app.put('/organizations/<int:c_id>/leave',
         tags=[org_tag],
         summary="离开组织",
@@ -490,6 +941,108 @@ def leave_organization(path: OrgPath):
         logger.error(f"user:{user_id}离开组织{org_id}时发生错误: {e}")
         return jsonify({"message": "离开组织失败", "error": str(e)}), 500
 
+def read_member_import_rows():
+    """
+    逐行读取成员导入数据，支持JSON列表和流式CSV，产出(行号, 用户ID, 用户名)
+    """
+    if request.mimetype == 'text/csv':
+        reader = csv.reader(io.TextIOWrapper(request.stream, encoding='utf-8-sig'))
+        header = None
+        for row_no, row in enumerate(reader, start=1):
+            cells = [cell.strip() for cell in row]
+            if not any(cells):
+                continue
+            # 首行为表头时按列名取值，否则第一列视为用户名
+            if header is None and row_no == 1 and {'u_id', 'username'} & set(cells):
+                header = cells
+                continue
+            record = dict(zip(header, cells)) if header else {'username': cells[0]}
+            u_id = record.get('u_id')
+            yield row_no, int(u_id) if u_id and u_id.isdigit() else None, record.get('username') or None
+    else:
+        data = request.get_json(silent=True) or {}
+        for row_no, item in enumerate(data.get('users', []), start=1):
+            if isinstance(item, int):
+                yield row_no, item, None
+            else:
+                yield row_no, None, str(item).strip() or None
+
+def import_member_chunk(c_id, chunk):
+    """
+    批量解析一块导入数据并插入组织成员关系，返回每行的导入结果
+    """
+    names = list({username for _, u_id, username in chunk if u_id is None and username})
+    ids = list({u_id for _, u_id, _ in chunk if u_id is not None})
+    name_to_id = {name.lower(): u_id for name, u_id in dao.get_user_ids_by_names(names).items()}
+    existing_ids = dao.get_existing_user_ids(ids)
+
+    resolved = []
+    for row_no, u_id, username in chunk:
+        user = u_id if u_id is not None else username
+        if u_id is None:
+            u_id = name_to_id.get(username.lower()) if username else None
+        elif u_id not in existing_ids:
+            u_id = None
+        resolved.append((row_no, user, u_id))
+
+    found_ids = list({u_id for _, _, u_id in resolved if u_id is not None})
+    member_ids = dao.get_organization_member_ids(c_id, found_ids)
+    dao.add_users_to_organization([u_id for u_id in found_ids if u_id not in member_ids], c_id)
+
+    outcomes = []
+    added = set()
+    for row_no, user, u_id in resolved:
+        if u_id is None:
+            result = "not_found"
+        elif u_id in member_ids or u_id in added:
+            result = "already_member"
+        else:
+            result = "added"
+            added.add(u_id)
+        outcomes.append({"row": row_no, "user": user, "u_id": u_id, "result": result})
+    return outcomes
+
+@app.post('/organizations/<int:c_id>/members/import',
+          tags=[org_tag],
+          summary="批量导入组织成员",
+          responses={"200": {"description": "成员导入完成"}},
+          security=security)
+@jwt_required()
+def import_organization_members(path: OrgPath):
+    """
+    组织创建者批量导入成员，请求体为 {"users": [用户ID或用户名]} 或带 u_id/username 表头的CSV
+    """
+    try:
+        c_id = path.c_id
+        user_id = int(get_jwt_identity())
+
+        # 检查当前用户是否为组织的创建者
+        if not dao.get_organization(c_id):
+            return jsonify({"message": "组织不存在"}), 404
+        if not dao.is_organization_creator(c_id, user_id):
+            return jsonify({"message": "只有组织的创建者才能导入成员"}), 403
+
+        bulk_config = cfg.get_bulk_config()
+        chunk_size = bulk_config['import_chunk_size']
+        max_rows = bulk_config['max_import_rows']
+
+        # 先读取并检查行数再写入，超过上限时不导入任何一行，避免已提交的分块与 413 响应不一致
+        rows = list(itertools.islice(read_member_import_rows(), max_rows + 1))
+        if len(rows) > max_rows:
+            return jsonify({"message": f"单次最多导入{max_rows}行"}), 413
+
+        outcomes = []
+        for i in range(0, len(rows), chunk_size):
+            outcomes.extend(import_member_chunk(c_id, rows[i:i + chunk_size]))
+
+        summary = {}
+        for outcome in outcomes:
+            summary[outcome['result']] = summary.get(outcome['result'], 0) + 1
+        return jsonify({"message": "OK", "summary": summary, "data": outcomes}), 200
+    except Exception as e:
+        logger.error(f"导入组织成员时发生错误: {e}")
+        return jsonify({"message": "导入组织成员失败", "error": str(e)}), 500
+
 # Get组织信息
 @app.get('/organizations/<int:c_id>/info',
          tags=[org_tag],
@@ -519,15 +1072,69 @@ def get_organization_info(path: OrgPath):
         logger.error(f"获取组织信息时发生错误: {e}")
         return jsonify({"message": "获取组织信息失败", "error": str(e)}), 500
 
+@app.get('/organizations/<int:c_id>/stats',
+         tags=[org_tag],
+         summary="获取组织任务统计",
+         responses={"200": {"description": "组织任务统计获取成功"}},
+         security=security)
+@jwt_required()
+def get_organization_stats(path: OrgPath):
+    """
+    获取组织各状态的任务数量，直接读取增量维护的计数表
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "无权限"}), 403
+
+        counts = dao.get_organization_task_counters(c_id)
+        task_counts = {name: counts.get(state, 0) for name, state in cfg.get_task_status().items()}
+        return jsonify({"message": "OK", "data": {"c_id": c_id, "task_counts": task_counts}}), 200
+    except Exception as e:
+        logger.error(f"获取组织任务统计时发生错误: {e}")
+        return jsonify({"message": "获取组织任务统计失败", "error": str(e)}), 500
+
+@app.get('/organizations/<int:c_id>/leaderboard',
+         tags=[org_tag],
+         summary="获取组织排行榜",
+         responses={"200": {"description": "组织排行榜获取成功"}},
+         security=security)
+@jwt_required()
+def get_organization_leaderboard(path: OrgPath, query: LeaderboardQuery):
+    """
+    获取组织成员按时完成任务数的排行榜以及当前用户的名次
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "无权限"}), 403
+
+        period, top, (rank, score) = leaderboard.standings(c_id, query.period, user_id, query.limit)
+        names = dao.get_user_names([u_id for _, u_id, _ in top])
+        data = {
+            "period": period,
+            "entries": [{"rank": entry_rank, "user_id": u_id, "username": names.get(u_id), "score": entry_score}
+                        for entry_rank, u_id, entry_score in top],
+            "me": {"rank": rank, "score": score}
+        }
+        return jsonify({"message": "OK", "data": data}), 200
+    except Exception as e:
+        logger.error(f"获取组织排行榜时发生错误: {e}")
+        return jsonify({"message": "获取组织排行榜失败", "error": str(e)}), 500
+
 @app.get('/organizations/<int:c_id>/tasks',
          tags=[org_tag],
          summary="获取组织任务列表",
          responses={"200": {"description": "组织任务列表获取成功"}},
          security=security)
 @jwt_required()
-def get_organization_tasks(path: OrgPath):
+def get_organization_tasks(path: OrgPath, query: TaskListQuery):
     """
-    获取组织中发布的所有任务
+    获取组织中发布的所有任务，可通过 since 只获取近期发布的任务
     """
     try:
         # 获取当前登录用户的ID
@@ -538,7 +1145,7 @@ def get_organization_tasks(path: OrgPath):
             return jsonify({"message": "无权限"}), 403
         
         # 获取组织中发布的所有任务
-        tasks = dao.get_tasks_by_organization(c_id)
+        tasks = dao.get_tasks_by_organization(c_id, query.since)
         if tasks:
             return jsonify({"message": "OK", "data": tasks}), 200
         else:
@@ -547,6 +1154,182 @@ def get_organization_tasks(path: OrgPath):
         logger.error(f'获取任务列表时发生错误：{e}')
         return jsonify({"message": "获取任务列表时发生错误", "error": str(e)}), 500
 
+@app.get('/organizations/<int:c_id>/tasks/history',
+         tags=[org_tag],
+         summary="获取组织历史任务",
+         responses={"200": {"description": "历史任务获取成功"}},
+         security=security)
+@jwt_required()
+def get_organization_task_history(path: OrgPath, query: PageQuery):
+    """
+    分页获取组织已归档的历史任务，在线任务列表不包含这些任务
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "无权限"}), 403
+
+        # 多取一条用于判断是否还有下一页
+        tasks = dao.get_archived_tasks(c_id, query.page_size + 1, (query.page - 1) * query.page_size)
+        data = {
+            "tasks": tasks[:query.page_size],
+            "page": query.page,
+            "page_size": query.page_size,
+            "has_more": len(tasks) > query.page_size
+        }
+        return jsonify({"message": "OK", "data": data}), 200
+    except Exception as e:
+        logger.error(f"获取历史任务时发生错误: {e}")
+        return jsonify({"message": "获取历史任务失败", "error": str(e)}), 500
+
+@app.get('/organizations/<int:c_id>/tasks/search',
+         tags=[org_tag],
+         summary="搜索组织任务",
+         responses={"200": {"description": "任务搜索成功"}},
+         security=security)
+@jwt_required()
+def search_organization_tasks(path: OrgPath, query: TaskSearchQuery):
+    """
+    按任务名称和描述全文搜索组织内的任务，结果按相关度排序并分页
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "无权限"}), 403
+
+        keyword = query.q.strip()
+        if not keyword:
+            return jsonify({"message": "搜索关键词不能为空"}), 400
+        # 多取一条用于判断是否还有下一页
+        tasks = dao.search_tasks(c_id, keyword, query.page_size + 1, (query.page - 1) * query.page_size,
+                                 cfg.get_task_search_config()['ngram_token_size'])
+        data = {
+            "tasks": tasks[:query.page_size],
+            "page": query.page,
+            "page_size": query.page_size,
+            "has_more": len(tasks) > query.page_size
+        }
+        return jsonify({"message": "OK", "data": data}), 200
+    except Exception as e:
+        logger.error(f"搜索任务时发生错误: {e}")
+        return jsonify({"message": "搜索任务失败", "error": str(e)}), 500
+
+@app.post('/organizations/<int:c_id>/tasks/claim-next',
+          tags=[org_tag],
+          summary="领取下一个任务",
+          responses={"200": {"description": "任务领取成功"}},
+          security=security)
+@jwt_required()
+def claim_next_task(path: OrgPath):
+    """
+    原子地领取组织中优先级最高、发布最早的待接取任务
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "只有组织成员才能领取任务"}), 403
+
+        task_status = cfg.get_task_status()
+        task_id = dao.claim_next_task(c_id, user_id, task_status['pending'], task_status['in_progress'])
+        if task_id is None:
+            return jsonify({"message": "没有可领取的任务"}), 404
+        return jsonify({"message": "Task claimed successfully", "data": dao.get_task_by_id(task_id)}), 200
+    except Exception as e:
+        logger.error(f"领取任务时发生错误: {e}")
+        return jsonify({"message": "领取任务失败", "error": str(e)}), 500
+
+# 周期任务模板
+@app.post('/organizations/<int:c_id>/templates',
+          tags=[org_tag],
+          summary="创建周期任务模板",
+          responses={"201": {"description": "周期任务模板创建成功"}},
+          security=security)
+@jwt_required()
+def create_task_template(path: OrgPath, body: TaskTemplateModel):
+    """
+    创建周期任务模板，调度器按规则自动发布任务，指定成员时轮流指派
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "只有组织成员才能创建周期任务"}), 403
+
+        try:
+            rule = CronRule(body.cron_rule)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        # 轮流指派的用户必须是组织成员
+        assignees = list(dict.fromkeys(body.assignees))
+        if len(dao.get_organization_member_ids(c_id, assignees)) != len(assignees):
+            return jsonify({"message": "指派的用户必须是组织成员"}), 400
+
+        next_run_time = rule.next_after(dao.get_db_now())
+        template_id = dao.add_task_template(c_id, user_id, body.task_name, body.task_desc, body.time_limit,
+                                            body.priority, rule.expression, assignees, next_run_time)
+        response = {
+            "message": "Task template created successfully",
+            "template_id": template_id,
+            "next_run_time": next_run_time
+        }
+        return jsonify(response), 201
+    except Exception as e:
+        logger.error(f"创建周期任务模板时发生错误: {e}")
+        return jsonify({"message": "创建周期任务模板失败", "error": str(e)}), 500
+
+@app.get('/organizations/<int:c_id>/templates',
+         tags=[org_tag],
+         summary="获取周期任务模板列表",
+         responses={"200": {"description": "周期任务模板列表获取成功"}},
+         security=security)
+@jwt_required()
+def get_task_templates(path: OrgPath):
+    """
+    获取组织的周期任务模板列表
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        c_id = path.c_id
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, c_id):
+            return jsonify({"message": "无权限"}), 403
+        return jsonify({"message": "OK", "data": dao.get_task_templates(c_id)}), 200
+    except Exception as e:
+        logger.error(f"获取周期任务模板列表时发生错误: {e}")
+        return jsonify({"message": "获取周期任务模板列表失败", "error": str(e)}), 500
+
+@app.delete('/templates/<int:template_id>/delete',
+            tags=[task_tag],
+            summary="删除周期任务模板",
+            responses={"200": {"description": "周期任务模板删除成功"}},
+            security=security)
+@jwt_required()
+def delete_task_template(path: TemplatePath):
+    """
+    删除周期任务模板，只有模板发布者或组织创建者可以删除
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        template = dao.get_task_template(path.template_id)
+        if not template:
+            return jsonify({"message": "Template not found"}), 404
+        if user_id != template['publisher_id'] and not dao.is_organization_creator(template['c_id'], user_id):
+            return jsonify({"message": "只有模板发布者或组织创建者才能删除模板"}), 403
+
+        dao.delete_task_template(path.template_id)
+        return jsonify({"message": "Task template deleted successfully"}), 200
+    except Exception as e:
+        logger.error(f"删除周期任务模板时发生错误: {e}")
+        return jsonify({"message": "删除周期任务模板失败", "error": str(e)}), 500
+
 # 任务管理API
 # 发布任务
 @app.put('/tasks/publish',
@@ -573,12 +1356,58 @@ def publish_task(body: TaskModel):
         config = cfg.get_config()
         task_status = config['task_status']['pending']
 
-        task_id = dao.publish_task(body.task_name, user_id, receiver_id, task_status, body.time_limit, body.c_id, body.task_desc)
+        task_id = dao.publish_task(body.task_name, user_id, receiver_id, task_status, body.time_limit, body.c_id, body.task_desc, body.priority)
+        # 批量请求中的子请求在外层事务提交后才登记，回滚时不会跟踪未提交的任务
+        scheduler = expiry_scheduler_for(body.c_id)
+        dao.after_commit(lambda: scheduler.schedule(task_id, body.time_limit))
         return jsonify({"message": "Task published successfully", "task_id": task_id}), 200
     except Exception as e:
         logger.error(f"发布任务时发生错误: {e}")
         return jsonify({"message": "发布任务失败", "error": str(e)}), 500
 
+# 批量发布任务
+@app.post('/tasks/publish/bulk',
+          tags=[task_tag],
+          summary="批量发布任务",
+          responses={"200": {"description": "任务批量发布成功"}},
+          security=security)
+@jwt_required()
+def publish_tasks_bulk(body: TaskBulkModel):
+    """
+    批量发布任务，只校验一次组织成员身份
+    """
+    try:
+        user_id = int(get_jwt_identity())
+
+        max_tasks = cfg.get_bulk_config()['max_tasks']
+        if not body.tasks or len(body.tasks) > max_tasks:
+            return jsonify({"message": f"任务数量必须在1到{max_tasks}之间"}), 400
+
+        # 检查用户是否为组织成员
+        if not dao.is_user_in_organization(user_id, body.c_id):
+            return jsonify({"message": "只有组织成员才能发布任务"}), 403
+
+        task_status = cfg.get_task_status()['pending']
+        tasks = [task.model_dump() for task in body.tasks]
+        task_ids = dao.publish_tasks(tasks, user_id, task_status, body.c_id)
+        scheduler = expiry_scheduler_for(body.c_id)
+
+        def schedule_expiry():
+            for task_id, task in zip(task_ids, tasks):
+                scheduler.schedule(task_id, task['time_limit'])
+        dao.after_commit(schedule_expiry)
+        response = {
+            "message": "Tasks published successfully",
+            "first_task_id": task_ids[0],
+            "last_task_id": task_ids[-1],
+            "task_ids": task_ids,
+            "count": len(tasks)
+        }
+        return jsonify(response), 200
+    except Exception as e:
+        logger.error(f"批量发布任务时发生错误: {e}")
+        return jsonify({"message": "批量发布任务失败", "error": str(e)}), 500
+
 # 接取任务
 @app.put('/tasks/<int:task_id>/accept',
          tags=[task_tag],
@@ -705,7 +1534,8 @@ def confirm_task(path: TaskPath):
         user_id = int(get_jwt_identity())
         task_id = path.task_id
         # 检查用户是否为任务的发布者
-        publisher_id = dao.get_task_by_id(task_id).get('publisher_id')
+        task = dao.get_task_by_id(task_id)
+        publisher_id = task.get('publisher_id')
         logger.debug(f"publisher_id:{publisher_id}, user_id:{user_id}")
         if user_id != publisher_id:
             return jsonify({"message": "只有任务的发布者才能确认任务"}), 403
@@ -717,10 +1547,18 @@ def confirm_task(path: TaskPath):
         if dao.get_task_status(task_id) != config.get('task_status').get('to_be_confirmed'):
             return jsonify({"message": "只有待确认的任务才能被确认"}), 400
     
-        # 确认任务
-        rows_affected = dao.update_task_status(task_id, config.get('task_status').get('completed'))
-        if rows_affected > 0:
-            return jsonify({"message": f"Task confirmed successfully"}), 200
+        # 确认任务，超过截止时间的记为逾期完成
+        task_status = config.get('task_status')
+        # 完成时间和积分周期取同一个数据库时间，重建积分时按完成时间统计的周与此一致
+        completed_at = dao.get_db_now()
+        periods = leaderboard.current_periods(completed_at)
+        final_state = dao.complete_task(task_id, task_status.get('to_be_confirmed'), task_status.get('completed'),
+                                        task_status.get('overdue_completed'), periods, completed_at)
+        if final_state == task_status.get('completed') and task['receiver_id'] is not None:
+            # 按时完成的任务计入排行榜，批量请求中在外层事务提交后才计入
+            dao.after_commit(lambda: leaderboard.record(task['c_id'], task['receiver_id'], periods))
+        if final_state is not None:
+            return jsonify({"message": f"Task confirmed successfully", "task_state": final_state}), 200
         else:
             return jsonify({"message": "Task not found"}), 404
     except Exception as e:
@@ -766,6 +1604,93 @@ def delete_task(path: TaskPath):
         return jsonify({"message": "删除任务失败", "error": str(e)}), 500
 
 
+class BatchAborted(Exception):
+    """原子模式下子请求失败，用于触发整体回滚"""
+
+# 批量请求API
+@app.post('/batch',
+          tags=[batch_tag],
+          summary="批量执行请求",
+          responses={"200": {"description": "批量请求执行完成"}},
+          security=security)
+@jwt_required()
+def batch_requests(body: BatchModel):
+    """
+    在进程内按顺序执行多个子请求，子请求使用调用者的身份
+    """
+    try:
+        max_requests = cfg.get_batch_config()['max_requests']
+        if not body.requests or len(body.requests) > max_requests:
+            return jsonify({"message": f"子请求数量必须在1到{max_requests}之间"}), 400
+        for item in body.requests:
+            if not item.path.startswith('/') or item.path.split('?')[0].rstrip('/') == '/batch':
+                return jsonify({"message": f"无效的子请求路径: {item.path}"}), 400
+
+        headers = {"Authorization": request.headers.get("Authorization")}
+        results = []
+
+        def dispatch(item):
+            with app.test_request_context(item.path, method=item.method.upper(), json=item.body, headers=headers):
+                response = app.full_dispatch_request()
+            result = {"status": response.status_code, "body": response.get_json(silent=True)}
+            results.append(result)
+            return result
+
+        if not body.atomic:
+            for item in body.requests:
+                dispatch(item)
+            return jsonify({"message": "OK", "data": results}), 200
+
+        # 原子模式：任一子请求失败则回滚全部已执行的写操作
+        try:
+            with dao.transaction():
+                for item in body.requests:
+                    if dispatch(item)["status"] >= 400:
+                        raise BatchAborted()
+        except BatchAborted:
+            # 子请求期间缓存的用户名前缀结果可能包含已回滚的写入
+            user_prefix_cache.clear()
+            for item in body.requests[len(results):]:
+                results.append({"status": 424, "body": {"message": "前序子请求失败，未执行"}})
+            return jsonify({"message": "子请求失败，已全部回滚", "data": results}), 400
+        return jsonify({"message": "OK", "data": results}), 200
+    except Exception as e:
+        logger.error(f"执行批量请求时发生错误: {e}")
+        return jsonify({"message": "批量请求失败", "error": str(e)}), 500
+
+@app.get('/metrics',
+         tags=[system_tag],
+         summary="获取运行指标",
+         responses={"200": {"description": "Prometheus 文本格式的指标"}})
+def get_metrics():
+    """
+    以 Prometheus 文本格式输出准入控制等运行指标
+    """
+    lines = admission.metrics()
+    if shared_cache is not None:
+        lines += shared_cache.metrics()
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+@app.get('/database/status',
+         tags=[system_tag],
+         summary="获取数据库主机状态",
+         responses={"200": {"description": "获取成功"}},
+         security=security)
+@jwt_required()
+def get_database_status():
+    """
+    获取主库各主机的可用性、当前连接的主机和最近的故障转移耗时，仅管理员可用
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        user_role = dao.get_user_role(current_user_id)
+        if not user_role or user_role['role_name'] != 'admin':
+            return jsonify({"message": "Forbid"}), 403
+        return jsonify({"message": "OK", "data": dao.get_failover_stats()}), 200
+    except Exception as e:
+        logger.error(f"获取数据库主机状态时发生错误: {e}")
+        return jsonify({"message": "获取数据库主机状态失败", "error": str(e)}), 500
+
 # 全局错误处理
 @app.errorhandler(Exception)
 def handle_error(e):
@@ -773,4 +1698,6 @@ def handle_error(e):
     return jsonify({"message": "服务器内部错误", "error": str(e)}), 500
 
 if __name__ == '__main__':
+    # 调试模式下只在重载器启动的子进程中运行后台任务；生产环境使用 serve.py 启动多进程服务
+    create_app(start_jobs=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
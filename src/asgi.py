@@ -0,0 +1,60 @@
+"""
+ASGI 入口，由 uvicorn 加载：python src/serve.py --asgi
+
+uvicorn 在事件循环中维护全部连接，空闲的长连接以及上传、接收缓慢的客户端不占用线程。请求体先在事件循环中完整读取，
+再交给 a2wsgi 的线程池（asgi_threads 个线程）执行 Flask 应用。
+
+应用本身仍是 WSGI：每个请求从开始处理到返回响应都占用一个线程，包括等待数据库的时间，async def 视图也由 Flask
+在该线程中运行到结束。同时处理中的请求数因此仍受 asgi_threads 限制，这里节省的只是连接的读写等待，
+并不是全异步的服务。异步视图（目前只有 join_organization）中相互独立的查询通过 AsyncEarthFighterDAO 并发执行，
+缩短的是单个请求的耗时。
+"""
+from a2wsgi import WSGIMiddleware
+import app
+from config_manager import ConfigManager
+
+
+class BufferedBody:
+    """
+    读完整个请求体后再调用内层应用，超过 max_body_bytes 时返回 413
+    """
+
+    def __init__(self, inner, max_body_bytes):
+        self.inner = inner
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.inner(scope, receive, send)
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            size += len(chunks[-1])
+            if size > self.max_body_bytes:
+                await send({"type": "http.response.start", "status": 413,
+                            "headers": [(b"content-type", b"application/json")]})
+                await send({"type": "http.response.body", "body": '{"message": "请求体过大"}'.encode('utf-8')})
+                return
+            if not message.get('more_body'):
+                break
+        body = b''.join(chunks)
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if sent:
+                # 请求体已全部交给内层应用，之后只等待断开
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.inner(scope, replay, send)
+
+
+server_config = ConfigManager().get_server_config()
+application = BufferedBody(WSGIMiddleware(app.create_app(), workers=server_config['asgi_threads']),
+                           server_config['asgi_max_body_bytes'])
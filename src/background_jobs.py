@@ -0,0 +1,321 @@
+import fcntl
+import heapq
+import threading
+import time
+from config_manager import ConfigManager
+from cron_rule import CronRule
+from db_dao import EarthFighterDAO
+from logger import LoggerFactory
+import task_partitions
+
+logger = LoggerFactory.getLogger()
+cfg = ConfigManager()
+
+
+class PeriodicJob(threading.Thread):
+    """
+    后台周期任务基类，子类实现 run_once 并可通过 next_wait 调整下一次执行的间隔
+    """
+
+    def __init__(self, name, interval, db_config=None):
+        # 分片部署时每个分片各运行一个实例，db_config 为该分片的连接配置
+        if db_config is not None:
+            name = f"{name}@{db_config['shard_name']}"
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.db_config = db_config
+        self.dao = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        # 后台任务使用独立的数据库连接，避免与请求线程共用游标
+        self.dao = EarthFighterDAO(self.db_config)
+        logger.info(f"后台任务{self.name}已启动")
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"后台任务{self.name}执行时发生错误: {e}")
+            self._stop_event.wait(self.next_wait())
+        self.dao.close()
+        logger.info(f"后台任务{self.name}已停止")
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def next_wait(self):
+        return self.interval
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class JobLeader(threading.Thread):
+    """
+    后台任务选主
+
+    多个工作进程各自尝试获取同一个文件锁，只有持有锁的进程启动后台任务，其余进程每隔 retry_seconds 重试。
+    持有锁的进程退出（包括工作进程被回收）时锁自动释放，由其他进程接替。
+    未运行过期调度器的进程登记的截止时间会被忽略，由运行调度器的进程在下一次同步时从数据库载入。
+    """
+
+    def __init__(self, jobs, lock_path, retry_seconds):
+        super().__init__(name="job_leader", daemon=True)
+        self.jobs = jobs
+        self.lock_path = lock_path
+        self.retry_seconds = retry_seconds
+        self._lock_file = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        # 锁文件在本进程中打开，flock 与打开的文件绑定，fork 继承的文件描述符会与父进程共用同一把锁
+        lock_file = open(self.lock_path, "w")
+        while not self._stop_event.is_set():
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._stop_event.wait(self.retry_seconds)
+                continue
+            self._lock_file = lock_file
+            logger.info(f"本进程获得后台任务锁{self.lock_path}，启动{len(self.jobs)}个后台任务")
+            for job in self.jobs:
+                job.start()
+            return
+        lock_file.close()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._lock_file is not None:
+            for job in self.jobs:
+                job.stop()
+            for job in self.jobs:
+                job.join(timeout=5)
+            self._lock_file.close()
+
+
+class TaskExpiryScheduler(PeriodicJob):
+    """
+    任务过期调度器
+
+    在内存最小堆中维护未完成任务的截止时间，启动时从数据库重建，之后按周期增量同步新发布的任务。
+    每次只弹出已到期的任务并批量更新为已过期，开销与到期任务数成正比。
+    """
+
+    def __init__(self, db_config=None):
+        config = cfg.get_config()['task_expiry']
+        super().__init__("task_expiry", config['tick_seconds'], db_config)
+        self.resync_seconds = config['resync_seconds']
+        self.batch_size = config['batch_size']
+        task_status = cfg.get_task_status()
+        self.active_states = [task_status['pending'], task_status['in_progress']]
+        self.expired_state = task_status['expired']
+        self._heap = []
+        self._scheduled = set()
+        self._lock = threading.Lock()
+        self._clock_offset = 0
+        self._last_sync = None
+
+    def schedule(self, task_id, time_limit):
+        """
+        登记新发布任务的截止时间，time_limit 为秒数，未启动或无时间限制时忽略
+        """
+        if not self.is_alive() or not time_limit or time_limit <= 0:
+            return
+        self._push(task_id, self._now() + time_limit)
+
+    def _now(self):
+        # 以数据库时钟为准，避免应用服务器与数据库的时钟偏差
+        return time.time() + self._clock_offset
+
+    def _push(self, task_id, deadline):
+        with self._lock:
+            if task_id not in self._scheduled:
+                self._scheduled.add(task_id)
+                heapq.heappush(self._heap, (deadline, task_id))
+
+    def _sync(self):
+        """
+        从数据库同步截止时间，首次为全量重建，之后只拉取上次同步以来发布的任务
+        """
+        db_now = self.dao.get_db_timestamp()
+        self._clock_offset = db_now - time.time()
+        since = None if self._last_sync is None else self._last_sync - self.resync_seconds
+        for task_id, deadline in self.dao.get_task_deadlines(self.active_states, since):
+            self._push(task_id, deadline)
+        self._last_sync = db_now
+        logger.debug(f"任务过期调度器同步完成，当前待调度任务数: {len(self._heap)}")
+
+    def _pop_due(self):
+        now = self._now()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, task_id = heapq.heappop(self._heap)
+                self._scheduled.discard(task_id)
+                due.append(task_id)
+        return due
+
+    def run_once(self):
+        if self._last_sync is None or self._now() - self._last_sync >= self.resync_seconds:
+            self._sync()
+        due = self._pop_due()
+        for i in range(0, len(due), self.batch_size):
+            batch = due[i:i + self.batch_size]
+            rows_affected = self.dao.expire_tasks(batch, self.expired_state, self.active_states)
+            logger.info(f"{rows_affected}个任务已过期（本批到期{len(batch)}个）")
+
+    def next_wait(self):
+        with self._lock:
+            if not self._heap:
+                return self.interval
+            return min(self.interval, max(self._heap[0][0] - self._now(), 0))
+
+
+class RecurringTaskScheduler(PeriodicJob):
+    """
+    周期任务调度器
+
+    每个周期锁定下一次发布时间已到的模板（SKIP LOCKED，多进程可同时运行），
+    按规则展开截至数据库当前时间的全部发布时间并以多行 INSERT IGNORE 批量写入任务。
+    只生成已到发布时间的任务，任务列表、领取和搜索不会看到尚未发布的任务。
+    模板进度与生成的任务在同一事务中提交，且 (template_id, publish_time) 唯一，重启或重复执行不会重复生成。
+    """
+
+    def __init__(self, db_config=None):
+        config = cfg.get_config()['recurring_tasks']
+        super().__init__("recurring_tasks", config['tick_seconds'], db_config)
+        self.template_batch_size = config['template_batch_size']
+        self.max_occurrences = config['max_occurrences_per_template']
+        self.insert_chunk_size = config['insert_chunk_size']
+        task_status = cfg.get_task_status()
+        self.pending_state = task_status['pending']
+        self.in_progress_state = task_status['in_progress']
+
+    def _expand(self, template, horizon):
+        """
+        展开模板在 horizon 之前的发布时间，返回(任务列表, 下一次发布时间, 轮换位置)
+        """
+        rule = CronRule(template['cron_rule'])
+        assignees = template['assignees']
+        run_time = template['next_run_time']
+        rotation_index = template['rotation_index']
+        occurrences = []
+        while run_time <= horizon and len(occurrences) < self.max_occurrences:
+            receiver_id = None
+            if assignees:
+                receiver_id = assignees[rotation_index % len(assignees)]
+                rotation_index += 1
+            occurrences.append({
+                "task_name": template['task_name'],
+                "publisher_id": template['publisher_id'],
+                "receiver_id": receiver_id,
+                "task_state": self.in_progress_state if receiver_id else self.pending_state,
+                "publish_time": run_time,
+                "time_limit": template['time_limit'],
+                "c_id": template['c_id'],
+                "task_desc": template['task_desc'],
+                "priority": template['priority'],
+                "template_id": template['template_id']
+            })
+            run_time = rule.next_after(run_time)
+        return occurrences, run_time, rotation_index % max(len(assignees), 1)
+
+    def run_once(self):
+        horizon = self.dao.get_db_now()
+        while True:
+            with self.dao.transaction():
+                templates = self.dao.claim_due_templates(horizon, self.template_batch_size)
+                occurrences = []
+                progress = []
+                for template in templates:
+                    template_occurrences, next_run_time, rotation_index = self._expand(template, horizon)
+                    occurrences.extend(template_occurrences)
+                    progress.append((template['template_id'], next_run_time, rotation_index))
+                created = 0
+                for i in range(0, len(occurrences), self.insert_chunk_size):
+                    created += self.dao.insert_task_occurrences(occurrences[i:i + self.insert_chunk_size])
+                self.dao.advance_templates(progress)
+            if templates:
+                logger.info(f"周期任务调度器处理{len(templates)}个模板，生成{created}个任务")
+            if len(templates) < self.template_batch_size:
+                return
+
+
+class TaskArchiver(PeriodicJob):
+    """
+    任务归档器
+
+    按主键区间逐批扫描任务表，把已结束且超过保留期的任务移入归档表。
+    每批只锁定区间内符合条件的行，批次之间短暂停顿，避免长时间持锁影响在线请求。
+    每次运行最多扫描 max_batches_per_run 批，并记住扫描到的位置，下次从该位置继续，
+    扫到表尾后再从头开始新一轮，这样期间变为可归档的旧任务会在下一轮被归档。
+    """
+
+    def __init__(self, db_config=None):
+        config = cfg.get_config()['task_archive']
+        super().__init__("task_archive", config['tick_seconds'], db_config)
+        self.min_age_days = config['min_age_days']
+        self.batch_size = config['batch_size']
+        self.batch_pause = config['batch_pause_seconds']
+        self.max_batches = config['max_batches_per_run']
+        self._resume_id = None
+        task_status = cfg.get_task_status()
+        self.terminal_states = [task_status[name] for name in config['terminal_states']]
+
+    def run_once(self):
+        min_id, max_id = self.dao.get_task_id_range()
+        if min_id is None:
+            return
+        archived = 0
+        start_id = self._resume_id
+        if start_id is None or start_id >= max_id:
+            start_id = min_id - 1
+        start_id = max(start_id, min_id - 1)
+        batches = 0
+        while start_id < max_id and batches < self.max_batches and not self._stop_event.is_set():
+            end_id = start_id + self.batch_size
+            archived += self.dao.archive_tasks(start_id, end_id, self.terminal_states, self.min_age_days)
+            start_id = end_id
+            self._resume_id = start_id
+            batches += 1
+            self._stop_event.wait(self.batch_pause)
+        if archived:
+            logger.info(f"任务归档器归档{archived}个任务")
+
+
+class TaskPartitionMaintainer(PeriodicJob):
+    """
+    任务表分区维护
+
+    任务表已按月分区时，提前从 MAXVALUE 分区拆出未来 future_months 个月的分区，
+    并按 retention_months 删除过旧的分区。分区中仍有未结束的任务时跳过该分区，等任务结束后再删除，
+    因此被删除的只有已结束的任务，各状态的任务计数保留历史累计值。
+    """
+
+    def __init__(self, db_config=None):
+        config = cfg.get_task_partitioning_config()
+        super().__init__("task_partitions", config['tick_seconds'], db_config)
+        self.future_months = config['future_months']
+        self.retention_months = config['retention_months']
+        task_status = cfg.get_task_status()
+        self.terminal_states = [task_status[name] for name in cfg.get_config()['task_archive']['terminal_states']]
+
+    def run_once(self):
+        existing = self.dao.get_task_partitions()
+        if not existing:
+            return
+        now = self.dao.get_db_now()
+        missing = task_partitions.missing_partitions(existing, now, self.future_months)
+        if missing:
+            self.dao.add_task_partitions(missing)
+            logger.info(f"新建任务表分区: {', '.join(name for name, _ in missing)}")
+        expired = []
+        for name in task_partitions.expired_partitions(existing, now, self.retention_months):
+            active = self.dao.count_active_tasks_in_partition(name, self.terminal_states)
+            if active:
+                logger.warning(f"任务表分区{name}中还有{active}个未结束的任务，暂不删除")
+            else:
+                expired.append(name)
+        if expired:
+            self.dao.drop_task_partitions(expired)
+            logger.info(f"删除过期的任务表分区: {', '.join(expired)}")
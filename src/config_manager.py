@@ -26,6 +26,51 @@ class ConfigManager:
     def get_task_status(self):
         return self._config['task_status']
     
+    def get_batch_config(self):
+        return self._config['batch']
+
+    def get_bulk_config(self):
+        return self._config['bulk']
+
+    def get_leaderboard_config(self):
+        return self._config['leaderboard']
+
+    def get_task_search_config(self):
+        return self._config['task_search']
+
+    def get_user_search_config(self):
+        return self._config['user_search']
+
+    def get_invite_code_config(self):
+        return self._config['invite_code']
+
+    def get_server_config(self):
+        return self._config['server']
+
+    def get_rate_limit_config(self):
+        return self._config['rate_limits']
+
+    def get_admission_config(self):
+        return self._config['admission']
+
+    def get_request_deadline_config(self):
+        return self._config['request_deadlines']
+
+    def get_task_partitioning_config(self):
+        return self._config['task_partitioning']
+
     def is_org_type_valid(self, org_type):
         data = self.get_organization_types()
         return any(item["type_name"] == org_type for item in data)
+
+    def get_org_type_level(self, org_type):
+        """层级数值越小越靠上，如 worldwide > country > school > family"""
+        for item in self.get_organization_types():
+            if item["type_name"] == org_type:
+                return item["level"]
+        return None
+
+    def can_be_child_of(self, org_type, parent_type):
+        level = self.get_org_type_level(org_type)
+        parent_level = self.get_org_type_level(parent_type)
+        return level is not None and parent_level is not None and parent_level < level
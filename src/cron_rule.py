@@ -0,0 +1,74 @@
+import datetime
+
+# 常用规则别名
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+}
+
+# 向后查找下一次触发时间的最大天数，防止 2月30日 之类永不触发的规则死循环
+MAX_SEARCH_DAYS = 366 * 5
+
+
+class CronRule:
+    """
+    五段式 cron 规则：分 时 日 月 周，支持 *、*/n、a-b、a-b/n 和逗号列表，周日为 0 或 7
+    """
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"无效的cron规则: {expression}")
+        self.minutes = self._parse_field(fields[0], 0, 59)
+        self.hours = self._parse_field(fields[1], 0, 23)
+        self.days = self._parse_field(fields[2], 1, 31)
+        self.months = self._parse_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in self._parse_field(fields[4], 0, 7)}
+        # 日和周同时受限时按 cron 惯例任一满足即可
+        self._day_restricted = fields[2] != '*'
+        self._weekday_restricted = fields[4] != '*'
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            value_range, _, step = part.partition('/')
+            step = int(step) if step else 1
+            if value_range == '*':
+                start, end = low, high
+            elif '-' in value_range:
+                start, end = (int(value) for value in value_range.split('-', 1))
+            else:
+                start = int(value_range)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"cron字段超出范围: {field}")
+            values.update(range(start, end + 1, step))
+        return sorted(values)
+
+    def _day_matches(self, day):
+        day_ok = day.day in self.days
+        weekday_ok = (day.weekday() + 1) % 7 in self.weekdays
+        if self._day_restricted and self._weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment):
+        """
+        返回严格晚于 moment 的下一次触发时间（精确到分钟）
+        """
+        start = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(MAX_SEARCH_DAYS):
+            if day.month in self.months and self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate
+            day += datetime.timedelta(days=1)
+        raise ValueError(f"cron规则没有可触发的时间: {self.expression}")
@@ -0,0 +1,51 @@
+"""
+EarthFighterDAO 的异步版本
+
+方法与 EarthFighterDAO 相同，调用时返回协程：查询在专用线程池中执行，每个线程持有自己的 DAO（数据库连接，见 ThreadLocalDAO），
+线程数即连接池大小，事件循环在等待 MySQL 期间可以处理其他协程。相互独立的查询可以用 asyncio.gather 并发执行，
+各自占用一个连接。需要在同一连接上执行的多步操作（如事务）通过 run 交给一个线程整体执行。
+
+Flask 的异步视图在请求线程中运行事件循环直到视图返回，请求线程在等待期间并不释放；
+并发查询缩短的是单个请求的耗时，不能提高同时处理的请求数。
+
+查询线程复制调用方的 contextvars，当前请求的用户（读己之写）和截止时间对查询同样生效。
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from db_dao import EarthFighterDAO
+from db_local import ThreadLocalDAO
+from db_sharding import create_dao
+
+# 依赖同一连接上的多次调用，只能通过 run 使用
+CONNECTION_METHODS = ("transaction", "connect", "ensure_connection", "close")
+
+
+class AsyncEarthFighterDAO:
+    def __init__(self, pool_size, dao_factory=create_dao):
+        self.pool_size = pool_size
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="async_dao")
+        # 首次在线程中使用时建立连接，同一线程同一时间只执行一个查询
+        self._daos = ThreadLocalDAO(dao_factory)
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        在查询线程中执行 fn(dao, *args, **kwargs)，fn 内的多次调用使用同一个连接
+        """
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, lambda: fn(self._daos.current(), *args, **kwargs))
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def __getattr__(self, name):
+        if not callable(getattr(EarthFighterDAO, name, None)) or name.startswith('_') or name in CONNECTION_METHODS:
+            raise AttributeError(name)
+
+        async def method(*args, **kwargs):
+            return await self.run(lambda dao: getattr(dao, name)(*args, **kwargs))
+        method.__name__ = name
+        return method
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._daos.close()
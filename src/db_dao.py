@@ -1,43 +1,363 @@
 import mysql.connector
+from mysql.connector import errorcode
+import functools
+import inspect
 import json
-from logger import LoggerFactory
+import threading
 import time
+from contextlib import contextmanager
+from logger import LoggerFactory
+from db_failover import HostMonitor, configured_hosts
+from db_replicas import ReplicaSet
+from shared_cache import SharedCache
+from single_flight import SingleFlight
+import request_context
 
 logger = LoggerFactory.getLogger()
 
-class EarthFighterDAO:
+def _task_to_dict(result):
+    """
+    将 tasks 表的一行记录转换为字典
+    """
+    return {
+        "task_id": result[0],
+        "task_name": result[1],
+        "publisher_id": result[2],
+        "receiver_id": result[3],
+        "task_state": result[4],
+        "publish_time": result[5],
+        "time_limit": result[6],
+        "completion_time": result[7],
+        "c_id": result[9],
+        "task_desc": result[10],
+        "priority": result[11],
+        "template_id": result[12]
+    }
+
+# tasks 与 tasks_archive 共有的列，顺序与 _task_to_dict 一致
+TASK_COLUMNS = "task_id, task_name, publisher_id, receiver_id, task_state, publish_time, time_limit, completion_time, is_deleted, c_id, task_desc, priority, template_id"
+
+TEMPLATE_COLUMNS = "template_id, c_id, publisher_id, task_name, task_desc, time_limit, priority, cron_rule, assignees, rotation_index, next_run_time, create_time"
+
+def _template_to_dict(result):
+    """
+    将 task_templates 表的一行记录转换为字典
+    """
+    return {
+        "template_id": result[0],
+        "c_id": result[1],
+        "publisher_id": result[2],
+        "task_name": result[3],
+        "task_desc": result[4],
+        "time_limit": result[5],
+        "priority": result[6],
+        "cron_rule": result[7],
+        "assignees": json.loads(result[8]) if result[8] else [],
+        "rotation_index": result[9],
+        "next_run_time": result[10],
+        "create_time": result[11]
+    }
+
+# 任务表分区中兜底的 MAXVALUE 分区，新分区都从它拆分出来
+MAX_PARTITION = "pmax"
+
+# 重新检查任务表是否有全文索引的间隔（秒），分区迁移会移除全文索引
+FULLTEXT_CHECK_SECONDS = 300
+
+def _partition_definitions(partitions):
+    """
+    生成任务表 RANGE 分区定义，上界时间作为参数传入，末尾追加 MAXVALUE 分区
+    """
+    definitions = [f"PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP(%s))" for name, _ in partitions]
+    definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    return ", ".join(definitions)
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def _shared_flights(config, cache):
+    """
+    同一数据库的 DAO（各请求线程各有一个）共用一个 SingleFlight，相同查询跨线程合并
+    """
+    key = (tuple(configured_hosts(config)), config['database'])
+    with _flights_lock:
+        flights = _flights.get(key)
+        if flights is None:
+            flights = _flights[key] = SingleFlight(config.get('single_flight_ttl_seconds', 0))
+            if cache is not None:
+                # 其他进程写入后，本进程合并查询时缓存的结果同样失效
+                cache.subscribe(lambda tags: flights.invalidate())
+        return flights
+
+def _placeholders(values):
+    """
+    生成 IN (...) 子句使用的参数占位符
+    """
+    return ", ".join(["%s"] * len(values))
+
+class InviteCodeConflict(Exception):
+    """
+    邀请码与已有组织的邀请码重复
+    """
+
+def _is_invite_code_conflict(err):
+    return err.errno == errorcode.ER_DUP_ENTRY and 'uk_organizations_invite_code' in str(err.msg)
+
+def read_only(method):
+    """
+    只读查询优先在从库执行
+
+    以下情况仍走主库：未配置从库或没有健康从库、处于事务中、当前请求或当前用户刚刚写入过（读己之写）。
+    从库连接出错时将其标记为不可用，并在主库上重试本次查询。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if (self.replicas is None or self._transaction_depth > 0
+                or getattr(self._local, 'cursor', None) is not None
+                or self._read_own_writes()):
+            return method(self, *args, **kwargs)
+        replica, connection = self.replicas.acquire()
+        if connection is None:
+            return method(self, *args, **kwargs)
+        try:
+            self._local.cursor = connection.cursor()
+            try:
+                return method(self, *args, **kwargs)
+            except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError) as err:
+                self.replicas.mark_unhealthy(replica, err)
+        finally:
+            cursor = self._local.cursor
+            self._local.cursor = None
+            try:
+                if cursor is not None:
+                    cursor.close()
+                connection.close()
+            except mysql.connector.Error as err:
+                logger.warning(f"归还从库连接失败: {err}")
+        return method(self, *args, **kwargs)
+    return wrapper
+
+def single_flight(method):
+    """
+    并发的相同查询（方法和参数都相同）只执行一次，结果由所有调用共享，并在 single_flight_ttl_seconds 内复用
+
+    处于事务中、当前请求或当前用户刚刚写入过（读己之写）时直接查询，不共享其他请求的结果。
+    需放在 read_only 之外，合并后的查询仍按 read_only 的规则选择主库或从库。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if (self._transaction_depth > 0
+                or self._read_own_writes()):
+            return method(self, *args, **kwargs)
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            # leader 因自身的截止时间超时后，截止时间更晚的等待者自行查询
+            return self.flights.do(key, lambda: method(self, *args, **kwargs), request_context.remaining(),
+                                   retry_errors=(request_context.DeadlineExceeded,))
+        except TimeoutError:
+            request_context.mark_deadline_exceeded()
+            raise request_context.DeadlineExceeded("请求处理超时")
+    return wrapper
+
+def cached(kind, param):
+    """
+    查询结果保存在工作进程共享的缓存中，条目带有标签 "kind:参数值" 和 "kind"，由 invalidates 标注的写操作失效
+
+    与 single_flight 相同，处于事务中或需要读己之写时直接查询。结果为 None（记录不存在）时不缓存，新建记录无需失效。
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if (self.cache is None or self._transaction_depth > 0
+                    or self._read_own_writes()):
+                return method(self, *args, **kwargs)
+            key = (method.__name__, args, tuple(sorted(kwargs.items())))
+            hit, value = self.cache.get(key)
+            if hit:
+                return value
+            result = method(self, *args, **kwargs)
+            if result is not None:
+                tag = f"{kind}:{signature.bind(self, *args, **kwargs).arguments[param]}"
+                # value 为未命中时的失效序号，查询期间相关标签失效时守护进程不会写入
+                self.cache.set(key, result, (tag, kind), value)
+            return result
+        return wrapper
+    return decorator
+
+def invalidates(kind, param=None, owner=None):
+    """
+    写操作成功后使共享缓存中带有标签 "kind:参数值" 的条目失效，未指定 param 时使 kind 下的全部条目失效
+
+    owner 为由参数反查标签值的方法名（如由任务ID反查组织ID），在写入前调用，反查不到时使 kind 下的全部条目失效。
+    事务中的写操作在最外层事务提交后才失效，回滚时不失效。
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.cache is None:
+                return method(self, *args, **kwargs)
+            tag = kind
+            if param is not None:
+                value = signature.bind(self, *args, **kwargs).arguments[param]
+                if owner is not None:
+                    value = getattr(self, owner)(value)
+                if value is not None:
+                    tag = f"{kind}:{value}"
+            result = method(self, *args, **kwargs)
+            self._pending_invalidations.add(tag)
+            if self._transaction_depth == 0:
+                self._flush_invalidations()
+            return result
+        return wrapper
+    return decorator
+
+class _StatementGuard:
+    """
+    一条语句的取消开关：KILL QUERY 持锁执行，语句返回后置 finished，之后的取消直接放弃，
+    避免取消落到同一连接上的下一条语句
+    """
+
     def __init__(self):
-        self.config = self.load_db_config()
+        self.lock = threading.Lock()
+        self.finished = False
+
+class _DeadlineCursor:
+    """
+    在当前请求的剩余时间内执行语句
+
+    SELECT 语句加 MAX_EXECUTION_TIME 提示由 MySQL 自行中止；写语句和加锁读在主库上到期后用 KILL QUERY 取消。
+    语句因超时被中止时抛出 DeadlineExceeded，其余属性直接使用原游标。
+    """
+
+    def __init__(self, dao, cursor, on_primary):
+        self._dao = dao
+        self._cursor = cursor
+        self._on_primary = on_primary
+
+    def execute(self, operation, params=None):
+        remaining = request_context.check_deadline()
+        statement = operation.lstrip()
+        upper = statement.upper()
+        timer = None
+        if upper.startswith("SELECT"):
+            statement = f"SELECT /*+ MAX_EXECUTION_TIME({max(int(remaining * 1000), 1)}) */{statement[6:]}"
+        if self._on_primary and (not upper.startswith("SELECT") or "FOR UPDATE" in upper):
+            guard = _StatementGuard()
+            timer = threading.Timer(remaining, self._dao._kill_query, (self._dao.db.connection_id, guard))
+            timer.daemon = True
+            timer.start()
+        started = time.monotonic()
+        try:
+            return self._cursor.execute(statement, params)
+        except mysql.connector.Error as err:
+            if err.errno in (errorcode.ER_QUERY_TIMEOUT, errorcode.ER_QUERY_INTERRUPTED):
+                request_context.mark_deadline_exceeded()
+                raise request_context.DeadlineExceeded("请求处理超时") from err
+            raise
+        finally:
+            if timer:
+                # 正在执行的取消完成之前语句不算结束，不会开始下一条语句
+                with guard.lock:
+                    guard.finished = True
+                timer.cancel()
+            # 语句耗时供准入控制判断数据库是否过载
+            request_context.record_statement(time.monotonic() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class EarthFighterDAO:
+    def __init__(self, config=None):
+        # 分片部署时由 ShardedEarthFighterDAO 传入各分片的连接配置
+        self.config = config or self.load_db_config()
+        # 相邻自增ID的间隔，分片部署时为分片的ID步长
+        self.id_step = self.config.get('auto_increment_increment', 1)
         self.db = None
-        self.cursor = None
-        self.connect(retries=3)  # 添加重试机制
+        self._cursor = None
+        self.host = None
+        self.hosts = HostMonitor.shared(self.config)
+        # 只读查询在从库执行期间，当前线程的游标指向从库连接
+        self._local = threading.local()
+        self._transaction_depth = 0
+        self.connect()
+        self.replicas = ReplicaSet.shared(self.config)
+        self.cache = SharedCache.shared(self.config)
+        self.flights = _shared_flights(self.config, self.cache)
+        self._pending_invalidations = set()
+        # 事务提交后才执行的进程内操作，回滚时丢弃
+        self._after_commit = []
+        self._fulltext_index = None
+        self._fulltext_checked_at = 0.0
+        self._consecutive_auto_increment = None
+
+    @property
+    def cursor(self):
+        cursor = getattr(self._local, 'cursor', None) or self._cursor
+        if request_context.deadline() is None:
+            return cursor
+        return _DeadlineCursor(self, cursor, cursor is self._cursor)
 
-    def connect(self, retries=3):
-        """添加连接重试和自动重连功能"""
-        for attempt in range(retries):
+    @cursor.setter
+    def cursor(self, cursor):
+        self._cursor = cursor
+
+    def connect(self):
+        """
+        按优先级依次连接当前可用的主机，每台主机只尝试一次，全部失败时立即抛出异常
+        不可用主机的重试由 HostMonitor 在后台按退避间隔进行，不占用请求线程
+        """
+        for state in self.hosts.candidates():
             try:
-                self.db = mysql.connector.connect(
-                    host=self.config['host'],
-                    user=self.config['user'],
-                    password=self.config['password'],
-                    database=self.config['database'],
-                    autocommit=True,  # 自动提交避免事务未提交
-                    pool_name="earth_fighter_pool",
-                    pool_size=5
-                )
-                self.cursor = self.db.cursor()
-                logger.info(f"数据库连接成功（第{attempt+1}次尝试）")
+                self._connect_host(state)
+                self.hosts.record_connected(state)
+                logger.info(f"数据库连接成功: {state.name}")
                 return
             except mysql.connector.Error as err:
-                if attempt < retries - 1:
-                    logger.warning(f"数据库连接失败，第{attempt+1}次重试...")
-                    time.sleep(1)
-                else:
-                    logger.error(f"数据库连接最终失败: {err}")
-                    raise
+                self.hosts.report_failure(state, err)
+        logger.error("数据库连接失败: 没有可用的数据库主机")
+        raise mysql.connector.errors.InterfaceError(msg="没有可用的数据库主机")
+
+    def _connect_host(self, state):
+        db = mysql.connector.connect(
+            host=state.host,
+            port=state.port,
+            user=self.config['user'],
+            password=self.config['password'],
+            database=self.config['database'],
+            autocommit=True,  # 自动提交避免事务未提交
+            # 每个 DAO 在整个生命周期内独占一个连接（各请求线程各有一个 DAO），不经过连接池，
+            # 否则连接池大小须不小于进程内的 DAO 数
+            connection_timeout=self.config.get('connect_timeout_seconds', 3)
+        )
+        cursor = db.cursor()
+        if 'auto_increment_offset' in self.config:
+            # 分片按相同步长、不同偏移分配自增ID，组织和任务ID在各分片间不重复，迁移时可原样复制
+            cursor.execute("SET SESSION auto_increment_increment = %s, auto_increment_offset = %s",
+                           (self.config['auto_increment_increment'], self.config['auto_increment_offset']))
+        if self.db is not None:
+            try:
+                self.db.close()
+            except mysql.connector.Error:
+                pass
+        self.db = db
+        self.cursor = cursor
+        self.host = state
 
     def ensure_connection(self):
-        """增强连接保活检查"""
+        """增强连接保活检查，优先级更高的主机恢复后在事务之外切回"""
+        preferred = self.hosts.preferred()
+        if self.db and preferred is not None and preferred is not self.host and self._transaction_depth == 0:
+            logger.info(f"数据库主机{preferred.name}可用，切回该主机")
+            try:
+                self._connect_host(preferred)
+                self.hosts.record_connected(preferred)
+                return
+            except mysql.connector.Error as err:
+                self.hosts.report_failure(preferred, err)
         try:
             if not self.db or not self.db.is_connected():
                 logger.warning("数据库连接断开，尝试重新连接...")
@@ -46,10 +366,176 @@ class EarthFighterDAO:
             logger.error(f"数据库连接检查失败: {err}，尝试重新连接...")
             self.connect()
 
+    def _kill_query(self, connection_id, guard):
+        """
+        用独立连接取消当前连接上超过请求截止时间的语句，建立连接期间语句已返回时不再取消
+        """
+        try:
+            connection = mysql.connector.connect(
+                host=self.host.host,
+                port=self.host.port,
+                user=self.config['user'],
+                password=self.config['password'],
+                connection_timeout=self.config.get('connect_timeout_seconds', 3)
+            )
+            try:
+                cursor = connection.cursor()
+                with guard.lock:
+                    if guard.finished:
+                        return
+                    cursor.execute(f"KILL QUERY {int(connection_id)}")
+                cursor.close()
+            finally:
+                connection.close()
+            logger.warning(f"语句超过请求截止时间，已取消连接{connection_id}上的查询")
+        except mysql.connector.Error as err:
+            logger.error(f"取消超时语句失败: {err}")
+
+    def get_failover_stats(self):
+        """
+        返回主库各主机的状态和最近的故障转移记录，connected_host 为当前 DAO 所连的主机
+        """
+        stats = self.hosts.stats()
+        stats['connected_host'] = self.host.name if self.host else None
+        return stats
+
+    @contextmanager
+    def transaction(self):
+        """
+        在同一事务中执行多个DAO操作，嵌套调用时并入最外层事务
+        """
+        self.ensure_connection()
+        if self._transaction_depth == 0:
+            self.db.start_transaction()
+        self._transaction_depth += 1
+        try:
+            yield self
+        except Exception:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.db.rollback()
+                self._pending_invalidations.clear()
+                self._after_commit.clear()
+            raise
+        else:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.db.commit()
+                self._record_write()
+                self._run_after_commit()
+
+    def after_commit(self, callback):
+        """
+        在当前事务提交后执行 callback，用于更新排行榜、过期调度等进程内状态；事务回滚时不执行，不在事务中时立即执行
+        """
+        if self._transaction_depth == 0:
+            callback()
+        else:
+            self._after_commit.append(callback)
+
+    def _run_after_commit(self):
+        callbacks = self._after_commit
+        self._after_commit = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as err:
+                # 事务已提交，回调失败不影响请求结果
+                logger.error(f"执行事务提交后的操作时发生错误: {err}")
+
+    def _commit(self):
+        """事务中由最外层统一提交"""
+        if self._transaction_depth == 0:
+            self.db.commit()
+            self._record_write()
+
+    def _record_write(self):
+        request_context.record_write()
+        user_id = request_context.current_user_id()
+        if self.cache is not None and user_id is not None:
+            self.cache.record_write(user_id)
+        # 写入之后开始的查询不再共享写入之前的结果
+        self.flights.invalidate()
+        self._flush_invalidations()
+
+    def _read_own_writes(self):
+        """
+        当前请求或用户刚写入过，读取需要走主库且不能使用共享的结果
+        本进程记录的写入之外，还通过共享缓存查询该用户在其他工作进程中的写入
+        """
+        window = self.config.get('read_your_writes_seconds', 5)
+        if request_context.should_read_primary(window):
+            return True
+        user_id = request_context.current_user_id()
+        if self.cache is None or user_id is None:
+            return False
+        age = self.cache.write_age(user_id)
+        return age is not None and age < window
+
+    def _flush_invalidations(self):
+        if self._pending_invalidations:
+            tags = list(self._pending_invalidations)
+            self._pending_invalidations.clear()
+            self.cache.invalidate(tags)
+
+    def _rollback(self):
+        """事务中由最外层统一回滚"""
+        if self._transaction_depth == 0:
+            self.db.rollback()
+
+    def _lock_tasks(self, task_ids):
+        """
+        锁定任务行并返回 {任务ID: (组织ID, 接收者ID, 任务状态)}，需在事务中调用
+        """
+        if not task_ids:
+            return {}
+        sql = f"SELECT task_id, c_id, receiver_id, task_state FROM tasks WHERE task_id IN ({_placeholders(task_ids)}) FOR UPDATE"
+        self.cursor.execute(sql, tuple(task_ids))
+        return {result[0]: result[1:] for result in self.cursor.fetchall()}
+
+    def _apply_task_counter_deltas(self, changes):
+        """
+        按 [(组织ID, 接收者ID, 任务状态, 增量)] 更新组织和用户任务计数，需在事务中调用
+        """
+        org_deltas = {}
+        user_deltas = {}
+        for c_id, receiver_id, task_state, delta in changes:
+            # 路由层传入的用户ID可能是字符串，统一转为整数后再合并
+            if c_id is not None:
+                key = (int(c_id), task_state)
+                org_deltas[key] = org_deltas.get(key, 0) + delta
+            if receiver_id is not None:
+                key = (int(receiver_id), task_state)
+                user_deltas[key] = user_deltas.get(key, 0) + delta
+        for table, key_column, deltas in (("org_task_counters", "c_id", org_deltas),
+                                          ("user_task_counters", "u_id", user_deltas)):
+            # 按主键顺序更新，降低并发事务间的死锁概率
+            rows = sorted((key, state, delta) for (key, state), delta in deltas.items() if delta)
+            if not rows:
+                continue
+            sql = f"""
+                  INSERT INTO {table} ({key_column}, task_state, task_count) VALUES {", ".join(["(%s, %s, %s)"] * len(rows))}
+                  ON DUPLICATE KEY UPDATE task_count = task_count + VALUES(task_count)
+                  """
+            self.cursor.execute(sql, tuple(value for row in rows for value in row))
+
+    def _apply_task_transitions(self, before, after):
+        """
+        根据任务变更前后的 (组织ID, 接收者ID, 任务状态) 更新计数，after 为空表示任务被删除
+        """
+        changes = []
+        for task_id, (c_id, receiver_id, task_state) in before.items():
+            changes.append((c_id, receiver_id, task_state, -1))
+            if task_id in after:
+                new_c_id, new_receiver_id, new_task_state = after[task_id]
+                changes.append((new_c_id, new_receiver_id, new_task_state, 1))
+        self._apply_task_counter_deltas(changes)
+
     def load_db_config(self):
         with open('config/db_config.json') as config_file:
             return json.load(config_file)
 
+    @read_only
     def check_user_exists(self, u_name):
         """
         检查用户名是否已存在
@@ -67,36 +553,38 @@ class EarthFighterDAO:
         val_insert = (u_name, password)
         try:
             self.cursor.execute(sql_insert, val_insert)
-            self.db.commit()
+            self._commit()
             return self.cursor.lastrowid
         except mysql.connector.Error as err:
             logger.error(f"Error adding user: {err}")
-            self.db.rollback()
+            self._rollback()
             raise
+    @invalidates("user", "u_id")
     def delete_user(self, u_id):
         self.ensure_connection()
         sql = "UPDATE users SET is_deleted = TRUE WHERE u_id = %s"
         val = (u_id,)
         try:
             self.cursor.execute(sql, val)
-            self.db.commit()
+            self._commit()
             return self.cursor.rowcount
         except mysql.connector.Error as err:
             logger.error(f"Error deleting user: {err}")
-            self.db.rollback()
+            self._rollback()
             raise
 
+    @invalidates("user", "u_id")
     def update_user(self, u_id, u_name):
         self.ensure_connection()
         sql = "UPDATE users SET u_name = %s WHERE u_id = %s"
         val = (u_name, u_id)
         try:
             self.cursor.execute(sql, val)
-            self.db.commit()
+            self._commit()
             return self.cursor.rowcount
         except mysql.connector.Error as err:
             logger.error(f"Error updating user: {err}")
-            self.db.rollback()
+            self._rollback()
             raise
 
     def update_user_password(self, u_id, password):
@@ -105,13 +593,14 @@ class EarthFighterDAO:
         val = (password, u_id)
         try:
             self.cursor.execute(sql, val)
-            self.db.commit()
+            self._commit()
             return self.cursor.rowcount
         except mysql.connector.Error as err:
             logger.error(f"Error updating user password: {err}")
-            self.db.rollback()
+            self._rollback()
             raise
 
+    @read_only
     def get_role_id_by_name(self, role_name):
         """
         根据角色名称获取角色ID
@@ -135,11 +624,11 @@ class EarthFighterDAO:
         val = (role_id, u_id)
         try:
             self.cursor.execute(sql, val)
-            self.db.commit()
+            self._commit()
             return self.cursor.rowcount
         except mysql.connector.Error as err:
             logger.error(f"Error updating user role: {err}")
-            self.db.rollback()
+            self._rollback()
             raise
     def assign_user_role(self, u_id, role_id):
         """
@@ -150,11 +639,11 @@ class EarthFighterDAO:
         val = (u_id, role_id)
         try:
             self.cursor.execute(sql, val)
-            self.db.commit()
+            self._commit()
             return self.cursor.rowcount
         except mysql.connector.Error as err:
             logger.error(f"Error assigning user role: {err}")
-            self.db.rollback()
+            self._rollback()
             raise
     def user_login(self, u_name, password):
         self.ensure_connection()
@@ -167,6 +656,7 @@ class EarthFighterDAO:
         except mysql.connector.Error as err:
             logger.error(f"Error during user login: {err}")
             raise
+    @read_only
     def get_user_role(self, u_id):
         """
         获取用户的角色信息
@@ -178,6 +668,7 @@ class EarthFighterDAO:
         role_info = self.cursor.fetchone()
         return {'role_id': role_info[0], 'role_name': role_info[1]} if role_info else None
 
+    @read_only
     def check_organization_exists(self, c_name):
         """
         检查组织是否已存在
@@ -189,31 +680,245 @@ class EarthFighterDAO:
         existing_org = self.cursor.fetchone()
         return existing_org is not None
 
-    def add_organization(self, c_name, c_type, creator_id, invite_code):
+    def add_organization(self, c_name, c_type, creator_id, invite_code, parent_id=None, invite_ttl=0):
         self.ensure_connection()
-        sql = "INSERT INTO organizations (c_name, c_type, creator_id, invite_code, is_deleted) VALUES (%s, %s, %s, %s, FALSE)"
-        val = (c_name, c_type, creator_id, invite_code)
+        sql = """
+              INSERT INTO organizations (c_name, c_type, creator_id, invite_code, is_deleted, parent_id, invite_expire_time)
+              VALUES (%s, %s, %s, %s, FALSE, %s, IF(%s > 0, NOW() + INTERVAL %s SECOND, NULL))
+              """
+        val = (c_name, c_type, creator_id, invite_code, parent_id, invite_ttl, invite_ttl)
         try:
-            self.cursor.execute(sql, val)
-            self.db.commit()
-            return self.cursor.lastrowid
+            with self.transaction():
+                self.cursor.execute(sql, val)
+                c_id = self.cursor.lastrowid
+                # 闭包表中写入自身路径，以及父组织的所有祖先到新组织的路径
+                sql = """
+                      INSERT INTO organization_closure (ancestor_id, descendant_id, depth)
+                      SELECT ancestor_id, %s, depth + 1 FROM organization_closure WHERE descendant_id = %s
+                      UNION ALL SELECT %s, %s, 0
+                      """
+                self.cursor.execute(sql, (c_id, parent_id, c_id, c_id))
+            return c_id
         except mysql.connector.Error as err:
+            if _is_invite_code_conflict(err):
+                raise InviteCodeConflict(invite_code) from err
             logger.error(f"Error adding organization: {err}")
-            self.db.rollback()
             raise
 
-    def delete_organization(self, c_id):
+    @invalidates("organization", "c_id")
+    def rotate_invite_code(self, c_id, invite_code, invite_ttl=0):
+        """
+        更换组织的邀请码并重新计算过期时间，旧邀请码立即失效，返回更新的行数
+        """
         self.ensure_connection()
-        sql = "UPDATE organizations SET is_deleted = TRUE WHERE c_id = %s"
-        val = (c_id,)
+        sql = """
+              UPDATE organizations SET invite_code = %s, invite_expire_time = IF(%s > 0, NOW() + INTERVAL %s SECOND, NULL)
+              WHERE c_id = %s AND is_deleted = FALSE
+              """
         try:
-            self.cursor.execute(sql, val)
-            self.db.commit()
+            self.cursor.execute(sql, (invite_code, invite_ttl, invite_ttl, c_id))
+            self._commit()
             return self.cursor.rowcount
+        except mysql.connector.Error as err:
+            self._rollback()
+            if _is_invite_code_conflict(err):
+                raise InviteCodeConflict(invite_code) from err
+            logger.error(f"Error rotating invite code: {err}")
+            raise
+
+    def get_organization_id_by_invite_code(self, invite_code):
+        """
+        通过邀请码唯一索引查找组织ID，邀请码不存在、已过期或组织已删除时返回 None
+        """
+        self.ensure_connection()
+        try:
+            sql = """
+                  SELECT c_id FROM organizations
+                  WHERE invite_code = %s AND is_deleted = FALSE
+                  AND (invite_expire_time IS NULL OR invite_expire_time > NOW())
+                  """
+            self.cursor.execute(sql, (invite_code,))
+            result = self.cursor.fetchone()
+            return result[0] if result else None
+        except mysql.connector.Error as err:
+            logger.error(f"通过邀请码查找组织时发生错误: {err}")
+            raise
+
+    def join_organization_by_invite_code(self, user_id, invite_code):
+        """
+        凭邀请码加入组织，邀请码校验和写入成员关系在同一条语句中完成
+        返回 (组织ID, 是否新加入)，邀请码无效时组织ID为 None
+        """
+        c_id = self.get_organization_id_by_invite_code(invite_code)
+        if c_id is None:
+            return None, False
+        sql = """
+              INSERT IGNORE INTO user_org_relations (u_id, c_id)
+              SELECT %s, c_id FROM organizations
+              WHERE c_id = %s AND invite_code = %s AND is_deleted = FALSE
+              AND (invite_expire_time IS NULL OR invite_expire_time > NOW())
+              """
+        try:
+            self.cursor.execute(sql, (user_id, c_id, invite_code))
+            self._commit()
+            return c_id, self.cursor.rowcount > 0
+        except mysql.connector.Error as err:
+            logger.error(f"Error joining organization by invite code: {err}")
+            self._rollback()
+            raise
+
+    @invalidates("organization", "c_id")
+    @invalidates("tasks", "c_id")
+    def delete_organization(self, c_id):
+        """
+        删除组织，其子组织上移到被删除组织的父组织下
+        """
+        self.ensure_connection()
+        try:
+            with self.transaction():
+                self.cursor.execute("UPDATE organizations SET is_deleted = TRUE WHERE c_id = %s", (c_id,))
+                rows_affected = self.cursor.rowcount
+                sql = """
+                      UPDATE organizations child JOIN organizations deleted ON deleted.c_id = child.parent_id
+                      SET child.parent_id = deleted.parent_id
+                      WHERE deleted.c_id = %s
+                      """
+                self.cursor.execute(sql, (c_id,))
+                # 经过被删除组织的路径深度减一
+                sql = """
+                      UPDATE organization_closure path
+                      JOIN organization_closure up ON up.ancestor_id = path.ancestor_id AND up.descendant_id = %s AND up.depth > 0
+                      JOIN organization_closure down ON down.descendant_id = path.descendant_id AND down.ancestor_id = %s AND down.depth > 0
+                      SET path.depth = path.depth - 1
+                      """
+                self.cursor.execute(sql, (c_id, c_id))
+                self.cursor.execute("DELETE FROM organization_closure WHERE ancestor_id = %s OR descendant_id = %s", (c_id, c_id))
+            return rows_affected
         except mysql.connector.Error as err:
             logger.error(f"Error deleting organization: {err}")
-            self.db.rollback()
             raise
+
+    @invalidates("organization", "c_id")
+    def move_organization(self, c_id, parent_id):
+        """
+        将组织及其子树移动到新的父组织下，parent_id 为空时成为顶级组织
+        """
+        self.ensure_connection()
+        try:
+            with self.transaction():
+                # 删除子树外部祖先到子树内各节点的路径
+                sql = """
+                      DELETE path FROM organization_closure path
+                      JOIN organization_closure subtree ON subtree.descendant_id = path.descendant_id AND subtree.ancestor_id = %s
+                      LEFT JOIN organization_closure inner_path ON inner_path.ancestor_id = %s AND inner_path.descendant_id = path.ancestor_id
+                      WHERE inner_path.ancestor_id IS NULL
+                      """
+                self.cursor.execute(sql, (c_id, c_id))
+                # 新父组织的所有祖先与子树各节点两两相连
+                sql = """
+                      INSERT INTO organization_closure (ancestor_id, descendant_id, depth)
+                      SELECT up.ancestor_id, subtree.descendant_id, up.depth + subtree.depth + 1
+                      FROM organization_closure up JOIN organization_closure subtree
+                      WHERE up.descendant_id = %s AND subtree.ancestor_id = %s
+                      """
+                self.cursor.execute(sql, (parent_id, c_id))
+                self.cursor.execute("UPDATE organizations SET parent_id = %s WHERE c_id = %s", (parent_id, c_id))
+                return self.cursor.rowcount
+        except mysql.connector.Error as err:
+            logger.error(f"Error moving organization: {err}")
+            raise
+
+    @read_only
+    def is_descendant_organization(self, c_id, ancestor_id):
+        """
+        检查组织是否为另一组织自身或其子孙组织
+        """
+        self.ensure_connection()
+        sql = "SELECT COUNT(*) FROM organization_closure WHERE ancestor_id = %s AND descendant_id = %s"
+        self.cursor.execute(sql, (ancestor_id, c_id))
+        return self.cursor.fetchone()[0] > 0
+
+    @read_only
+    def get_subtree_tasks(self, c_id, task_state=None, limit=50, offset=0, since=None):
+        """
+        获取组织及其所有子孙组织中的任务，since 不为空时只返回该时间之后发布的任务
+        """
+        self.ensure_connection()
+        try:
+            sql = """
+                  SELECT t.* FROM organization_closure oc JOIN tasks t ON t.c_id = oc.descendant_id
+                  WHERE oc.ancestor_id = %s AND t.is_deleted = FALSE
+                  """
+            val = (c_id,)
+            if task_state is not None:
+                sql += " AND t.task_state = %s"
+                val += (task_state,)
+            if since is not None:
+                sql += " AND t.publish_time >= %s"
+                val += (since,)
+            sql += " ORDER BY t.task_id LIMIT %s OFFSET %s"
+            val += (limit, offset)
+            self.cursor.execute(sql, val)
+            return [_task_to_dict(result) for result in self.cursor.fetchall()]
+        except mysql.connector.Error as err:
+            logger.error(f"获取子树任务列表时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_subtree_members(self, c_id, limit=50, offset=0):
+        """
+        获取组织及其所有子孙组织中的成员（去重）
+        """
+        self.ensure_connection()
+        try:
+            sql = """
+                  SELECT DISTINCT u.u_id, u.u_name
+                  FROM organization_closure oc
+                  JOIN user_org_relations uo ON uo.c_id = oc.descendant_id
+                  JOIN users u ON u.u_id = uo.u_id
+                  WHERE oc.ancestor_id = %s AND u.is_deleted = FALSE
+                  ORDER BY u.u_id LIMIT %s OFFSET %s
+                  """
+            self.cursor.execute(sql, (c_id, limit, offset))
+            return [{"user_id": result[0], "username": result[1]} for result in self.cursor.fetchall()]
+        except mysql.connector.Error as err:
+            logger.error(f"获取子树成员列表时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_subtree_stats(self, c_id):
+        """
+        统计组织子树中的组织数、成员数以及各状态任务数，成员数与 get_subtree_members 一致，不含已删除的用户
+        """
+        self.ensure_connection()
+        try:
+            sql = """
+                  SELECT COUNT(DISTINCT oc.descendant_id), COUNT(DISTINCT u.u_id)
+                  FROM organization_closure oc
+                  LEFT JOIN user_org_relations uo ON uo.c_id = oc.descendant_id
+                  LEFT JOIN users u ON u.u_id = uo.u_id AND u.is_deleted = FALSE
+                  WHERE oc.ancestor_id = %s
+                  """
+            self.cursor.execute(sql, (c_id,))
+            organization_count, member_count = self.cursor.fetchone()
+            sql = """
+                  SELECT tc.task_state, SUM(tc.task_count) FROM organization_closure oc
+                  JOIN org_task_counters tc ON tc.c_id = oc.descendant_id
+                  WHERE oc.ancestor_id = %s
+                  GROUP BY tc.task_state
+                  HAVING SUM(tc.task_count) > 0
+                  """
+            self.cursor.execute(sql, (c_id,))
+            task_counts = {result[0]: int(result[1]) for result in self.cursor.fetchall()}
+            return {
+                "organization_count": organization_count,
+                "member_count": member_count,
+                "task_counts": task_counts
+            }
+        except mysql.connector.Error as err:
+            logger.error(f"统计子树信息时发生错误: {err}")
+            raise
+
     def add_user_to_organization(self, user_id, organization_id):
         """
         将用户添加到组织
@@ -223,10 +928,48 @@ class EarthFighterDAO:
         val = (user_id, organization_id)
         try:
             self.cursor.execute(sql, val)
-            self.db.commit()
+            self._commit()
         except mysql.connector.Error as err:
             logger.error(f"Error adding user to organization: {err}")
-            self.db.rollback()
+            self._rollback()
+            raise
+
+    def add_users_to_organization(self, user_ids, organization_id):
+        """
+        批量将用户添加到组织，已是成员的用户会被忽略，返回新增的成员数
+        """
+        if not user_ids:
+            return 0
+        self.ensure_connection()
+        rows = ", ".join(["(%s, %s)"] * len(user_ids))
+        sql = f"INSERT IGNORE INTO user_org_relations (u_id, c_id) VALUES {rows}"
+        val = []
+        for user_id in user_ids:
+            val.extend([user_id, organization_id])
+        try:
+            self.cursor.execute(sql, tuple(val))
+            self._commit()
+            return self.cursor.rowcount
+        except mysql.connector.Error as err:
+            logger.error(f"Error adding users to organization: {err}")
+            self._rollback()
+            raise
+
+    @read_only
+    def get_organization_member_ids(self, organization_id, user_ids):
+        """
+        返回给定用户中已是组织成员的用户ID集合
+        """
+        if not user_ids:
+            return set()
+        self.ensure_connection()
+        try:
+            sql = f"SELECT u_id FROM user_org_relations WHERE c_id = %s AND u_id IN ({_placeholders(user_ids)})"
+            val = (organization_id,) + tuple(user_ids)
+            self.cursor.execute(sql, val)
+            return {result[0] for result in self.cursor.fetchall()}
+        except mysql.connector.Error as err:
+            logger.error(f"查询组织成员时发生错误: {err}")
             raise
 
     def remove_user_from_organization(self, user_id, organization_id):
@@ -238,27 +981,72 @@ class EarthFighterDAO:
         val = (user_id, organization_id)
         try:
             self.cursor.execute(sql, val)
-            self.db.commit()
+            self._commit()
         except mysql.connector.Error as err:
             logger.error(f"Error removing user from organization: {err}")
-            self.db.rollback()
+            self._rollback()
             raise
         
-    def publish_task(self, task_name, publisher_id, receiver_id, task_state, time_limit, c_id, task_desc):
+    @invalidates("tasks", "c_id")
+    def publish_task(self, task_name, publisher_id, receiver_id, task_state, time_limit, c_id, task_desc, priority=0):
         self.ensure_connection()
         sql = """
-                INSERT INTO tasks (task_name, publisher_id, receiver_id, task_state, publish_time, time_limit, c_id, task_desc) 
-                 VALUES (%s, %s, %s, %s, NOW(), %s, %s, %s)
+                INSERT INTO tasks (task_name, publisher_id, receiver_id, task_state, publish_time, time_limit, c_id, task_desc, priority) 
+                 VALUES (%s, %s, %s, %s, NOW(), %s, %s, %s, %s)
               """
-        val = (task_name, publisher_id, receiver_id, task_state, time_limit, c_id, task_desc)
+        val = (task_name, publisher_id, receiver_id, task_state, time_limit, c_id, task_desc, priority)
         try:
-            self.cursor.execute(sql, val)
-            self.db.commit()
-            return self.cursor.lastrowid
+            with self.transaction():
+                self.cursor.execute(sql, val)
+                task_id = self.cursor.lastrowid
+                self._apply_task_counter_deltas([(c_id, receiver_id, task_state, 1)])
+            return task_id
         except mysql.connector.Error as err:
             logger.error(f"Error publishing task: {err}")
-            self.db.rollback()
             raise
+    @invalidates("tasks", "c_id")
+    def _auto_increment_consecutive(self):
+        """
+        innodb_autoinc_lock_mode 为 0 或 1 时，一条行数已知的多行 INSERT 分配的自增ID按步长连续；
+        为 2（MySQL 8 的默认值）时并发插入的ID可能交错
+        """
+        if self._consecutive_auto_increment is None:
+            self.cursor.execute("SELECT @@innodb_autoinc_lock_mode")
+            self._consecutive_auto_increment = int(self.cursor.fetchone()[0]) <= 1
+        return self._consecutive_auto_increment
+
+    def publish_tasks(self, tasks, publisher_id, task_state, c_id):
+        """
+        批量发布任务，返回按输入顺序排列的任务ID列表
+        自增ID连续时使用一条多行INSERT写入；否则在同一事务中逐行写入，以取得每行确切的ID
+        """
+        self.ensure_connection()
+        row = "(%s, %s, NULL, %s, NOW(), %s, %s, %s, %s)"
+        sql = """
+                INSERT INTO tasks (task_name, publisher_id, receiver_id, task_state, publish_time, time_limit, c_id, task_desc, priority)
+                 VALUES {rows}
+              """
+        values = [(task['task_name'], publisher_id, task_state, task['time_limit'], c_id, task['task_desc'], task.get('priority', 0))
+                  for task in tasks]
+        try:
+            with self.transaction():
+                if self._auto_increment_consecutive():
+                    self.cursor.execute(sql.format(rows=", ".join([row] * len(tasks))),
+                                        tuple(value for task_values in values for value in task_values))
+                    # lastrowid为第一行的ID，其余按 id_step 递增
+                    first_id = self.cursor.lastrowid
+                    task_ids = [first_id + i * self.id_step for i in range(self.cursor.rowcount)]
+                else:
+                    task_ids = []
+                    for task_values in values:
+                        self.cursor.execute(sql.format(rows=row), task_values)
+                        task_ids.append(self.cursor.lastrowid)
+                self._apply_task_counter_deltas([(c_id, None, task_state, len(tasks))])
+            return task_ids
+        except mysql.connector.Error as err:
+            logger.error(f"Error publishing tasks: {err}")
+            raise
+
     def get_task_status(self, task_id):
         """
         获取任务状态
@@ -276,49 +1064,177 @@ class EarthFighterDAO:
         except mysql.connector.Error as err:
             logger.error(f"获取任务状态时发生错误: {err}")
             raise
+    @invalidates("tasks", "task_id", owner="get_organization_id_by_task_id")
     def update_task_status(self, task_id, task_status):
         """
         更新任务状态
         """
-        self.ensure_connection()
         try:
-            sql = "UPDATE tasks SET task_state = %s WHERE task_id = %s"
-            val = (task_status, task_id)
-            self.cursor.execute(sql, val)
-            self.db.commit()
-            return self.cursor.rowcount
+            with self.transaction():
+                before = self._lock_tasks([task_id])
+                sql = "UPDATE tasks SET task_state = %s WHERE task_id = %s"
+                val = (task_status, task_id)
+                self.cursor.execute(sql, val)
+                rows_affected = self.cursor.rowcount
+                self._apply_task_transitions(before, {tid: (c_id, receiver_id, task_status)
+                                                      for tid, (c_id, receiver_id, _) in before.items()})
+            return rows_affected
         except mysql.connector.Error as err:
             logger.error(f"更新任务状态时发生错误: {err}")
-            self.db.rollback()
             raise
+    @invalidates("tasks", "task_id", owner="get_organization_id_by_task_id")
     def update_task_status_and_receiver(self, task_id, task_status, receiver_id):
         """
         更新任务状态和接收者
         """
-        self.ensure_connection()
         try:
-            sql = "UPDATE tasks SET task_state = %s, receiver_id = %s WHERE task_id = %s"
-            val = (task_status, receiver_id, task_id)
-            self.cursor.execute(sql, val)
-            self.db.commit()
-            return self.cursor.rowcount
+            with self.transaction():
+                before = self._lock_tasks([task_id])
+                sql = "UPDATE tasks SET task_state = %s, receiver_id = %s WHERE task_id = %s"
+                val = (task_status, receiver_id, task_id)
+                self.cursor.execute(sql, val)
+                rows_affected = self.cursor.rowcount
+                self._apply_task_transitions(before, {tid: (c_id, receiver_id, task_status)
+                                                      for tid, (c_id, _, _) in before.items()})
+            return rows_affected
         except mysql.connector.Error as err:
             logger.error(f"更新任务状态和接收者时发生错误: {err}")
-            self.db.rollback()
             raise
-    def is_organization_creator(self, organization_id, user_id):
+    @invalidates("tasks", "c_id")
+    def claim_next_task(self, c_id, receiver_id, pending_state, in_progress_state):
         """
-        检查用户是否为组织的创建者
+        在一个事务中领取组织内优先级最高、发布最早的待接取任务，已被其他事务锁定的任务会被跳过
+        返回领取到的任务ID，没有可领取的任务时返回 None
+        """
+        try:
+            with self.transaction():
+                sql = """
+                      SELECT task_id, receiver_id FROM tasks
+                      WHERE c_id = %s AND task_state = %s AND is_deleted = FALSE
+                      ORDER BY priority DESC, task_id
+                      LIMIT 1
+                      FOR UPDATE SKIP LOCKED
+                      """
+                self.cursor.execute(sql, (c_id, pending_state))
+                result = self.cursor.fetchone()
+                if not result:
+                    return None
+                sql = "UPDATE tasks SET task_state = %s, receiver_id = %s WHERE task_id = %s"
+                self.cursor.execute(sql, (in_progress_state, receiver_id, result[0]))
+                self._apply_task_counter_deltas([(c_id, result[1], pending_state, -1),
+                                                 (c_id, receiver_id, in_progress_state, 1)])
+                return result[0]
+        except mysql.connector.Error as err:
+            logger.error(f"领取任务时发生错误: {err}")
+            raise
+
+    @invalidates("tasks", "task_id", owner="get_organization_id_by_task_id")
+    def complete_task(self, task_id, from_state, completed_state, overdue_state, score_periods=(), completed_at=None):
+        """
+        确认完成任务，超过截止时间的记为逾期完成，返回任务的最终状态
+        按时完成时在同一事务中为接收者累加 score_periods 中各周期的积分
+        completed_at 为完成时间（默认为数据库当前时间），score_periods 中的周应按它计算
+        """
+        try:
+            with self.transaction():
+                before = self._lock_tasks([task_id])
+                sql = """
+                      UPDATE tasks SET completion_time = COALESCE(%s, NOW()),
+                      task_state = IF(time_limit > 0 AND publish_time + INTERVAL time_limit SECOND < COALESCE(%s, NOW()), %s, %s)
+                      WHERE task_id = %s AND task_state = %s
+                      """
+                val = (completed_at, completed_at, overdue_state, completed_state, task_id, from_state)
+                self.cursor.execute(sql, val)
+                if self.cursor.rowcount == 0:
+                    return None
+                task_state = self.get_task_status(task_id)
+                c_id, receiver_id, _ = before[task_id]
+                self._apply_task_transitions(before, {task_id: (c_id, receiver_id, task_state)})
+                if task_state == completed_state and receiver_id is not None and c_id is not None and score_periods:
+                    sql = f"""
+                          INSERT INTO member_scores (c_id, period, u_id, score) VALUES {", ".join(["(%s, %s, %s, 1)"] * len(score_periods))}
+                          ON DUPLICATE KEY UPDATE score = score + 1
+                          """
+                    self.cursor.execute(sql, tuple(value for period in score_periods for value in (c_id, period, receiver_id)))
+            return task_state
+        except mysql.connector.Error as err:
+            logger.error(f"确认任务时发生错误: {err}")
+            raise
+
+    def get_db_now(self):
+        """
+        获取数据库当前时间
         """
         self.ensure_connection()
-        sql = "SELECT COUNT(*) FROM organizations WHERE c_id = %s AND creator_id = %s"
-        val = (organization_id, user_id)
-        self.cursor.execute(sql, val)
-        result = self.cursor.fetchone()
-        return result[0] > 0
-    def is_user_in_organization(self, user_id, organization_id):
+        self.cursor.execute("SELECT NOW()")
+        return self.cursor.fetchone()[0]
+
+    def get_db_timestamp(self):
         """
-        检查用户是否为组织成员
+        获取数据库当前的Unix时间戳
+        """
+        self.ensure_connection()
+        self.cursor.execute("SELECT UNIX_TIMESTAMP()")
+        return float(self.cursor.fetchone()[0])
+
+    def get_task_deadlines(self, task_states, since=None):
+        """
+        获取指定状态且有时间限制的任务截止时间(Unix时间戳)，since 不为空时只返回该时间之后发布的任务
+        """
+        self.ensure_connection()
+        try:
+            sql = f"""
+                  SELECT task_id, UNIX_TIMESTAMP(publish_time) + time_limit FROM tasks
+                  WHERE task_state IN ({_placeholders(task_states)}) AND time_limit > 0 AND is_deleted = FALSE
+                  """
+            val = tuple(task_states)
+            if since is not None:
+                sql += " AND publish_time >= FROM_UNIXTIME(%s)"
+                val += (since,)
+            self.cursor.execute(sql, val)
+            return [(result[0], float(result[1])) for result in self.cursor.fetchall()]
+        except mysql.connector.Error as err:
+            logger.error(f"获取任务截止时间时发生错误: {err}")
+            raise
+
+    @invalidates("tasks")
+    def expire_tasks(self, task_ids, expired_state, active_states):
+        """
+        将一批到期任务更新为已过期，已离开活动状态的任务保持不变，返回更新的行数
+        """
+        if not task_ids:
+            return 0
+        try:
+            with self.transaction():
+                before = {task_id: row for task_id, row in self._lock_tasks(task_ids).items() if row[2] in active_states}
+                if not before:
+                    return 0
+                sql = f"UPDATE tasks SET task_state = %s WHERE task_id IN ({_placeholders(before)})"
+                val = (expired_state,) + tuple(before)
+                self.cursor.execute(sql, val)
+                rows_affected = self.cursor.rowcount
+                self._apply_task_transitions(before, {task_id: (c_id, receiver_id, expired_state)
+                                                      for task_id, (c_id, receiver_id, _) in before.items()})
+            return rows_affected
+        except mysql.connector.Error as err:
+            logger.error(f"批量更新过期任务时发生错误: {err}")
+            raise
+
+    @read_only
+    def is_organization_creator(self, organization_id, user_id):
+        """
+        检查用户是否为组织的创建者
+        """
+        self.ensure_connection()
+        sql = "SELECT COUNT(*) FROM organizations WHERE c_id = %s AND creator_id = %s"
+        val = (organization_id, user_id)
+        self.cursor.execute(sql, val)
+        result = self.cursor.fetchone()
+        return result[0] > 0
+    @read_only
+    def is_user_in_organization(self, user_id, organization_id):
+        """
+        检查用户是否为组织成员
         """
         self.ensure_connection()
         sql = "SELECT COUNT(*) FROM user_org_relations WHERE u_id = %s AND c_id = %s"
@@ -327,6 +1243,9 @@ class EarthFighterDAO:
         result = self.cursor.fetchone()
         return result[0] > 0
     
+    @single_flight
+    @cached("organization", "c_id")
+    @read_only
     def get_organization(self, c_id):
         """
         获取组织信息
@@ -345,13 +1264,17 @@ class EarthFighterDAO:
                     "c_type": result[2],
                     "creator_id": result[3],
                     "invite_code": result[4],
-                    "create_time": result[5]                }
+                    "create_time": result[5],
+                    "parent_id": result[7],
+                    "invite_expire_time": result[8]
+                }
             else:
                 return None
         except mysql.connector.Error as err:
             logger.error(f"获取组织信息时发生错误: {err}")
             raise
 
+    @read_only
     def get_organizations(self, number=10):
         """
         获取组织列表
@@ -370,13 +1293,16 @@ class EarthFighterDAO:
                     "c_type": result[2],      
                     "creator_id": result[3],
                     "invite_code": result[4],
-                    "create_time": result[5]
+                    "create_time": result[5],
+                    "parent_id": result[7],
+                    "invite_expire_time": result[8]
                 })
             return organizations
         except mysql.connector.Error as err:
             logger.error(f"获取组织列表时发生错误: {err}")
             raise
 
+    @read_only
     def get_organization_id_by_task_id(self, task_id):
         """
         根据任务ID获取组织ID
@@ -395,6 +1321,7 @@ class EarthFighterDAO:
             logger.error(f"获取组织ID时发生错误: {err}")
             raise
     
+    @read_only
     def get_task_by_id(self, task_id):
         """
         根据任务ID获取任务信息
@@ -407,40 +1334,33 @@ class EarthFighterDAO:
             result = self.cursor.fetchone()
             if result:
                 logger.debug(f"{__name__}查询结果: {result}")
-                return {
-                    "task_id": result[0],
-                    "task_name": result[1],        
-                    "publisher_id": result[2],
-                    "receiver_id": result[3],
-                    "task_state": result[4],
-                    "publish_time": result[5],
-                    "time_limit": result[6],
-                    "completion_time": result[7],
-                    "c_id": result[9],
-                    "task_desc": result[10]
-                }
+                return _task_to_dict(result)
             else:
                 return None
         except mysql.connector.Error as err:
             logger.error(f"获取任务信息时发生错误: {err}")
             raise
 
+    @invalidates("tasks", "task_id", owner="get_organization_id_by_task_id")
     def delete_task(self, task_id):
         """
         删除任务
         """
-        self.ensure_connection()
         try:
-            sql = "DELETE FROM tasks WHERE task_id = %s"
-            val = (task_id,)
-            self.cursor.execute(sql, val)
-            self.db.commit()
-            return self.cursor.rowcount
+            with self.transaction():
+                before = self._lock_tasks([task_id])
+                sql = "DELETE FROM tasks WHERE task_id = %s"
+                val = (task_id,)
+                self.cursor.execute(sql, val)
+                rows_affected = self.cursor.rowcount
+                self._apply_task_transitions(before, {})
+            return rows_affected
         except mysql.connector.Error as err:
             logger.error(f"Error deleting task: {err}")
-            self.db.rollback()
             raise
 
+    @cached("user", "user_id")
+    @read_only
     def get_user_base_info(self, user_id):
         """
         获取用户基本信息
@@ -462,6 +1382,28 @@ class EarthFighterDAO:
             logger.error(f"获取用户基本信息时发生错误: {err}")
             raise
 
+    @read_only
+    def search_users_by_prefix(self, prefix, limit):
+        """
+        按用户名前缀查找未删除的用户，按用户名排序
+        在 (is_deleted, u_name) 索引上从前缀处开始做范围扫描，不会扫描已删除用户
+        """
+        self.ensure_connection()
+        try:
+            # 以前缀为下界，锚定开头的 LIKE 由 MySQL 按当前排序规则换算为上界，二者合起来是一段索引范围
+            pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            sql = """
+                  SELECT u_id, u_name FROM users
+                  WHERE is_deleted = FALSE AND u_name >= %s AND u_name LIKE %s
+                  ORDER BY u_name LIMIT %s
+                  """
+            self.cursor.execute(sql, (prefix, pattern, limit))
+            return [{"user_id": result[0], "username": result[1]} for result in self.cursor.fetchall()]
+        except mysql.connector.Error as err:
+            logger.error(f"按前缀搜索用户时发生错误: {err}")
+            raise
+
+    @read_only
     def get_user_all_info(self, user_id):
         """
         获取用户所有信息
@@ -484,6 +1426,7 @@ class EarthFighterDAO:
             logger.error(f"获取用户所有信息时发生错误: {err}")
             raise
 
+    @read_only
     def get_user_info_by_name(self, user_name):
         """
         根据用户名获取用户信息
@@ -506,6 +1449,39 @@ class EarthFighterDAO:
             logger.error(f"获取用户信息时发生错误: {err}")
             raise
             
+    @read_only
+    def get_user_ids_by_names(self, user_names):
+        """
+        根据用户名批量获取用户ID，返回 {用户名: 用户ID}
+        """
+        if not user_names:
+            return {}
+        self.ensure_connection()
+        try:
+            sql = f"SELECT u_id, u_name FROM users WHERE u_name IN ({_placeholders(user_names)}) AND is_deleted = FALSE"
+            self.cursor.execute(sql, tuple(user_names))
+            return {result[1]: result[0] for result in self.cursor.fetchall()}
+        except mysql.connector.Error as err:
+            logger.error(f"批量获取用户ID时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_existing_user_ids(self, user_ids):
+        """
+        返回给定ID中存在且未删除的用户ID集合
+        """
+        if not user_ids:
+            return set()
+        self.ensure_connection()
+        try:
+            sql = f"SELECT u_id FROM users WHERE u_id IN ({_placeholders(user_ids)}) AND is_deleted = FALSE"
+            self.cursor.execute(sql, tuple(user_ids))
+            return {result[0] for result in self.cursor.fetchall()}
+        except mysql.connector.Error as err:
+            logger.error(f"批量校验用户ID时发生错误: {err}")
+            raise
+
+    @read_only
     def get_user_organizations(self, u_id):
         """
         获取用户所属的组织列表
@@ -534,61 +1510,725 @@ class EarthFighterDAO:
             logger.error(f"获取用户组织列表时发生错误: {err}")
             raise
 
-    def get_tasks_by_organization(self, c_id):
+    @single_flight
+    @cached("tasks", "c_id")
+    @read_only
+    def get_tasks_by_organization(self, c_id, since=None):
         """
-        根据组织ID获取任务列表
+        根据组织ID获取任务列表，since 不为空时只返回该时间之后发布的任务（分区表上可裁剪分区）
         """
         self.ensure_connection()
         try:
             sql = "SELECT * FROM tasks WHERE c_id = %s AND is_deleted = FALSE"
             val = (c_id,)
+            if since is not None:
+                sql += " AND publish_time >= %s"
+                val += (since,)
+            if limit is not None:
+                sql += " ORDER BY task_id DESC LIMIT %s"
+                val += (limit,)
             self.cursor.execute(sql, val)
             results = self.cursor.fetchall()
-            tasks = []
-            for result in results:
-                tasks.append({
-                    "task_id": result[0],
-                    "task_name": result[1],
-                    "publisher_id": result[2],
-                    "receiver_id": result[3],
-                    "task_state": result[4],
-                    "publish_time": result[5],
-                    "time_limit": result[6],
-                    "completion_time": result[7],
-                    "c_id": result[9],
-                    "task_desc": result[10]
-                })
-            return tasks
+            return [_task_to_dict(result) for result in results]
         except mysql.connector.Error as err:
             logger.error(f"获取任务列表时发生错误: {err}")
             raise
-    def get_tasks_by_user(self, u_id):
+    @read_only
+    def get_tasks_by_user(self, u_id, since=None, limit=None):
         """
-        根据组织ID获取任务列表
+        根据组织ID获取任务列表，since 不为空时只返回该时间之后发布的任务（分区表上可裁剪分区）；
+        limit 不为空时只按任务ID倒序返回最新的 limit 个任务
         """
         self.ensure_connection()
         try:
             sql = "SELECT * FROM tasks WHERE (receiver_id = %s OR publisher_id = %s) AND is_deleted = FALSE"
             val = (u_id, u_id)
+            if since is not None:
+                sql += " AND publish_time >= %s"
+                val += (since,)
             self.cursor.execute(sql, val)
             results = self.cursor.fetchall()
+            return [_task_to_dict(result) for result in results]
+        except mysql.connector.Error as err:
+            logger.error(f"获取任务列表时发生错误: {err}")
+            raise
+
+    def get_task_partitions(self):
+        """
+        获取任务表的分区，返回 [(分区名, 上界)]，上界为 Unix 时间戳，MAXVALUE 分区为 None；未分区时返回空列表
+        """
+        self.ensure_connection()
+        try:
+            sql = """
+                  SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS
+                  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND PARTITION_NAME IS NOT NULL
+                  ORDER BY PARTITION_ORDINAL_POSITION
+                  """
+            self.cursor.execute(sql)
+            return [(result[0], None if result[1] == 'MAXVALUE' else int(result[1])) for result in self.cursor.fetchall()]
+        except mysql.connector.Error as err:
+            logger.error(f"获取任务表分区时发生错误: {err}")
+            raise
+
+    def partition_tasks_table(self, partitions):
+        """
+        将任务表改为按 publish_time 的 RANGE 分区表，partitions 为 [(分区名, 上界时间)]，末尾自动追加 MAXVALUE 分区
+        分区表要求主键包含分区列，且不支持外键和全文索引，迁移时一并移除
+        """
+        self.ensure_connection()
+        try:
+            sql = """
+                  SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS
+                  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+                  """
+            self.cursor.execute(sql)
+            for (constraint_name,) in self.cursor.fetchall():
+                self.cursor.execute(f"ALTER TABLE tasks DROP FOREIGN KEY `{constraint_name}`")
+            sql = """
+                  SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+                  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND INDEX_TYPE = 'FULLTEXT'
+                  """
+            self.cursor.execute(sql)
+            for (index_name,) in self.cursor.fetchall():
+                self.cursor.execute(f"ALTER TABLE tasks DROP INDEX `{index_name}`")
+            self.cursor.execute("""
+                ALTER TABLE tasks MODIFY publish_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                DROP PRIMARY KEY, ADD PRIMARY KEY (task_id, publish_time)
+                """)
+            self.cursor.execute(f"""
+                ALTER TABLE tasks PARTITION BY RANGE (UNIX_TIMESTAMP(publish_time)) (
+                    {_partition_definitions(partitions)}
+                )
+                """, tuple(bound for _, bound in partitions))
+        except mysql.connector.Error as err:
+            logger.error(f"任务表分区迁移时发生错误: {err}")
+            raise
+
+    def add_task_partitions(self, partitions):
+        """
+        从 MAXVALUE 分区中拆分出新的分区，partitions 为 [(分区名, 上界时间)]，需按时间升序且晚于已有分区
+        """
+        if not partitions:
+            return
+        self.ensure_connection()
+        try:
+            sql = f"ALTER TABLE tasks REORGANIZE PARTITION {MAX_PARTITION} INTO ({_partition_definitions(partitions)})"
+            self.cursor.execute(sql, tuple(bound for _, bound in partitions))
+        except mysql.connector.Error as err:
+            logger.error(f"添加任务表分区时发生错误: {err}")
+            raise
+
+    def count_active_tasks_in_partition(self, partition_name, terminal_states):
+        """
+        统计任务表分区中未删除且未结束的任务数
+        """
+        self.ensure_connection()
+        try:
+            sql = f"""
+                  SELECT COUNT(*) FROM tasks PARTITION ({partition_name})
+                  WHERE is_deleted = FALSE AND task_state NOT IN ({_placeholders(terminal_states)})
+                  """
+            self.cursor.execute(sql, tuple(terminal_states))
+            return self.cursor.fetchone()[0]
+        except mysql.connector.Error as err:
+            logger.error(f"统计任务表分区中的任务时发生错误: {err}")
+            raise
+
+    def has_task_fulltext_index(self):
+        """
+        检查任务表是否有全文索引，结果缓存 FULLTEXT_CHECK_SECONDS 秒
+        """
+        now = time.monotonic()
+        if self._fulltext_index is not None and now - self._fulltext_checked_at < FULLTEXT_CHECK_SECONDS:
+            return self._fulltext_index
+        self.ensure_connection()
+        try:
+            sql = """
+                  SELECT COUNT(*) FROM information_schema.STATISTICS
+                  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND INDEX_TYPE = 'FULLTEXT'
+                  """
+            self.cursor.execute(sql)
+            self._fulltext_index = self.cursor.fetchone()[0] > 0
+            self._fulltext_checked_at = now
+            return self._fulltext_index
+        except mysql.connector.Error as err:
+            logger.error(f"检查任务表全文索引时发生错误: {err}")
+            raise
+
+    def drop_task_partitions(self, partition_names):
+        """
+        删除任务表分区，分区中的任务会被直接丢弃
+        """
+        if not partition_names:
+            return
+        self.ensure_connection()
+        try:
+            self.cursor.execute(f"ALTER TABLE tasks DROP PARTITION {', '.join(partition_names)}")
+        except mysql.connector.Error as err:
+            logger.error(f"删除任务表分区时发生错误: {err}")
+            raise
+
+    def get_earliest_task_publish_time(self):
+        """
+        获取任务表中最早的发布时间，表为空时返回 None
+        """
+        self.ensure_connection()
+        try:
+            self.cursor.execute("SELECT MIN(publish_time) FROM tasks")
+            return self.cursor.fetchone()[0]
+        except mysql.connector.Error as err:
+            logger.error(f"获取最早任务发布时间时发生错误: {err}")
+            raise
+
+    def get_task_id_range(self):
+        """
+        获取任务表当前的最小和最大任务ID，表为空时返回 (None, None)
+        """
+        self.ensure_connection()
+        try:
+            self.cursor.execute("SELECT MIN(task_id), MAX(task_id) FROM tasks")
+            return self.cursor.fetchone()
+        except mysql.connector.Error as err:
+            logger.error(f"获取任务ID范围时发生错误: {err}")
+            raise
+
+    @invalidates("tasks")
+    def archive_tasks(self, start_id, end_id, task_states, min_age_days):
+        """
+        将主键区间 (start_id, end_id] 内已结束且超过 min_age_days 天的任务移入归档表，返回归档的任务数
+        先用不加锁的一致性读找出候选任务，再按主键只锁定这些行并重新检查条件，区间内的其他任务不被锁定；
+        归档与删除在同一事务中完成
+        """
+        self.ensure_connection()
+        try:
+            conditions = f"""
+                  task_state IN ({_placeholders(task_states)})
+                  AND COALESCE(completion_time, publish_time) < NOW() - INTERVAL %s DAY
+                  """
+            condition_values = tuple(task_states) + (min_age_days,)
+            self.cursor.execute(f"SELECT task_id FROM tasks WHERE task_id > %s AND task_id <= %s AND {conditions}",
+                                (start_id, end_id) + condition_values)
+            candidates = [result[0] for result in self.cursor.fetchall()]
+            if not candidates:
+                return 0
+            with self.transaction():
+                # 候选任务可能在两次查询之间被修改，加锁时再检查一次条件
+                sql = f"SELECT task_id FROM tasks WHERE task_id IN ({_placeholders(candidates)}) AND {conditions} FOR UPDATE"
+                self.cursor.execute(sql, tuple(candidates) + condition_values)
+                task_ids = [result[0] for result in self.cursor.fetchall()]
+                if not task_ids:
+                    return 0
+                sql = f"""
+                      INSERT INTO tasks_archive ({TASK_COLUMNS}, archived_time)
+                      SELECT {TASK_COLUMNS}, NOW() FROM tasks WHERE task_id IN ({_placeholders(task_ids)})
+                      """
+                self.cursor.execute(sql, tuple(task_ids))
+                self.cursor.execute(f"DELETE FROM tasks WHERE task_id IN ({_placeholders(task_ids)})", tuple(task_ids))
+                return len(task_ids)
+        except mysql.connector.Error as err:
+            logger.error(f"归档任务时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_archived_tasks(self, c_id, limit=50, offset=0):
+        """
+        获取组织已归档的历史任务，按任务ID倒序
+        """
+        self.ensure_connection()
+        try:
+            sql = f"""
+                  SELECT {TASK_COLUMNS}, archived_time FROM tasks_archive
+                  WHERE c_id = %s AND is_deleted = FALSE
+                  ORDER BY task_id DESC LIMIT %s OFFSET %s
+                  """
+            self.cursor.execute(sql, (c_id, limit, offset))
             tasks = []
-            for result in results:
-                tasks.append({
-                    "task_id": result[0],
-                    "task_name": result[1],
-                    "publisher_id": result[2],
-                    "receiver_id": result[3],
-                    "task_state": result[4],
-                    "publish_time": result[5],
-                    "time_limit": result[6],
-                    "completion_time": result[7],
-                    "c_id": result[9],
-                    "task_desc": result[10]
-                })
+            for result in self.cursor.fetchall():
+                task = _task_to_dict(result)
+                task['archived_time'] = result[13]
+                tasks.append(task)
             return tasks
         except mysql.connector.Error as err:
-            logger.error(f"获取任务列表时发生错误: {err}")
+            logger.error(f"获取历史任务时发生错误: {err}")
+            raise
+
+    @read_only
+    def search_tasks(self, c_id, keyword, limit=50, offset=0, min_token_size=2):
+        """
+        在组织内按任务名称和描述全文搜索任务，按相关度排序
+        关键词短于 ngram 分词长度，或任务表没有全文索引（已分区的表不支持全文索引）时退化为 LIKE 匹配并按发布时间倒序
+        """
+        self.ensure_connection()
+        try:
+            if len(keyword) >= min_token_size and self.has_task_fulltext_index():
+                sql = """
+                      SELECT *, MATCH(task_name, task_desc) AGAINST (%s IN NATURAL LANGUAGE MODE) AS relevance FROM tasks
+                      WHERE c_id = %s AND is_deleted = FALSE AND MATCH(task_name, task_desc) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                      ORDER BY relevance DESC, task_id DESC
+                      LIMIT %s OFFSET %s
+                      """
+                val = (keyword, c_id, keyword, limit, offset)
+            else:
+                pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                sql = """
+                      SELECT *, 0 AS relevance FROM tasks
+                      WHERE c_id = %s AND is_deleted = FALSE AND (task_name LIKE %s OR task_desc LIKE %s)
+                      ORDER BY task_id DESC
+                      LIMIT %s OFFSET %s
+                      """
+                val = (c_id, pattern, pattern, limit, offset)
+            self.cursor.execute(sql, val)
+            tasks = []
+            for result in self.cursor.fetchall():
+                task = _task_to_dict(result)
+                task['relevance'] = float(result[-1])
+                tasks.append(task)
+            return tasks
+        except mysql.connector.Error as err:
+            logger.error(f"搜索任务时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_task_counts_by_organizations(self, c_ids, task_states):
+        """
+        批量读取多个组织中各状态的任务数量
+        """
+        if not c_ids or not task_states:
+            return {}
+        self.ensure_connection()
+        try:
+            sql = f"""
+                  SELECT c_id, task_state, task_count FROM org_task_counters
+                  WHERE c_id IN ({_placeholders(c_ids)}) AND task_state IN ({_placeholders(task_states)})
+                  AND task_count > 0
+                  """
+            val = tuple(c_ids) + tuple(task_states)
+            self.cursor.execute(sql, val)
+            results = self.cursor.fetchall()
+            counts = {}
+            for result in results:
+                counts.setdefault(result[0], {})[result[1]] = result[2]
+            return counts
+        except mysql.connector.Error as err:
+            logger.error(f"批量统计组织任务数量时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_organization_task_counters(self, c_id):
+        """
+        读取组织各状态的任务数量，返回 {任务状态: 数量}
+        """
+        self.ensure_connection()
+        try:
+            sql = "SELECT task_state, task_count FROM org_task_counters WHERE c_id = %s AND task_count > 0"
+            self.cursor.execute(sql, (c_id,))
+            return {result[0]: result[1] for result in self.cursor.fetchall()}
+        except mysql.connector.Error as err:
+            logger.error(f"获取组织任务计数时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_user_task_counters(self, u_id):
+        """
+        读取用户作为接收者的各状态任务数量，返回 {任务状态: 数量}
+        """
+        self.ensure_connection()
+        try:
+            sql = "SELECT task_state, task_count FROM user_task_counters WHERE u_id = %s AND task_count > 0"
+            self.cursor.execute(sql, (u_id,))
+            return {result[0]: result[1] for result in self.cursor.fetchall()}
+        except mysql.connector.Error as err:
+            logger.error(f"获取用户任务计数时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_member_scores(self, c_id, period):
+        """
+        获取组织在指定周期内所有成员的积分，返回 [(用户ID, 积分)]
+        """
+        self.ensure_connection()
+        try:
+            sql = "SELECT u_id, score FROM member_scores WHERE c_id = %s AND period = %s AND score > 0"
+            self.cursor.execute(sql, (c_id, period))
+            return self.cursor.fetchall()
+        except mysql.connector.Error as err:
+            logger.error(f"获取成员积分时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_user_names(self, user_ids):
+        """
+        批量获取用户名，返回 {用户ID: 用户名}
+        """
+        if not user_ids:
+            return {}
+        self.ensure_connection()
+        try:
+            sql = f"SELECT u_id, u_name FROM users WHERE u_id IN ({_placeholders(user_ids)})"
+            self.cursor.execute(sql, tuple(user_ids))
+            return {result[0]: result[1] for result in self.cursor.fetchall()}
+        except mysql.connector.Error as err:
+            logger.error(f"批量获取用户名时发生错误: {err}")
+            raise
+
+    def rebuild_member_scores(self, completed_state):
+        """
+        根据按时完成的任务全量重建成员积分，周积分按完成时间所在的 ISO 周（如 2024-W05）统计
+        """
+        self.ensure_connection()
+        try:
+            with self.transaction():
+                self.cursor.execute("DELETE FROM member_scores")
+                # 归档的任务仍计入积分
+                completed_tasks = """
+                    SELECT c_id, receiver_id, completion_time FROM tasks
+                    WHERE task_state = %s AND c_id IS NOT NULL AND receiver_id IS NOT NULL AND is_deleted = FALSE
+                    UNION ALL
+                    SELECT c_id, receiver_id, completion_time FROM tasks_archive
+                    WHERE task_state = %s AND c_id IS NOT NULL AND receiver_id IS NOT NULL AND is_deleted = FALSE
+                    """
+                self.cursor.execute(f"""
+                    INSERT INTO member_scores (c_id, period, u_id, score)
+                    SELECT c_id, 'all', receiver_id, COUNT(*) FROM ({completed_tasks}) completed
+                    GROUP BY c_id, receiver_id
+                    """, (completed_state, completed_state))
+                self.cursor.execute(f"""
+                    INSERT INTO member_scores (c_id, period, u_id, score)
+                    SELECT c_id, DATE_FORMAT(completion_time, '%%x-W%%v') AS period, receiver_id, COUNT(*) FROM ({completed_tasks}) completed
+                    WHERE completion_time IS NOT NULL
+                    GROUP BY c_id, period, receiver_id
+                    """, (completed_state, completed_state))
+        except mysql.connector.Error as err:
+            logger.error(f"重建成员积分时发生错误: {err}")
+            raise
+
+    def rebuild_task_counters(self):
+        """
+        根据任务表和归档表全量重建组织和用户任务计数，用于初始化或修复计数
+        """
+        self.ensure_connection()
+        try:
+            with self.transaction():
+                self.cursor.execute("DELETE FROM org_task_counters")
+                self.cursor.execute("DELETE FROM user_task_counters")
+                # 归档的任务仍计入统计
+                self.cursor.execute("""
+                    INSERT INTO org_task_counters (c_id, task_state, task_count)
+                    SELECT c_id, task_state, COUNT(*) FROM (
+                        SELECT c_id, task_state FROM tasks WHERE c_id IS NOT NULL AND is_deleted = FALSE
+                        UNION ALL
+                        SELECT c_id, task_state FROM tasks_archive WHERE c_id IS NOT NULL AND is_deleted = FALSE
+                    ) all_tasks
+                    GROUP BY c_id, task_state
+                    """)
+                self.cursor.execute("""
+                    INSERT INTO user_task_counters (u_id, task_state, task_count)
+                    SELECT receiver_id, task_state, COUNT(*) FROM (
+                        SELECT receiver_id, task_state FROM tasks WHERE receiver_id IS NOT NULL AND is_deleted = FALSE
+                        UNION ALL
+                        SELECT receiver_id, task_state FROM tasks_archive WHERE receiver_id IS NOT NULL AND is_deleted = FALSE
+                    ) all_tasks
+                    GROUP BY receiver_id, task_state
+                    """)
+        except mysql.connector.Error as err:
+            logger.error(f"重建任务计数时发生错误: {err}")
+            raise
+
+    def add_task_template(self, c_id, publisher_id, task_name, task_desc, time_limit, priority, cron_rule, assignees, next_run_time):
+        """
+        添加周期任务模板
+        """
+        self.ensure_connection()
+        sql = """
+              INSERT INTO task_templates (c_id, publisher_id, task_name, task_desc, time_limit, priority, cron_rule, assignees, next_run_time)
+              VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+              """
+        val = (c_id, publisher_id, task_name, task_desc, time_limit, priority, cron_rule, json.dumps(assignees), next_run_time)
+        try:
+            self.cursor.execute(sql, val)
+            self._commit()
+            return self.cursor.lastrowid
+        except mysql.connector.Error as err:
+            logger.error(f"Error adding task template: {err}")
+            self._rollback()
+            raise
+
+    @read_only
+    def get_task_template(self, template_id):
+        """
+        获取周期任务模板
+        """
+        self.ensure_connection()
+        try:
+            sql = f"SELECT {TEMPLATE_COLUMNS} FROM task_templates WHERE template_id = %s AND is_deleted = FALSE"
+            self.cursor.execute(sql, (template_id,))
+            result = self.cursor.fetchone()
+            return _template_to_dict(result) if result else None
+        except mysql.connector.Error as err:
+            logger.error(f"获取周期任务模板时发生错误: {err}")
+            raise
+
+    @read_only
+    def get_task_templates(self, c_id):
+        """
+        获取组织的周期任务模板列表
+        """
+        self.ensure_connection()
+        try:
+            sql = f"SELECT {TEMPLATE_COLUMNS} FROM task_templates WHERE c_id = %s AND is_deleted = FALSE"
+            self.cursor.execute(sql, (c_id,))
+            return [_template_to_dict(result) for result in self.cursor.fetchall()]
+        except mysql.connector.Error as err:
+            logger.error(f"获取周期任务模板列表时发生错误: {err}")
+            raise
+
+    def delete_task_template(self, template_id):
+        """
+        删除周期任务模板，已生成的任务保留
+        """
+        self.ensure_connection()
+        sql = "UPDATE task_templates SET is_deleted = TRUE WHERE template_id = %s"
+        try:
+            self.cursor.execute(sql, (template_id,))
+            self._commit()
+            return self.cursor.rowcount
+        except mysql.connector.Error as err:
+            logger.error(f"Error deleting task template: {err}")
+            self._rollback()
+            raise
+
+    def claim_due_templates(self, horizon, limit):
+        """
+        锁定下一次发布时间不晚于 horizon 的模板，已被其他调度器锁定的模板会被跳过，需在事务中调用
+        """
+        self.ensure_connection()
+        try:
+            sql = f"""
+                  SELECT {TEMPLATE_COLUMNS} FROM task_templates
+                  WHERE is_deleted = FALSE AND next_run_time <= %s
+                  ORDER BY next_run_time
+                  LIMIT %s
+                  FOR UPDATE SKIP LOCKED
+                  """
+            self.cursor.execute(sql, (horizon, limit))
+            return [_template_to_dict(result) for result in self.cursor.fetchall()]
+        except mysql.connector.Error as err:
+            logger.error(f"获取到期周期任务模板时发生错误: {err}")
+            raise
+
+    @invalidates("tasks")
+    def insert_task_occurrences(self, occurrences):
+        """
+        批量写入周期任务生成的任务，同一模板同一发布时间的任务已存在时忽略，返回写入的行数
+        """
+        if not occurrences:
+            return 0
+        self.ensure_connection()
+        try:
+            with self.transaction():
+                # 先排除已生成的任务，保证计数只累加实际写入的行
+                keys = ", ".join(["(%s, %s)"] * len(occurrences))
+                sql = f"SELECT template_id, publish_time FROM tasks WHERE (template_id, publish_time) IN ({keys}) FOR UPDATE"
+                self.cursor.execute(sql, tuple(value for occurrence in occurrences
+                                               for value in (occurrence['template_id'], occurrence['publish_time'])))
+                existing = set(self.cursor.fetchall())
+                occurrences = [occurrence for occurrence in occurrences
+                               if (occurrence['template_id'], occurrence['publish_time']) not in existing]
+                if not occurrences:
+                    return 0
+                rows = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(occurrences))
+                sql = f"""
+                      INSERT IGNORE INTO tasks (task_name, publisher_id, receiver_id, task_state, publish_time, time_limit, c_id, task_desc, priority, template_id)
+                      VALUES {rows}
+                      """
+                val = []
+                for occurrence in occurrences:
+                    val.extend([occurrence['task_name'], occurrence['publisher_id'], occurrence['receiver_id'], occurrence['task_state'],
+                                occurrence['publish_time'], occurrence['time_limit'], occurrence['c_id'], occurrence['task_desc'],
+                                occurrence['priority'], occurrence['template_id']])
+                self.cursor.execute(sql, tuple(val))
+                rows_affected = self.cursor.rowcount
+                self._apply_task_counter_deltas([(occurrence['c_id'], occurrence['receiver_id'], occurrence['task_state'], 1)
+                                                 for occurrence in occurrences])
+            return rows_affected
+        except mysql.connector.Error as err:
+            logger.error(f"Error inserting task occurrences: {err}")
+            raise
+
+    def advance_templates(self, progress):
+        """
+        批量更新模板的下一次发布时间和轮换位置，progress 为 [(模板ID, 下一次发布时间, 轮换位置)]
+        """
+        if not progress:
+            return 0
+        self.ensure_connection()
+        cases = " ".join(["WHEN %s THEN %s"] * len(progress))
+        sql = f"""
+              UPDATE task_templates
+              SET next_run_time = CASE template_id {cases} END,
+              rotation_index = CASE template_id {cases} END
+              WHERE template_id IN ({_placeholders(progress)})
+              """
+        val = []
+        for template_id, next_run_time, _ in progress:
+            val.extend([template_id, next_run_time])
+        for template_id, _, rotation_index in progress:
+            val.extend([template_id, rotation_index])
+        val.extend(template_id for template_id, _, _ in progress)
+        try:
+            self.cursor.execute(sql, tuple(val))
+            self._commit()
+            return self.cursor.rowcount
+        except mysql.connector.Error as err:
+            logger.error(f"Error advancing task templates: {err}")
+            self._rollback()
+            raise
+
+    def get_organization_shard(self, c_id):
+        """
+        从分片目录读取组织所在分片，返回 (分片名, 是否冻结)，未登记时返回 None
+        """
+        self.ensure_connection()
+        try:
+            sql = "SELECT shard_name, is_frozen FROM organization_shards WHERE c_id = %s"
+            self.cursor.execute(sql, (c_id,))
+            result = self.cursor.fetchone()
+            return (result[0], bool(result[1])) if result else None
+        except mysql.connector.Error as err:
+            logger.error(f"读取组织分片时发生错误: {err}")
+            raise
+
+    def get_shard_organization_counts(self):
+        """
+        统计分片目录中每个分片登记的组织数，返回 {分片名: 组织数}
+        """
+        self.ensure_connection()
+        try:
+            self.cursor.execute("SELECT shard_name, COUNT(*) FROM organization_shards GROUP BY shard_name")
+            return {result[0]: result[1] for result in self.cursor.fetchall()}
+        except mysql.connector.Error as err:
+            logger.error(f"统计分片组织数时发生错误: {err}")
+            raise
+
+    def set_organization_shard(self, c_id, shard_name, is_frozen=False):
+        """
+        登记或修改组织所在分片及冻结状态
+        """
+        self.ensure_connection()
+        try:
+            sql = """
+                  INSERT INTO organization_shards (c_id, shard_name, is_frozen) VALUES (%s, %s, %s)
+                  ON DUPLICATE KEY UPDATE shard_name = VALUES(shard_name), is_frozen = VALUES(is_frozen)
+                  """
+            self.cursor.execute(sql, (c_id, shard_name, is_frozen))
+            self._commit()
+        except mysql.connector.Error as err:
+            logger.error(f"登记组织分片时发生错误: {err}")
+            self._rollback()
+            raise
+
+    def get_subtree_organization_ids(self, c_id):
+        """
+        返回组织及其全部子孙组织的ID
+        """
+        self.ensure_connection()
+        try:
+            sql = "SELECT descendant_id FROM organization_closure WHERE ancestor_id = %s ORDER BY depth, descendant_id"
+            self.cursor.execute(sql, (c_id,))
+            return [result[0] for result in self.cursor.fetchall()]
+        except mysql.connector.Error as err:
+            logger.error(f"获取子孙组织时发生错误: {err}")
+            raise
+
+    def fetch_rows(self, table, column, values, order_by, limit, offset=0):
+        """
+        按 column IN values 分页读取表中的原始行，返回 (列名, 行列表)，用于在分片之间复制数据
+        """
+        self.ensure_connection()
+        try:
+            sql = f"SELECT * FROM {table} WHERE {column} IN ({_placeholders(values)}) ORDER BY {order_by} LIMIT %s OFFSET %s"
+            self.cursor.execute(sql, tuple(values) + (limit, offset))
+            return list(self.cursor.column_names), self.cursor.fetchall()
+        except mysql.connector.Error as err:
+            logger.error(f"读取{table}数据时发生错误: {err}")
+            raise
+
+    @invalidates("organization")
+    @invalidates("tasks")
+    def upsert_rows(self, table, columns, rows):
+        """
+        按主键写入原始行，已存在的行被覆盖；复制期间关闭外键检查，行之间的引用由调用方保证完整
+        """
+        if not rows:
+            return 0
+        self.ensure_connection()
+        try:
+            row_placeholders = f"({_placeholders(columns)})"
+            updates = ", ".join(f"{column} = VALUES({column})" for column in columns)
+            sql = f"""
+                  INSERT INTO {table} ({", ".join(columns)}) VALUES {", ".join([row_placeholders] * len(rows))}
+                  ON DUPLICATE KEY UPDATE {updates}
+                  """
+            self.cursor.execute("SET SESSION foreign_key_checks = 0")
+            try:
+                self.cursor.execute(sql, tuple(value for row in rows for value in row))
+            finally:
+                self.cursor.execute("SET SESSION foreign_key_checks = 1")
+            self._commit()
+            return len(rows)
+        except mysql.connector.Error as err:
+            logger.error(f"写入{table}数据时发生错误: {err}")
+            self._rollback()
+            raise
+
+    @invalidates("organization")
+    @invalidates("tasks")
+    def delete_rows(self, table, column, values):
+        """
+        删除 column IN values 的全部行，关闭外键检查以便按任意顺序删除
+        """
+        if not values:
+            return 0
+        self.ensure_connection()
+        try:
+            self.cursor.execute("SET SESSION foreign_key_checks = 0")
+            try:
+                self.cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({_placeholders(values)})", tuple(values))
+                rows_affected = self.cursor.rowcount
+            finally:
+                self.cursor.execute("SET SESSION foreign_key_checks = 1")
+            self._commit()
+            return rows_affected
+        except mysql.connector.Error as err:
+            logger.error(f"删除{table}数据时发生错误: {err}")
+            self._rollback()
+            raise
+
+    def adjust_user_task_counters(self, c_ids, sign):
+        """
+        按组织的任务（含归档）调整接收者的任务计数，sign 为 1 时计入、-1 时扣除，用于组织迁移分片
+        """
+        if not c_ids:
+            return
+        self.ensure_connection()
+        try:
+            with self.transaction():
+                sql = f"""
+                      SELECT receiver_id, task_state, COUNT(*) FROM (
+                          SELECT receiver_id, task_state FROM tasks
+                          WHERE c_id IN ({_placeholders(c_ids)}) AND receiver_id IS NOT NULL AND is_deleted = FALSE
+                          UNION ALL
+                          SELECT receiver_id, task_state FROM tasks_archive
+                          WHERE c_id IN ({_placeholders(c_ids)}) AND receiver_id IS NOT NULL AND is_deleted = FALSE
+                      ) all_tasks
+                      GROUP BY receiver_id, task_state
+                      """
+                self.cursor.execute(sql, tuple(c_ids) * 2)
+                changes = [(None, receiver_id, task_state, sign * count)
+                           for receiver_id, task_state, count in self.cursor.fetchall()]
+                self._apply_task_counter_deltas(changes)
+        except mysql.connector.Error as err:
+            logger.error(f"调整用户任务计数时发生错误: {err}")
             raise
 
     def close(self):
@@ -0,0 +1,189 @@
+"""
+主库多主机故障转移
+
+db_config.json 的 hosts 按优先级列出可作为主库的主机。后台线程定期探测各主机，
+探测失败的主机按带抖动的指数退避间隔重试，请求线程只在当前认为可用的主机上建立连接，不会等待或重试。
+优先级更高的主机恢复后，DAO 在下一次检查连接时切回该主机。
+"""
+import random
+import threading
+import time
+from collections import deque
+import mysql.connector
+from logger import LoggerFactory
+
+logger = LoggerFactory.getLogger()
+
+# 保留的故障转移记录数
+MAX_FAILOVER_EVENTS = 20
+
+
+def configured_hosts(config):
+    """
+    返回配置中按优先级排列的 (主机, 端口)，未配置 hosts 时使用 host 和 port
+    """
+    hosts = config.get('hosts') or [{"host": config['host'], "port": config.get('port', 3306)}]
+    return [(host['host'], host.get('port', 3306)) for host in hosts]
+
+
+class HostState:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.healthy = True
+        self.failures = 0
+        self.next_probe = 0.0
+        self.last_error = None
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+
+class HostMonitor:
+    """
+    探测主库各主机的可用性并记录故障转移耗时
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, config):
+        self.config = config
+        self.hosts = [HostState(host, port) for host, port in configured_hosts(config)]
+        self.probe_interval = config.get('failover_probe_seconds', 1)
+        self.backoff_base = config.get('failover_backoff_base_seconds', 0.5)
+        self.backoff_max = config.get('failover_backoff_max_seconds', 30)
+        self.connect_timeout = config.get('connect_timeout_seconds', 3)
+        self.require_writable = config.get('failover_require_writable', True)
+        self.active = None
+        self.failover_count = 0
+        self.events = deque(maxlen=MAX_FAILOVER_EVENTS)
+        self._failure_detected_at = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        threading.Thread(target=self._probe_loop, name="db_host_monitor", daemon=True).start()
+
+    @classmethod
+    def shared(cls, config):
+        """
+        按主机列表获取进程内共享的 HostMonitor，同一组主机只运行一个探测线程
+        """
+        key = (tuple(configured_hosts(config)), config['database'])
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(config)
+            return cls._shared[key]
+
+    def candidates(self):
+        """
+        按优先级返回当前可用的主机
+        """
+        with self._lock:
+            return [state for state in self.hosts if state.healthy]
+
+    def preferred(self):
+        candidates = self.candidates()
+        return candidates[0] if candidates else None
+
+    def report_failure(self, state, err):
+        """
+        请求线程连接主机失败时调用，主机立即标记为不可用，由后台线程按退避间隔重新探测
+        """
+        with self._lock:
+            if state.healthy:
+                logger.warning(f"数据库主机{state.name}不可用: {err}")
+                if state is self.active and self._failure_detected_at is None:
+                    self._failure_detected_at = time.monotonic()
+            self._mark_failed(state, err)
+
+    def record_connected(self, state):
+        """
+        DAO 连接成功后调用。各 DAO 自己记录所连的主机，这里只跟踪本进程的活动主机：
+        连接的是当前优先主机且与活动主机不同时，记录一次故障转移（或切回）及其耗时。
+        仍连在旧主机上的 DAO（如事务未结束）重新连接旧主机不算切换
+        """
+        with self._lock:
+            previous = self.active
+            if previous is None:
+                self.active = state
+                self._failure_detected_at = None
+                return
+            preferred = next((host for host in self.hosts if host.healthy), None)
+            if previous is state or state is not preferred:
+                return
+            self.active = state
+            detected_at = self._failure_detected_at or time.monotonic()
+            seconds = round(time.monotonic() - detected_at, 3)
+            self._failure_detected_at = None
+            self.failover_count += 1
+            event = {
+                "from": previous.name,
+                "to": state.name,
+                "reason": "failback" if self.hosts.index(state) < self.hosts.index(previous) else "failover",
+                "seconds": seconds,
+                "time": time.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            self.events.append(event)
+        logger.info(f"数据库主机从{event['from']}切换到{event['to']}（{event['reason']}），耗时{seconds}秒")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active_host": self.active.name if self.active else None,
+                "hosts": [{"host": state.name, "healthy": state.healthy, "failures": state.failures,
+                           "last_error": state.last_error} for state in self.hosts],
+                "failover_count": self.failover_count,
+                "events": list(self.events)
+            }
+
+    def _mark_failed(self, state, err):
+        state.healthy = False
+        state.failures += 1
+        state.last_error = str(err)
+        # 带抖动的指数退避，避免多个进程同时重连刚恢复的主机
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (state.failures - 1))
+        state.next_probe = time.monotonic() + random.uniform(delay / 2, delay)
+
+    def _probe(self, state):
+        connection = mysql.connector.connect(
+            host=state.host,
+            port=state.port,
+            user=self.config['user'],
+            password=self.config['password'],
+            database=self.config['database'],
+            connection_timeout=self.connect_timeout
+        )
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT @@global.read_only")
+            read_only = cursor.fetchone()[0]
+            cursor.close()
+            if self.require_writable and read_only:
+                raise RuntimeError("主机处于只读状态")
+        finally:
+            connection.close()
+
+    def _probe_loop(self):
+        while not self._stop_event.is_set():
+            for state in self.hosts:
+                if state.next_probe > time.monotonic():
+                    continue
+                try:
+                    self._probe(state)
+                    with self._lock:
+                        if not state.healthy:
+                            logger.info(f"数据库主机{state.name}已恢复")
+                        state.healthy = True
+                        state.failures = 0
+                        state.next_probe = time.monotonic() + self.probe_interval
+                except Exception as err:
+                    with self._lock:
+                        if state.healthy:
+                            logger.warning(f"探测数据库主机{state.name}失败: {err}")
+                            if state is self.active and self._failure_detected_at is None:
+                                self._failure_detected_at = time.monotonic()
+                        self._mark_failed(state, err)
+            self._stop_event.wait(self.probe_interval)
+
+    def stop(self):
+        self._stop_event.set()
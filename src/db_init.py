@@ -1,17 +1,22 @@
 import mysql.connector
 import json
+import sys
 import logger
 from config_manager import ConfigManager
 from logger import LoggerFactory
 
 logger = LoggerFactory.getLogger()
 
-def initialize_database():
+def load_db_config():
+    with open('config/db_config.json') as config_file:
+        return json.load(config_file)
+
+def initialize_database(config=None):
     try:
-        with open('config/db_config.json') as config_file:
-            config = json.load(config_file)
+        config = config or load_db_config()
         db = mysql.connector.connect(
             host=config['host'],
+            port=config.get('port', 3306),
             user=config['user'],
             password=config['password']
         )
@@ -67,6 +72,126 @@ def initialize_database():
             db.close()
         raise
 
+def task_db_configs():
+    """
+    返回保存任务数据的各个库的连接配置，分片部署时为每个分片，否则为默认连接配置（None）
+    """
+    from db_sharding import build_shard_configs
+    config = load_db_config()
+    if config.get('shards'):
+        return list(build_shard_configs(config).values())
+    return [None]
+
+def rebuild_task_counters():
+    """
+    根据任务表重建组织和用户任务计数以及成员积分
+    """
+    from db_dao import EarthFighterDAO
+    for db_config in task_db_configs():
+        dao = EarthFighterDAO(db_config)
+        try:
+            dao.rebuild_task_counters()
+            dao.rebuild_member_scores(ConfigManager().get_task_status()['completed'])
+            logger.info("任务计数重建成功")
+        finally:
+            dao.close()
+
+def partition_tasks():
+    """
+    将任务表迁移为按月分区，迁移后需在配置中开启 task_partitioning.enabled
+    """
+    import task_partitions
+    from db_dao import EarthFighterDAO
+    config = ConfigManager().get_task_partitioning_config()
+    for db_config in task_db_configs():
+        dao = EarthFighterDAO(db_config)
+        try:
+            task_partitions.migrate(dao, config['future_months'])
+        finally:
+            dao.close()
+
+# 使用自增ID的表，新分片的自增计数需从所有库中的最大ID之后开始
+AUTO_INCREMENT_TABLES = (("organizations", "c_id"), ("task_templates", "template_id"), ("tasks", "task_id"),
+                         ("tasks_archive", "task_id"))
+
+def _max_ids(config):
+    db = mysql.connector.connect(host=config['host'], port=config.get('port', 3306), user=config['user'],
+                                 password=config['password'], database=config['database'])
+    try:
+        cursor = db.cursor()
+        max_ids = {}
+        for table, column in AUTO_INCREMENT_TABLES:
+            cursor.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")
+            max_ids[table] = cursor.fetchone()[0]
+        cursor.close()
+        return max_ids
+    finally:
+        db.close()
+
+def initialize_shards(names):
+    """
+    初始化新的分片实例（会删除分片上已有的数据库），names 为空时初始化除全局库以外的全部分片，
+    并把全局库中的用户同步到各分片
+    """
+    from db_sharding import build_shard_configs, create_dao
+    config = load_db_config()
+    shard_configs = build_shard_configs(config)
+    global_key = (config['host'], config.get('port', 3306), config['database'])
+    targets = [name for name, shard_config in shard_configs.items()
+               if (names and name in names) or (not names and
+                   (shard_config['host'], shard_config['port'], shard_config['database']) != global_key)]
+    for name in targets:
+        initialize_database(shard_configs[name])
+        logger.info(f"分片{name}初始化成功")
+    # 已有数据（包括分片前的全局库）中的ID都不能再被新分片分配
+    max_ids = _max_ids(config)
+    for shard_config in shard_configs.values():
+        if shard_config['shard_name'] not in targets:
+            for table, max_id in _max_ids(shard_config).items():
+                max_ids[table] = max(max_ids[table], max_id)
+    max_ids['tasks'] = max_ids['tasks_archive'] = max(max_ids['tasks'], max_ids['tasks_archive'])
+    for name in targets:
+        shard_config = shard_configs[name]
+        db = mysql.connector.connect(host=shard_config['host'], port=shard_config['port'], user=shard_config['user'],
+                                     password=shard_config['password'], database=shard_config['database'])
+        cursor = db.cursor()
+        for table, _ in AUTO_INCREMENT_TABLES:
+            if table != "tasks_archive":
+                cursor.execute(f"ALTER TABLE {table} AUTO_INCREMENT = {int(max_ids[table]) + 1}")
+        cursor.close()
+        db.close()
+    dao = create_dao()
+    try:
+        logger.info(f"已向各分片同步{dao.sync_users()}个用户")
+    finally:
+        dao.close()
+
+def move_organization(c_id, shard_name):
+    """
+    在线迁移顶级组织（含子孙组织）到指定分片
+    """
+    from db_sharding import create_dao
+    dao = create_dao()
+    try:
+        return dao.move_organization_to_shard(c_id, shard_name)
+    finally:
+        dao.close()
+
 if __name__ == "__main__":
-    initialize_database()
-    print("数据库初始化完成")
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild-counters":
+        rebuild_task_counters()
+        print("任务计数重建完成")
+    elif len(sys.argv) > 1 and sys.argv[1] == "partition-tasks":
+        partition_tasks()
+        print("任务表分区迁移完成")
+    elif len(sys.argv) > 1 and sys.argv[1] == "init-shards":
+        initialize_shards(sys.argv[2:])
+        print("分片初始化完成")
+    elif len(sys.argv) > 3 and sys.argv[1] == "move-organization":
+        if move_organization(int(sys.argv[2]), sys.argv[3]):
+            print("组织迁移完成")
+        else:
+            print("组织已在目标分片，无需迁移")
+    else:
+        initialize_database()
+        print("数据库初始化完成")
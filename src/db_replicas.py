@@ -0,0 +1,129 @@
+"""
+只读从库的连接池与健康检查
+
+每个从库一个连接池，后台线程定期探测从库可用性和复制延迟，读请求在健康的从库之间轮询。
+同一进程内相同配置的从库只创建一组连接池和一个健康检查线程，由所有 DAO 实例共享。
+"""
+import itertools
+import threading
+import mysql.connector
+from mysql.connector import pooling
+from logger import LoggerFactory
+
+logger = LoggerFactory.getLogger()
+
+
+class Replica:
+    def __init__(self, name, pool_config):
+        self.name = name
+        self.pool_config = pool_config
+        self.pool = None
+        self.healthy = False
+
+    def connect(self):
+        # 连接池创建时会建立全部连接，从库不可用时推迟到健康检查中重试
+        if self.pool is None:
+            self.pool = pooling.MySQLConnectionPool(**self.pool_config)
+        return self.pool.get_connection()
+
+
+class ReplicaSet:
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, config):
+        self.health_check_interval = config.get('replica_health_check_seconds', 5)
+        self.max_lag = config.get('replica_max_lag_seconds')
+        self.replicas = []
+        for index, replica_config in enumerate(config.get('replicas', [])):
+            name = f"{replica_config['host']}:{replica_config.get('port', 3306)}"
+            pool_config = {
+                "pool_name": f"earth_fighter_replica_{index}",
+                "pool_size": config.get('replica_pool_size', 5),
+                "host": replica_config['host'],
+                "port": replica_config.get('port', 3306),
+                "user": replica_config.get('user', config['user']),
+                "password": replica_config.get('password', config['password']),
+                "database": config['database'],
+                "autocommit": True
+            }
+            replica = Replica(name, pool_config)
+            self.replicas.append(replica)
+            self._probe(replica)
+        self._cycle = itertools.cycle(self.replicas)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        if self.replicas:
+            threading.Thread(target=self._health_loop, name="replica_health", daemon=True).start()
+
+    @classmethod
+    def shared(cls, config):
+        """
+        按从库配置获取进程内共享的 ReplicaSet，未配置从库时返回 None
+        """
+        if not config.get('replicas'):
+            return None
+        key = tuple((replica['host'], replica.get('port', 3306)) for replica in config['replicas'])
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(config)
+            return cls._shared[key]
+
+    def acquire(self):
+        """
+        从下一个健康的从库取出一个连接，返回 (从库, 连接)；没有健康从库或连接池已满时返回 (None, None)
+        """
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if not replica.healthy:
+                    continue
+                try:
+                    return replica, replica.connect()
+                except mysql.connector.errors.PoolError:
+                    continue
+                except mysql.connector.Error as err:
+                    self.mark_unhealthy(replica, err)
+        return None, None
+
+    def mark_unhealthy(self, replica, err):
+        if replica.healthy or replica.pool is None:
+            logger.warning(f"从库{replica.name}不可用，读请求改走主库或其他从库: {err}")
+        replica.healthy = False
+
+    def _check(self, replica):
+        connection = replica.connect()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            if self.max_lag is not None:
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                    status = cursor.fetchone()
+                except mysql.connector.errors.ProgrammingError:
+                    # 需要 REPLICATION CLIENT 权限，查不到复制状态时只检查连通性
+                    status = None
+                lag = status.get('Seconds_Behind_Source') if status else None
+                if status and (lag is None or lag > self.max_lag):
+                    raise RuntimeError(f"复制延迟过大或复制已中断: {lag}")
+            cursor.close()
+        finally:
+            connection.close()
+
+    def _probe(self, replica):
+        try:
+            self._check(replica)
+            if not replica.healthy:
+                logger.info(f"从库{replica.name}可用")
+            replica.healthy = True
+        except Exception as err:
+            self.mark_unhealthy(replica, err)
+
+    def _health_loop(self):
+        while not self._stop_event.wait(self.health_check_interval):
+            for replica in self.replicas:
+                self._probe(replica)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,433 @@
+"""
+按组织分片的数据访问层
+
+全局库（db_config.json 中的主库）保存用户、角色和组织分片目录 organization_shards；组织、成员关系、任务、模板、
+计数和积分按组织ID分布在 shards 配置的各个分片上。用户表在每个分片上保留一份镜像，以满足外键和联表查询。
+
+- 按组织ID（或可反查出组织ID的任务ID、模板ID）的方法路由到组织所在分片
+- 按用户查询的方法并行查询全部分片后合并结果
+- 其他方法在全局库上执行
+
+组织分片从目录读取并按 shard_map_ttl_seconds 缓存，未登记的组织属于第一个分片（即分片前已有的数据）。
+迁移组织时先冻结目录中的组织，等待各进程缓存过期后复制数据，再切换目录并删除源分片上的数据。
+"""
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from db_dao import EarthFighterDAO, InviteCodeConflict
+from logger import LoggerFactory
+import request_context
+
+logger = LoggerFactory.getLogger()
+
+# 路由到组织所在分片的方法及其组织ID参数名
+ORGANIZATION_READS = {
+    "is_descendant_organization": "c_id",
+    "get_subtree_tasks": "c_id",
+    "get_subtree_members": "c_id",
+    "get_subtree_stats": "c_id",
+    "get_organization_member_ids": "organization_id",
+    "is_organization_creator": "organization_id",
+    "is_user_in_organization": "organization_id",
+    "get_organization": "c_id",
+    "get_tasks_by_organization": "c_id",
+    "get_archived_tasks": "c_id",
+    "search_tasks": "c_id",
+    "get_organization_task_counters": "c_id",
+    "get_member_scores": "c_id",
+    "get_task_templates": "c_id",
+}
+ORGANIZATION_WRITES = {
+    "delete_organization": "c_id",
+    "add_user_to_organization": "organization_id",
+    "add_users_to_organization": "organization_id",
+    "remove_user_from_organization": "organization_id",
+    "publish_task": "c_id",
+    "publish_tasks": "c_id",
+    "claim_next_task": "c_id",
+    "add_task_template": "c_id",
+}
+# 通过任务ID反查组织后路由的方法
+TASK_READS = ("get_task_status", "get_organization_id_by_task_id", "get_task_by_id")
+TASK_WRITES = ("update_task_status", "update_task_status_and_receiver", "complete_task", "delete_task")
+# 通过模板ID反查组织后路由的方法
+TEMPLATE_READS = ("get_task_template",)
+TEMPLATE_WRITES = ("delete_task_template",)
+# 写入全局库后需要同步到各分片镜像的用户方法
+USER_WRITES = ("add_user", "delete_user", "update_user", "update_user_password")
+# 后台任务和维护命令使用的方法，需分别在每个分片的 EarthFighterDAO 上执行
+SHARD_LOCAL_METHODS = (
+    "get_task_deadlines", "expire_tasks", "claim_due_templates", "insert_task_occurrences", "advance_templates",
+    "get_task_id_range", "archive_tasks", "get_task_partitions", "partition_tasks_table", "add_task_partitions",
+    "drop_task_partitions", "count_active_tasks_in_partition", "get_earliest_task_publish_time", "rebuild_task_counters", "rebuild_member_scores",
+)
+# 迁移组织时复制的表：(表名, 组织ID列, 排序列)，按此顺序复制、逆序删除
+ORGANIZATION_TABLES = (
+    ("organizations", "c_id", "c_id"),
+    ("organization_closure", "descendant_id", "ancestor_id, descendant_id"),
+    ("user_org_relations", "c_id", "u_id, c_id"),
+    ("task_templates", "c_id", "template_id"),
+    ("tasks", "c_id", "task_id"),
+    ("tasks_archive", "c_id", "task_id"),
+    ("org_task_counters", "c_id", "c_id, task_state"),
+    ("member_scores", "c_id", "c_id, period, u_id"),
+)
+# 任务ID、模板ID到组织ID的缓存上限，任务和模板的组织不会改变，缓存无需失效
+OWNER_CACHE_SIZE = 100000
+
+
+class OrganizationFrozen(Exception):
+    """
+    组织正在迁移分片，暂时不能写入
+    """
+
+
+def _argument(name, param, args, kwargs):
+    """
+    按 EarthFighterDAO 方法的签名从调用参数中取出指定参数
+    """
+    bound = inspect.signature(getattr(EarthFighterDAO, name)).bind(None, *args, **kwargs)
+    return bound.arguments[param]
+
+
+def build_shard_configs(config):
+    """
+    由 db_config.json 生成 {分片名: 连接配置}，各分片使用相同的自增步长和各自的偏移
+    """
+    stride = config.get('shard_id_stride', 16)
+    if len(config['shards']) > stride:
+        raise ValueError(f"分片数量不能超过自增ID步长{stride}")
+    shard_configs = OrderedDict()
+    for index, shard in enumerate(config['shards']):
+        shard_config = {key: value for key, value in config.items() if key != 'shards'}
+        shard_config.update({
+            "host": shard['host'],
+            "port": shard.get('port', 3306),
+            "hosts": shard.get('hosts', []),
+            "user": shard.get('user', config['user']),
+            "password": shard.get('password', config['password']),
+            "database": shard.get('database', config['database']),
+            "replicas": shard.get('replicas', []),
+            "auto_increment_increment": stride,
+            "auto_increment_offset": index + 1,
+            "shard_name": shard['name']
+        })
+        shard_configs[shard['name']] = shard_config
+    return shard_configs
+
+
+class ShardedEarthFighterDAO:
+    def __init__(self, global_dao=None):
+        self.global_dao = global_dao or EarthFighterDAO()
+        self.config = self.global_dao.config
+        self._shard_configs = build_shard_configs(self.config)
+        self.shards = OrderedDict((name, EarthFighterDAO(shard_config))
+                                  for name, shard_config in self._shard_configs.items())
+        self.default_shard = next(iter(self.shards))
+        self.id_step = self.config.get('shard_id_stride', 16)
+        self.map_ttl = self.config.get('shard_map_ttl_seconds', 5)
+        self.freeze_wait = self.config.get('shard_freeze_wait_seconds', 10)
+        self._directory = {}
+        self._owners = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="shard_scatter")
+
+    def shard_db_configs(self):
+        """
+        返回 {分片名: 连接配置}，供后台任务在每个分片上分别运行
+        """
+        return dict(self._shard_configs)
+
+    def _lookup(self, c_id, refresh=False):
+        """
+        返回组织的 (分片名, 是否冻结)，目录结果缓存 map_ttl 秒
+        """
+        c_id = int(c_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._directory.get(c_id)
+            if entry and not refresh and now - entry[2] < self.map_ttl:
+                return entry[0], entry[1]
+        entry = self.global_dao.get_organization_shard(c_id) or (self.default_shard, False)
+        with self._lock:
+            if len(self._directory) > OWNER_CACHE_SIZE:
+                for expired in [key for key, value in self._directory.items() if now - value[2] >= self.map_ttl]:
+                    del self._directory[expired]
+            self._directory[c_id] = (entry[0], entry[1], now)
+        return entry
+
+    def shard_name(self, c_id):
+        return self._lookup(c_id)[0]
+
+    def _shard_for(self, c_id, write=False):
+        """
+        返回组织所在分片的 DAO；写操作遇到迁移中的组织时等待迁移完成，超过 freeze_wait 秒抛出 OrganizationFrozen
+        """
+        shard_name, frozen = self._lookup(c_id)
+        if write and frozen:
+            deadline = time.monotonic() + self.freeze_wait
+            while frozen:
+                if time.monotonic() > deadline:
+                    raise OrganizationFrozen(f"组织{c_id}正在迁移分片，请稍后重试")
+                time.sleep(0.2)
+                shard_name, frozen = self._lookup(c_id, refresh=True)
+        return self.shards[shard_name]
+
+    def _scatter(self, name, *args, **kwargs):
+        """
+        在全部分片上并行调用同名方法，按分片顺序返回结果列表
+        """
+        return self._gather([(shard, name, args, kwargs) for shard in self.shards.values()])
+
+    def _gather(self, calls):
+        """
+        并行执行 (分片, 方法名, 位置参数, 关键字参数) 形式的调用，按调用顺序返回结果列表；
+        工作线程沿用当前请求的用户和截止时间
+        """
+        user_id = request_context.current_user_id()
+        deadline = request_context.deadline()
+
+        def call(shard, name, args, kwargs):
+            request_context.begin(user_id, deadline=deadline)
+            try:
+                return getattr(shard, name)(*args, **kwargs)
+            finally:
+                request_context.end()
+        futures = [self._executor.submit(call, *shard_call) for shard_call in calls]
+        return [future.result() for future in futures]
+
+    def _owner(self, kind, key, method, extract):
+        """
+        在全部分片上查找任务或模板所属的组织ID，结果按 LRU 缓存
+        """
+        cache_key = (kind, int(key))
+        with self._lock:
+            if cache_key in self._owners:
+                self._owners.move_to_end(cache_key)
+                return self._owners[cache_key]
+        c_id = next((extract(result) for result in self._scatter(method, key) if result is not None), None)
+        if c_id is not None:
+            with self._lock:
+                self._owners[cache_key] = c_id
+                while len(self._owners) > OWNER_CACHE_SIZE:
+                    self._owners.popitem(last=False)
+        return c_id
+
+    def _task_organization(self, task_id):
+        return self._owner("task", task_id, "get_organization_id_by_task_id", lambda c_id: c_id)
+
+    def _template_organization(self, template_id):
+        return self._owner("template", template_id, "get_task_template", lambda template: template['c_id'])
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in ORGANIZATION_READS or name in ORGANIZATION_WRITES:
+            write = name in ORGANIZATION_WRITES
+            param = ORGANIZATION_WRITES.get(name) or ORGANIZATION_READS[name]
+
+            def call(*args, **kwargs):
+                c_id = _argument(name, param, args, kwargs)
+                return getattr(self._shard_for(c_id, write), name)(*args, **kwargs)
+        elif name in TASK_READS or name in TASK_WRITES or name in TEMPLATE_READS or name in TEMPLATE_WRITES:
+            write = name in TASK_WRITES or name in TEMPLATE_WRITES
+            resolve = self._task_organization if name in TASK_READS + TASK_WRITES else self._template_organization
+
+            def call(key, *args, **kwargs):
+                c_id = resolve(key)
+                if c_id is None:
+                    # 任务或模板不存在，交给默认分片返回空结果
+                    return getattr(self.shards[self.default_shard], name)(key, *args, **kwargs)
+                return getattr(self._shard_for(c_id, write), name)(key, *args, **kwargs)
+        elif name in USER_WRITES:
+            def call(*args, **kwargs):
+                result = getattr(self.global_dao, name)(*args, **kwargs)
+                u_id = result if name == "add_user" else _argument(name, "u_id", args, kwargs)
+                if u_id is not None:
+                    self._mirror_users([u_id])
+                return result
+        elif name in SHARD_LOCAL_METHODS:
+            raise AttributeError(f"{name}需要在各分片的 EarthFighterDAO 上分别执行")
+        else:
+            return getattr(self.global_dao, name)
+        return functools.wraps(getattr(EarthFighterDAO, name))(call)
+
+    def _mirror_users(self, user_ids):
+        """
+        把全局库中的用户行同步到每个分片的用户镜像
+        """
+        columns, rows = self.global_dao.fetch_rows("users", "u_id", user_ids, "u_id", len(user_ids))
+        self._scatter("upsert_rows", "users", columns, rows)
+
+    def sync_users(self, batch_size=1000):
+        """
+        把全局库的全部用户同步到各分片，用于新增分片或修复镜像，返回同步的用户数
+        """
+        synced = 0
+        while True:
+            columns, rows = self.global_dao.fetch_rows("users", "is_deleted", [False, True], "u_id", batch_size, synced)
+            if not rows:
+                return synced
+            self._scatter("upsert_rows", "users", columns, rows)
+            synced += len(rows)
+
+    @contextmanager
+    def transaction(self):
+        """
+        在全局库和全部分片上各开启一个事务，依次提交；各库之间的提交不是原子的
+        """
+        with ExitStack() as stack:
+            stack.enter_context(self.global_dao.transaction())
+            for shard in self.shards.values():
+                stack.enter_context(shard.transaction())
+            yield self
+
+    def check_organization_exists(self, c_name):
+        return any(self._scatter("check_organization_exists", c_name))
+
+    def get_organization_id_by_invite_code(self, invite_code):
+        return next((c_id for c_id in self._scatter("get_organization_id_by_invite_code", invite_code)
+                     if c_id is not None), None)
+
+    def _check_invite_code(self, invite_code):
+        # 邀请码的唯一索引只在单个分片内有效，写入前先检查其他分片
+        if self.get_organization_id_by_invite_code(invite_code) is not None:
+            raise InviteCodeConflict(invite_code)
+
+    def add_organization(self, c_name, c_type, creator_id, invite_code, parent_id=None, invite_ttl=0):
+        """
+        子组织与父组织放在同一分片（闭包表查询不跨分片），顶级组织放在登记组织数最少的分片
+        """
+        self._check_invite_code(invite_code)
+        if parent_id is not None:
+            shard_name = self.shard_name(parent_id)
+            self._shard_for(parent_id, write=True)
+        else:
+            counts = self.global_dao.get_shard_organization_counts()
+            shard_name = min(self.shards, key=lambda name: counts.get(name, 0))
+        c_id = self.shards[shard_name].add_organization(c_name, c_type, creator_id, invite_code, parent_id, invite_ttl)
+        if c_id is not None:
+            self.global_dao.set_organization_shard(c_id, shard_name)
+        return c_id
+
+    def rotate_invite_code(self, c_id, invite_code, invite_ttl=0):
+        self._check_invite_code(invite_code)
+        return self._shard_for(c_id, write=True).rotate_invite_code(c_id, invite_code, invite_ttl)
+
+    def join_organization_by_invite_code(self, user_id, invite_code):
+        c_id = self.get_organization_id_by_invite_code(invite_code)
+        if c_id is None:
+            return None, False
+        return self._shard_for(c_id, write=True).join_organization_by_invite_code(user_id, invite_code)
+
+    def move_organization(self, c_id, parent_id):
+        if parent_id is not None and self.shard_name(parent_id) != self.shard_name(c_id):
+            raise ValueError(f"组织{c_id}与新的上级组织{parent_id}不在同一分片，请先迁移分片")
+        return self._shard_for(c_id, write=True).move_organization(c_id, parent_id)
+
+    def get_organizations(self, number=10):
+        organizations = [organization for result in self._scatter("get_organizations", number)
+                         for organization in result]
+        return sorted(organizations, key=lambda organization: organization['c_id'])[:number]
+
+    def get_user_organizations(self, u_id):
+        organizations = [organization for result in self._scatter("get_user_organizations", u_id)
+                         for organization in result]
+        return sorted(organizations, key=lambda organization: organization['c_id'])
+
+    def get_tasks_by_user(self, u_id, since=None, limit=None):
+        tasks = [task for result in self._scatter("get_tasks_by_user", u_id, since, limit) for task in result]
+        if limit is not None:
+            return sorted(tasks, key=lambda task: task['task_id'], reverse=True)[:limit]
+        return sorted(tasks, key=lambda task: task['task_id'])
+
+    def get_user_task_counters(self, u_id):
+        counters = {}
+        for result in self._scatter("get_user_task_counters", u_id):
+            for task_state, count in result.items():
+                counters[task_state] = counters.get(task_state, 0) + count
+        return counters
+
+    def get_task_counts_by_organizations(self, c_ids, task_states):
+        grouped = {}
+        for c_id in c_ids:
+            grouped.setdefault(self.shard_name(c_id), []).append(c_id)
+        counts = {}
+        for result in self._gather([(self.shards[shard_name], "get_task_counts_by_organizations",
+                                     (shard_c_ids, task_states), {})
+                                    for shard_name, shard_c_ids in grouped.items()]):
+            counts.update(result)
+        return counts
+
+    def move_organization_to_shard(self, c_id, target_name, batch_size=1000):
+        """
+        在线迁移顶级组织及其全部子孙组织到目标分片，返回是否发生了迁移
+
+        冻结目录中的组织并等待各进程的分片缓存过期，此后写操作会等待迁移完成；
+        分批复制数据并转移用户任务计数后切换目录，再等待缓存过期后删除源分片上的数据。
+        """
+        if target_name not in self.shards:
+            raise ValueError(f"分片{target_name}不存在")
+        source_name = self.shard_name(c_id)
+        if source_name == target_name:
+            return False
+        source = self.shards[source_name]
+        target = self.shards[target_name]
+        organization = source.get_organization(c_id)
+        if organization is None:
+            raise ValueError(f"组织{c_id}不存在")
+        if organization['parent_id'] is not None:
+            raise ValueError("只能迁移顶级组织，子组织随顶级组织一起迁移")
+        c_ids = source.get_subtree_organization_ids(c_id)
+
+        for organization_id in c_ids:
+            self.global_dao.set_organization_shard(organization_id, source_name, True)
+        time.sleep(self.map_ttl + 1)
+        logger.info(f"组织{c_id}已冻结，开始从{source_name}迁移{len(c_ids)}个组织到{target_name}")
+        try:
+            for table, column, order_by in ORGANIZATION_TABLES:
+                copied = 0
+                while True:
+                    columns, rows = source.fetch_rows(table, column, c_ids, order_by, batch_size, copied)
+                    if not rows:
+                        break
+                    copied += target.upsert_rows(table, columns, rows)
+                logger.info(f"已复制{table}表{copied}行")
+            target.adjust_user_task_counters(c_ids, 1)
+            source.adjust_user_task_counters(c_ids, -1)
+        except Exception:
+            logger.error(f"迁移组织{c_id}失败，清理目标分片并解冻")
+            for table, column, _ in reversed(ORGANIZATION_TABLES):
+                target.delete_rows(table, column, c_ids)
+            for organization_id in c_ids:
+                self.global_dao.set_organization_shard(organization_id, source_name)
+            raise
+
+        for organization_id in c_ids:
+            self.global_dao.set_organization_shard(organization_id, target_name)
+        # 等待仍缓存旧分片的进程刷新后再删除源数据，期间它们读到的是冻结前的完整数据
+        time.sleep(self.map_ttl + 1)
+        for table, column, _ in reversed(ORGANIZATION_TABLES):
+            source.delete_rows(table, column, c_ids)
+        logger.info(f"组织{c_id}已迁移到{target_name}")
+        return True
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        for shard in self.shards.values():
+            shard.close()
+        self.global_dao.close()
+
+
+def create_dao():
+    """
+    配置了 shards 时返回分片 DAO，否则返回单库 DAO
+    """
+    dao = EarthFighterDAO()
+    if dao.config.get('shards'):
+        return ShardedEarthFighterDAO(dao)
+    return dao
@@ -0,0 +1,143 @@
+import bisect
+import threading
+import time
+from config_manager import ConfigManager
+
+cfg = ConfigManager()
+
+ALL_PERIOD = 'all'
+# 加载排名期间有新的积分写入时重新加载的次数上限
+MAX_LOAD_ATTEMPTS = 3
+
+
+def week_period(moment):
+    """
+    返回 moment 所在的 ISO 周，格式与 MySQL DATE_FORMAT(..., '%x-W%v') 一致，如 2024-W05
+    """
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class _Board:
+    """
+    单个组织单个周期的排名，entries 按 (-积分, 用户ID) 升序保存，名次查询为二分查找
+    更新积分时在有序列表中删除和插入，定位为 O(log n)，移动元素为 O(n)，n 为组织内有积分的成员数
+    """
+
+    def __init__(self, scores, loaded_at):
+        self.scores = dict(scores)
+        self.entries = sorted((-score, u_id) for u_id, score in self.scores.items())
+        self.loaded_at = loaded_at
+
+    def add(self, u_id, delta):
+        old_score = self.scores.get(u_id, 0)
+        if old_score:
+            del self.entries[bisect.bisect_left(self.entries, (-old_score, u_id))]
+        self.scores[u_id] = old_score + delta
+        bisect.insort(self.entries, (-self.scores[u_id], u_id))
+
+    def rank(self, u_id):
+        """
+        返回 (名次, 积分)，同分并列，名次为积分更高的人数加一；没有积分时返回 (None, 0)
+        """
+        score = self.scores.get(u_id, 0)
+        if not score:
+            return None, 0
+        return bisect.bisect_left(self.entries, (-score,)) + 1, score
+
+    def top(self, limit):
+        """
+        返回前 limit 名的 [(名次, 用户ID, 积分)]
+        """
+        result = []
+        for index, (negative_score, u_id) in enumerate(self.entries[:limit]):
+            if result and result[-1][2] == -negative_score:
+                rank = result[-1][0]
+            else:
+                rank = index + 1
+            result.append((rank, u_id, -negative_score))
+        return result
+
+
+class Leaderboard:
+    """
+    组织排行榜
+
+    积分由 complete_task 在确认任务的事务中写入 member_scores 表，这里按 (组织, 周期) 缓存排序后的排名。
+    缓存在首次访问时从积分表加载，本进程确认任务时增量更新，超过 cache_ttl_seconds 后重新加载以合并其他进程的写入。
+    加载期间发生的确认无法判断是否已包含在读到的积分中，此时丢弃加载结果重新加载。
+    """
+
+    def __init__(self, dao):
+        self.dao = dao
+        self.ttl = cfg.get_leaderboard_config()['cache_ttl_seconds']
+        self._boards = {}
+        # 正在加载的排名：键 -> [加载者数量, 加载期间的积分写入次数]
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def current_periods(self, completed_at):
+        """
+        返回在 completed_at（数据库时间，即任务的完成时间）确认任务时需要累加积分的周期，
+        与 rebuild_member_scores 按 completion_time 统计的周一致
+        """
+        return [ALL_PERIOD, week_period(completed_at)]
+
+    def resolve_period(self, name):
+        # 本周按数据库时间计算，与写入积分时使用的时钟一致
+        return ALL_PERIOD if name == 'all' else week_period(self.dao.get_db_now())
+
+    def _board(self, c_id, period):
+        key = (c_id, period)
+        for attempt in range(MAX_LOAD_ATTEMPTS):
+            now = time.monotonic()
+            with self._lock:
+                board = self._boards.get(key)
+                if board and now - board.loaded_at < self.ttl:
+                    return board
+                loading = self._loading.setdefault(key, [0, 0])
+                loading[0] += 1
+                records_before = loading[1]
+            scores = None
+            try:
+                scores = self.dao.get_member_scores(c_id, period)
+            finally:
+                # 检查并发写入与安装新排名在同一次加锁中完成，之后的 record 直接更新已安装的排名
+                with self._lock:
+                    loading[0] -= 1
+                    changed = loading[1] != records_before
+                    if loading[0] == 0:
+                        del self._loading[key]
+                    if scores is not None:
+                        board = _Board(scores, now)
+                        # 顺带清理过期的排名，避免历史周期的缓存一直占用内存
+                        for expired_key in [k for k, b in self._boards.items() if now - b.loaded_at >= self.ttl]:
+                            del self._boards[expired_key]
+                        if not changed:
+                            self._boards[key] = board
+            if not changed:
+                return board
+        # 多次加载都有并发写入时使用最后一次的结果，但不缓存，下次访问重新加载
+        return board
+
+    def record(self, c_id, u_id, periods):
+        """
+        任务确认后增量更新已缓存的排名，未缓存的排名在下次访问时从积分表加载，正在加载的排名加载完成后重新加载
+        """
+        with self._lock:
+            for period in periods:
+                board = self._boards.get((c_id, period))
+                if board:
+                    board.add(u_id, 1)
+                loading = self._loading.get((c_id, period))
+                if loading:
+                    loading[1] += 1
+
+    def standings(self, c_id, period_name, u_id, limit):
+        """
+        返回 (周期, 前 limit 名, 指定用户的 (名次, 积分))
+        """
+        period = self.resolve_period(period_name)
+        board = self._board(c_id, period)
+        with self._lock:
+            return period, board.top(limit), board.rank(u_id)
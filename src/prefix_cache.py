@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class PrefixCache:
+    """
+    前缀查询结果的 LRU 缓存
+
+    每个前缀缓存最多 max_results 条按名称排序的结果，并记录结果是否完整（匹配数不超过 max_results）。
+    查询未命中时沿前缀向上查找：若某个更短前缀的结果是完整的，则较长前缀的结果必然是它的子集，
+    直接过滤得到，无需访问数据库。数据变更时调用 clear 失效，ttl 限制多进程部署下的不一致时间。
+    """
+
+    def __init__(self, capacity, ttl, max_results):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_results = max_results
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(prefix):
+        # 用户名列使用不区分大小写的排序规则，缓存键与过滤同样忽略大小写
+        return prefix.casefold()
+
+    def get(self, prefix, key=lambda item: item):
+        """
+        返回前缀的缓存结果，未命中返回 None；key 用于从结果项中取出用于前缀匹配的名称
+        """
+        normalized = self._normalize(prefix)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(normalized, now)
+            if entry is not None:
+                return entry[0]
+            for length in range(len(normalized) - 1, 0, -1):
+                entry = self._lookup(normalized[:length], now)
+                if entry is not None and entry[1]:
+                    results = [item for item in entry[0] if self._normalize(key(item)).startswith(normalized)]
+                    self._store(normalized, results, True, now)
+                    return results
+        return None
+
+    def put(self, prefix, results):
+        """
+        缓存前缀的查询结果，results 最多取 max_results 条，多于该数量表示结果不完整
+        """
+        with self._lock:
+            self._store(self._normalize(prefix), results[:self.max_results], len(results) <= self.max_results,
+                        time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, normalized, now):
+        entry = self._entries.get(normalized)
+        if entry is None:
+            return None
+        if now - entry[2] >= self.ttl:
+            del self._entries[normalized]
+            return None
+        self._entries.move_to_end(normalized)
+        return entry
+
+    def _store(self, normalized, results, complete, now):
+        self._entries[normalized] = (results, complete, now)
+        self._entries.move_to_end(normalized)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
@@ -0,0 +1,106 @@
+"""
+按接口的令牌桶限流
+
+每个接口配置桶容量 capacity 和每秒补充的令牌数 refill_per_second，已登录的请求按用户计数，
+未登录的请求（如登录接口）按客户端 IP 计数。令牌桶的状态保存在内存映射的本地文件中，
+同一台机器上的多个工作进程通过 fcntl 文件锁共享同一份状态，不依赖外部服务。
+
+文件划分为固定数量的槽位，每个槽位保存键的哈希、剩余令牌数和上次更新时间。键按哈希在相邻的
+PROBE_SLOTS 个槽位内查找，都被占用时复用其中最久未更新的槽位，被挤出的客户端下次按满桶重新计数。
+"""
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+# 键哈希、剩余令牌数、上次更新时间（Unix 时间戳，各进程共用）
+SLOT = struct.Struct("<Qdd")
+# 查找键时探测的相邻槽位数
+PROBE_SLOTS = 8
+
+
+class TokenBucketStore:
+    """
+    保存在内存映射文件中、可被多个进程共享的令牌桶
+    """
+    def __init__(self, path, slots):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.slots = slots
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = SLOT.size * slots
+        # 文件由第一个进程扩展到所需大小，新增的部分全为 0，即空槽位
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._mmap = mmap.mmap(self._fd, size)
+        # flock 只在进程之间互斥，同一进程内的线程另用线程锁
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_per_second, cost=1):
+        """
+        从 key 的令牌桶中取出 cost 个令牌，返回 (是否允许, 需要等待的秒数)
+        """
+        digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+        now = time.time()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                offset = self._find_slot(digest)
+                stored, tokens, updated = SLOT.unpack_from(self._mmap, offset)
+                if stored != digest:
+                    tokens, updated = capacity, now
+                tokens = min(capacity, tokens + max(0.0, now - updated) * refill_per_second)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                SLOT.pack_into(self._mmap, offset, digest, tokens, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        if allowed:
+            return True, 0.0
+        return False, (cost - tokens) / refill_per_second
+
+    def _find_slot(self, digest):
+        """
+        返回 digest 所在的槽位；不存在时返回空槽位，没有空槽位时返回最久未更新的槽位
+        """
+        start = digest % self.slots
+        oldest_offset, oldest_updated = None, None
+        for step in range(PROBE_SLOTS):
+            offset = (start + step) % self.slots * SLOT.size
+            stored, _, updated = SLOT.unpack_from(self._mmap, offset)
+            if stored == digest or stored == 0:
+                return offset
+            if oldest_updated is None or updated < oldest_updated:
+                oldest_offset, oldest_updated = offset, updated
+        return oldest_offset
+
+    def close(self):
+        self._mmap.close()
+        os.close(self._fd)
+
+
+class RateLimiter:
+    def __init__(self, config):
+        self.policies = config['policies']
+        self.store = TokenBucketStore(config['state_file'], config['slots'])
+
+    def check(self, endpoint, client):
+        """
+        检查 client 对 endpoint 的请求是否超过限制，返回 (是否允许, Retry-After 秒数)
+        未配置限流的接口总是允许
+        """
+        policy = self.policies.get(endpoint)
+        if policy is None:
+            return True, 0
+        allowed, wait = self.store.take(f"{endpoint}:{client}", policy['capacity'], policy['refill_per_second'])
+        return allowed, math.ceil(wait)
@@ -0,0 +1,159 @@
+"""
+请求级上下文，用于读写分离时的读己之写和请求截止时间
+
+请求开始时绑定当前用户和截止时间，DAO 提交写操作时记录该用户的写入时间。
+用户在写入后的一小段时间内（以及写入所在请求的剩余部分）的读操作都走主库，避免读到尚未同步到从库的旧数据。
+DAO 执行语句前读取剩余时间，超时后抛出 DeadlineExceeded。批量请求的子请求嵌套在外层请求之内，
+截止时间不会晚于外层请求。
+
+上下文保存在 contextvars 中：普通线程之间互不可见，异步视图所在的事件循环线程和 AsyncEarthFighterDAO
+执行查询的线程复制了请求的上下文，看到的是同一个请求。
+"""
+import contextvars
+import threading
+import time
+
+_stack_var = contextvars.ContextVar('request_context_stack')
+_last_writes = {}
+_lock = threading.Lock()
+# 记录的用户数超过该值时清理已过期的记录
+MAX_TRACKED_WRITERS = 10000
+
+
+class DeadlineExceeded(Exception):
+    """
+    请求的时间预算已用完
+    """
+
+
+def _stack():
+    stack = _stack_var.get(None)
+    if stack is None:
+        stack = []
+        _stack_var.set(stack)
+    return stack
+
+
+def _frame():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def begin(user_id, timeout=None, deadline=None):
+    """
+    开始一个请求，timeout 为时间预算（秒），也可直接传入截止时间 deadline（time.monotonic 时钟）
+    """
+    if timeout is not None:
+        deadline = time.monotonic() + timeout if deadline is None else min(deadline, time.monotonic() + timeout)
+    parent = _frame()
+    if parent and parent['deadline'] is not None:
+        deadline = parent['deadline'] if deadline is None else min(deadline, parent['deadline'])
+    _stack().append({"user_id": user_id, "wrote": False, "deadline": deadline, "deadline_exceeded": False,
+                     "db_seconds": 0.0, "statements": 0})
+
+
+def end():
+    stack = _stack()
+    if stack:
+        stack.pop()
+
+
+def nested():
+    """
+    当前请求是否嵌套在其他请求之内（批量请求的子请求）
+    """
+    return len(_stack()) > 1
+
+
+def current_user_id():
+    frame = _frame()
+    return frame['user_id'] if frame else None
+
+
+def record_write():
+    """
+    记录当前请求（含外层请求）和当前用户发生了写入
+    """
+    for frame in _stack():
+        frame['wrote'] = True
+    user_id = current_user_id()
+    if user_id is None:
+        return
+    now = time.monotonic()
+    with _lock:
+        _last_writes[user_id] = now
+        if len(_last_writes) > MAX_TRACKED_WRITERS:
+            for key in [key for key, written in _last_writes.items() if now - written > 60]:
+                del _last_writes[key]
+
+
+def should_read_primary(window):
+    """
+    当前请求已写入，或当前用户在 window 秒内写入过时返回 True
+    """
+    frame = _frame()
+    if frame and frame['wrote']:
+        return True
+    user_id = current_user_id()
+    if user_id is None:
+        return False
+    with _lock:
+        written = _last_writes.get(user_id)
+        if written is None:
+            return False
+        if time.monotonic() - written < window:
+            return True
+        del _last_writes[user_id]
+        return False
+
+
+def record_statement(seconds):
+    """
+    累计当前请求（含外层请求）执行数据库语句的次数和耗时
+    """
+    for frame in _stack():
+        frame['db_seconds'] += seconds
+        frame['statements'] += 1
+
+
+def db_time():
+    """
+    返回当前请求的 (数据库语句总耗时, 语句数)
+    """
+    frame = _frame()
+    return (frame['db_seconds'], frame['statements']) if frame else (0.0, 0)
+
+
+def deadline():
+    frame = _frame()
+    return frame['deadline'] if frame else None
+
+
+def remaining():
+    """
+    返回当前请求剩余的秒数，没有截止时间时返回 None
+    """
+    current = deadline()
+    return None if current is None else current - time.monotonic()
+
+
+def check_deadline():
+    """
+    时间预算已用完时标记当前请求并抛出 DeadlineExceeded，否则返回剩余秒数（没有截止时间时为 None）
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        mark_deadline_exceeded()
+        raise DeadlineExceeded("请求处理超时")
+    return left
+
+
+def mark_deadline_exceeded():
+    frame = _frame()
+    if frame:
+        frame['deadline_exceeded'] = True
+
+
+def deadline_exceeded():
+    frame = _frame()
+    return bool(frame and frame['deadline_exceeded'])
@@ -1,4 +1,6 @@
 # 定义请求体模型
+import datetime
+from typing import Any, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -16,6 +18,10 @@ class UserPath(BaseModel):
 class UserNameModel(BaseModel):
     username: str = Field(..., description='用户名')
     
+class UserSearchQuery(BaseModel):
+    prefix: str = Field(..., min_length = 1, max_length = 255, description = '用户名前缀')
+    limit: int = Field(10, ge = 1, le = 20, description = '返回数量')
+
 class UserPasswordModel(BaseModel):
     password: str = Field(..., description='密码')
 
@@ -24,10 +30,35 @@ class OrganizationModel(BaseModel):
     c_name: str = Field(description = '组织名称')
     c_type: str = Field(description = '组织类型')
     invite_code: str = Field(description = '邀请码')
+    parent_id: Optional[int] = Field(None, description = '父组织ID')
 
 class OrgPath(BaseModel):
     c_id: int = Field(..., description = '组织id')
 
+class OrgMoveModel(BaseModel):
+    parent_id: Optional[int] = Field(None, description = '新的父组织ID，为空时成为顶级组织')
+
+class PageQuery(BaseModel):
+    page: int = Field(1, ge = 1, description = '页码')
+    page_size: int = Field(50, ge = 1, le = 200, description = '每页数量')
+
+class OverviewQuery(BaseModel):
+    limit: int = Field(50, ge = 1, le = 200, description = '返回的最新任务数量')
+
+class TaskListQuery(BaseModel):
+    since: Optional[datetime.datetime] = Field(None, description = '只返回该时间之后发布的任务')
+
+class SubtreeTaskQuery(PageQuery):
+    task_state: Optional[int] = Field(None, description = '任务状态')
+    since: Optional[datetime.datetime] = Field(None, description = '只返回该时间之后发布的任务')
+
+class TaskSearchQuery(PageQuery):
+    q: str = Field(..., min_length = 1, max_length = 100, description = '搜索关键词')
+
+class LeaderboardQuery(BaseModel):
+    period: Literal['week', 'all'] = Field('week', description = '统计周期：本周或全部')
+    limit: int = Field(10, ge = 1, le = 100, description = '返回的名次数量')
+
 class TaskModel(BaseModel):
     task_id: int = Field(description = '任务id')
     task_name: str = Field(description = '任务名称')
@@ -39,6 +70,28 @@ class TaskModel(BaseModel):
     completion_time: str = Field(description = '完成时间')
     c_id: int = Field(description = '组织id')
     task_desc: str = Field(description = '任务描述')
+    priority: int = Field(0, ge = 0, le = 255, description = '优先级')
+
+class TaskItemModel(BaseModel):
+    task_name: str = Field(..., description = '任务名称')
+    time_limit: int = Field(description = '时间限制')
+    task_desc: str = Field(description = '任务描述')
+    priority: int = Field(0, ge = 0, le = 255, description = '优先级')
+
+class TaskBulkModel(BaseModel):
+    c_id: int = Field(..., description = '组织id')
+    tasks: List[TaskItemModel] = Field(..., description = '任务列表')
+
+class TaskTemplateModel(BaseModel):
+    task_name: str = Field(..., description = '任务名称')
+    task_desc: str = Field('', description = '任务描述')
+    time_limit: int = Field(0, description = '时间限制')
+    priority: int = Field(0, ge = 0, le = 255, description = '优先级')
+    cron_rule: str = Field(..., description = '五段式cron规则，如 0 8 * * 1-5')
+    assignees: List[int] = Field([], description = '轮流指派的用户id列表')
+
+class TemplatePath(BaseModel):
+    template_id: int = Field(..., description = '模板id')
 
 class TaskPath(BaseModel):
     task_id: int = Field(..., description = '任务id')
@@ -46,6 +99,18 @@ class TaskPath(BaseModel):
 class TaskStateModel(BaseModel):
     task_state: str = Field(..., description = '任务状态')
     
+class InviteCodeModel(BaseModel):
+    invite_code: str = Field(..., min_length = 1, max_length = 255, description = '邀请码')
+
 class OrgUserModel(BaseModel):
     u_id: int = Field(..., description = '用户id')
     c_id: int = Field(..., description = '组织id')
+
+class BatchItemModel(BaseModel):
+    method: str = Field(..., description = 'HTTP方法')
+    path: str = Field(..., description = '请求路径')
+    body: Optional[Any] = Field(None, description = '请求体')
+
+class BatchModel(BaseModel):
+    requests: List[BatchItemModel] = Field(..., description = '按顺序执行的子请求')
+    atomic: bool = Field(False, description = '是否全部成功或全部回滚')
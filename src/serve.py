@@ -0,0 +1,98 @@
+"""
+生产环境启动入口，使用 gunicorn 预派生多个工作进程
+
+    python src/serve.py [--bind 0.0.0.0:5000] [--workers 4] [--threads 8] [--no-preload] [--asgi]
+
+参数默认取 config/app.json 的 server 配置，workers 为 0 时按 CPU 核数启动。preload 为 true 时主进程只导入应用代码
+（不连接数据库），各工作进程在 fork 之后调用 create_app 创建连接和线程。工作进程处理 max_requests（加随机抖动）个请求后
+被平滑回收，收到 SIGHUP 时逐个替换全部工作进程。
+
+每个请求线程使用自己的 DAO 和数据库连接，一个进程最多占用 threads 个连接（ASGI 模式为 asgi_threads 加
+async_dao_pool_size 个），另有后台任务各自的连接，进程数乘以连接数需小于 MySQL 的 max_connections。
+
+--asgi 改用 uvicorn 加载 asgi.py，每个进程在事件循环中维护客户端连接，空闲和慢速的连接不占用线程；
+请求处理仍在线程池中进行，同时处理中的请求数不超过 asgi_threads，详见 asgi.py。
+"""
+import argparse
+import os
+import sys
+import uvicorn
+from gunicorn.app.base import BaseApplication
+from config_manager import ConfigManager
+from logger import LoggerFactory
+
+logger = LoggerFactory.getLogger()
+
+
+def post_fork(server, worker):
+    import app
+    app.create_app()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown_app()
+
+
+class EarthFighterServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # create_app 已在 post_fork 中调用，这里只取出应用对象
+        import app
+        return app.app
+
+
+def build_options(server_config, args):
+    workers = args.workers if args.workers is not None else server_config['workers']
+    return {
+        "bind": args.bind or server_config['bind'],
+        "workers": workers or os.cpu_count() or 1,
+        "threads": args.threads or server_config['threads'],
+        "worker_class": "gthread",
+        "preload_app": server_config['preload'] and not args.no_preload,
+        "timeout": server_config['timeout_seconds'],
+        "graceful_timeout": server_config['graceful_timeout_seconds'],
+        "max_requests": server_config['max_requests'],
+        "max_requests_jitter": server_config['max_requests_jitter'],
+        "post_fork": post_fork,
+        "worker_exit": worker_exit,
+    }
+
+
+def run_asgi(server_config, args):
+    host, port = (args.bind or server_config['bind']).rsplit(":", 1)
+    workers = args.workers if args.workers is not None else server_config['workers']
+    uvicorn.run(
+        "asgi:application",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=host,
+        port=int(port),
+        workers=workers or os.cpu_count() or 1,
+        timeout_keep_alive=server_config['asgi_keep_alive_seconds'],
+        timeout_graceful_shutdown=server_config['graceful_timeout_seconds'],
+        limit_max_requests=server_config['max_requests'],
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以多进程方式启动 Earth fighter 服务")
+    parser.add_argument("--bind", help="监听地址，如 0.0.0.0:5000")
+    parser.add_argument("--workers", type=int, help="工作进程数，0 表示按 CPU 核数")
+    parser.add_argument("--threads", type=int, help="每个工作进程的线程数")
+    parser.add_argument("--no-preload", action="store_true", help="不在主进程中预先导入应用代码")
+    parser.add_argument("--asgi", action="store_true", help="使用 uvicorn 以 ASGI 方式运行")
+    args = parser.parse_args()
+    server_config = ConfigManager().get_server_config()
+    if args.asgi:
+        run_asgi(server_config, args)
+        sys.exit(0)
+    options = build_options(server_config, args)
+    logger.info(f"启动 {options['workers']} 个工作进程，每个进程 {options['threads']} 个线程，监听 {options['bind']}")
+    EarthFighterServer(options).run()
@@ -0,0 +1,383 @@
+"""
+同一台机器上多个工作进程共享的查询结果缓存
+
+缓存由一个守护进程持有，工作进程通过 Unix 套接字（multiprocessing.connection）读写，
+所有进程看到同一份数据，命中率不随进程数下降。守护进程按 LRU 淘汰，总大小和条目数分别受
+shared_cache_max_bytes 和 shared_cache_max_entries 限制。
+
+每个缓存条目带有若干标签，例如 "organization:12" 和 "organization"。DAO 提交写操作后按标签失效，
+守护进程删除相关条目，并把失效的标签推送给订阅的工作进程，用于清理各进程内的本地缓存。
+为避免查询期间发生的写入被旧结果覆盖，未命中时返回当前的失效序号，写回时若相关标签在此之后失效则丢弃。
+
+守护进程还记录每个用户最近一次写入的时间，用户的下一个请求落在其他工作进程时同样能读己之写。
+
+守护进程可以单独运行（python src/shared_cache.py），shared_cache_spawn 为 true 时由第一个连接失败的工作进程启动。
+守护进程不可用时读写直接访问数据库，并每隔 shared_cache_retry_seconds 重试连接。
+"""
+import fcntl
+import json
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.connection import Client, Listener
+from logger import LoggerFactory
+
+logger = LoggerFactory.getLogger()
+
+# 失效记录超过该数量时清空，并丢弃在此之前开始的查询结果
+MAX_TRACKED_TAGS = 100000
+# 记录写入时间的用户数超过该值时，清理 WRITE_RETENTION_SECONDS 秒之前的记录
+MAX_TRACKED_WRITERS = 100000
+WRITE_RETENTION_SECONDS = 60
+
+
+class _Entry:
+    def __init__(self, value, tags, expires):
+        self.value = value
+        self.tags = tags
+        self.expires = expires
+
+
+class CacheServer:
+    """
+    缓存守护进程，每个连接一个线程
+    """
+    def __init__(self, socket_path, max_bytes, max_entries):
+        self.socket_path = socket_path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._tag_keys = {}
+        # 标签最近一次失效时的序号，以及早于 _floor 的查询结果一律不写入
+        self._invalidated = {}
+        self._sequence = 0
+        self._floor = 0
+        self._subscribers = []
+        # 用户最近一次写入的时间（守护进程的 time.monotonic）
+        self._writes = {}
+        self._lock = threading.Lock()
+        # 多个连接同时失效时，推送给同一订阅者的消息不能交错
+        self._publish_lock = threading.Lock()
+
+    def serve_forever(self):
+        lock_file = open(self.socket_path + ".lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info(f"缓存守护进程已在运行: {self.socket_path}")
+            return
+        # 上一个守护进程异常退出时会留下套接字文件
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        listener = Listener(self.socket_path, family='AF_UNIX')
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"缓存守护进程开始监听: {self.socket_path}")
+        while True:
+            connection = listener.accept()
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            while True:
+                command, *args = connection.recv()
+                if command == "subscribe":
+                    with self._lock:
+                        self._subscribers.append(connection)
+                    return
+                connection.send(getattr(self, f"_do_{command}")(*args))
+        except (EOFError, OSError):
+            connection.close()
+
+    def _do_get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return "hit", entry.value
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return "miss", self._sequence
+
+    def _do_set(self, key, value, tags, sequence, ttl):
+        with self._lock:
+            if sequence < self._floor or any(self._invalidated.get(tag, 0) > sequence for tag in tags):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, tags, time.monotonic() + ttl)
+            self.size += len(value)
+            for tag in tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+            while self._entries and (self.size > self.max_bytes or len(self._entries) > self.max_entries):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+    def _do_invalidate(self, tags):
+        with self._lock:
+            self._sequence += 1
+            self.invalidations += 1
+            if len(self._invalidated) > MAX_TRACKED_TAGS:
+                self._invalidated.clear()
+                self._floor = self._sequence
+            for tag in tags:
+                self._invalidated[tag] = self._sequence
+                for key in list(self._tag_keys.get(tag, ())):
+                    self._remove(key)
+            subscribers = list(self._subscribers)
+        self._publish(subscribers, tags)
+
+    def _do_clear(self):
+        with self._lock:
+            self._sequence += 1
+            self._floor = self._sequence
+            self._entries.clear()
+            self._tag_keys.clear()
+            self._invalidated.clear()
+            self.size = 0
+            subscribers = list(self._subscribers)
+        self._publish(subscribers, None)
+
+    def _do_record_write(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            self._writes[user_id] = now
+            if len(self._writes) > MAX_TRACKED_WRITERS:
+                for key in [key for key, written in self._writes.items() if now - written > WRITE_RETENTION_SECONDS]:
+                    del self._writes[key]
+
+    def _do_write_age(self, user_id):
+        with self._lock:
+            written = self._writes.get(user_id)
+        return None if written is None else time.monotonic() - written
+
+    def _do_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "subscribers": len(self._subscribers)
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= len(entry.value)
+        for tag in entry.tags:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+    def _publish(self, subscribers, tags):
+        """
+        向订阅者推送失效的标签，tags 为 None 表示全部失效
+        """
+        with self._publish_lock:
+            for connection in subscribers:
+                try:
+                    connection.send(("invalidate", tags))
+                except OSError:
+                    with self._lock:
+                        if connection in self._subscribers:
+                            self._subscribers.remove(connection)
+
+
+class SharedCache:
+    """
+    工作进程中的缓存客户端，每个线程使用自己的连接
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, config):
+        self.socket_path = config['shared_cache_socket']
+        self.ttl = config.get('shared_cache_ttl_seconds', 30)
+        self.retry_interval = config.get('shared_cache_retry_seconds', 5)
+        self.spawn = config.get('shared_cache_spawn', False)
+        self.max_bytes = config.get('shared_cache_max_bytes', 64 * 1024 * 1024)
+        self.max_entries = config.get('shared_cache_max_entries', 100000)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._local = threading.local()
+        self._retry_at = 0.0
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, config):
+        """
+        按套接字路径获取进程内共享的客户端，未配置 shared_cache_socket 时返回 None
+        """
+        if not config.get('shared_cache_socket'):
+            return None
+        with cls._shared_lock:
+            if config['shared_cache_socket'] not in cls._shared:
+                cls._shared[config['shared_cache_socket']] = cls(config)
+            return cls._shared[config['shared_cache_socket']]
+
+    def get(self, key):
+        """
+        返回 (是否命中, 结果或失效序号)；守护进程不可用时返回 (False, None)，此时结果不写回
+        """
+        reply = self._request("get", key)
+        if reply is None:
+            return False, None
+        status, value = reply
+        if status == "hit":
+            self.hits += 1
+            return True, pickle.loads(value)
+        self.misses += 1
+        return False, value
+
+    def set(self, key, value, tags, sequence):
+        if sequence is not None:
+            self._request("set", key, pickle.dumps(value), tuple(tags), sequence, self.ttl)
+
+    def invalidate(self, tags):
+        if tags:
+            self._request("invalidate", tuple(tags))
+
+    def clear(self):
+        self._request("clear")
+
+    def record_write(self, user_id):
+        """
+        记录用户刚刚提交了写入
+        """
+        self._request("record_write", user_id)
+
+    def write_age(self, user_id):
+        """
+        返回用户最近一次写入距今的秒数，没有记录或守护进程不可用时返回 None
+        """
+        return self._request("write_age", user_id)
+
+    def stats(self):
+        return self._request("stats")
+
+    def subscribe(self, callback):
+        """
+        注册失效回调 callback(tags)，tags 为 None 时表示全部失效；首次注册时启动订阅线程
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+            if len(self._callbacks) == 1:
+                threading.Thread(target=self._subscribe_loop, name="shared_cache_subscriber", daemon=True).start()
+
+    def metrics(self):
+        """
+        返回 Prometheus 文本格式的指标行，守护进程不可用时只返回本进程的计数
+        """
+        lines = [
+            "# TYPE shared_cache_client_hits_total counter",
+            f"shared_cache_client_hits_total {self.hits}",
+            "# TYPE shared_cache_client_misses_total counter",
+            f"shared_cache_client_misses_total {self.misses}",
+            "# TYPE shared_cache_client_errors_total counter",
+            f"shared_cache_client_errors_total {self.errors}",
+        ]
+        stats = self.stats()
+        if stats:
+            for name in ("entries", "bytes", "hit_ratio", "subscribers"):
+                lines += [f"# TYPE shared_cache_{name} gauge", f"shared_cache_{name} {stats[name]}"]
+            for name in ("hits", "misses", "evictions", "invalidations"):
+                lines += [f"# TYPE shared_cache_{name}_total counter", f"shared_cache_{name}_total {stats[name]}"]
+        return lines
+
+    def _connect(self):
+        try:
+            return Client(self.socket_path, family='AF_UNIX')
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not self.spawn:
+                raise
+            self._spawn_server()
+            # 等待守护进程开始监听
+            for _ in range(20):
+                time.sleep(0.05)
+                try:
+                    return Client(self.socket_path, family='AF_UNIX')
+                except (FileNotFoundError, ConnectionRefusedError):
+                    continue
+            raise
+
+    def _spawn_server(self):
+        logger.info(f"启动缓存守护进程: {self.socket_path}")
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), self.socket_path, str(self.max_bytes), str(self.max_entries)],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+
+    def _request(self, *message):
+        if time.monotonic() < self._retry_at:
+            return None
+        connection = getattr(self._local, 'connection', None)
+        try:
+            if connection is None:
+                connection = self._local.connection = self._connect()
+            connection.send(message)
+            return connection.recv()
+        except (OSError, EOFError) as err:
+            self.errors += 1
+            if connection is not None:
+                connection.close()
+            self._local.connection = None
+            if time.monotonic() >= self._retry_at:
+                logger.warning(f"缓存守护进程不可用，{self.retry_interval}秒内直接查询数据库: {err}")
+            self._retry_at = time.monotonic() + self.retry_interval
+            return None
+
+    def _notify(self, tags):
+        for callback in list(self._callbacks):
+            try:
+                callback(tags)
+            except Exception as err:
+                logger.error(f"处理缓存失效通知时发生错误: {err}")
+
+    def _subscribe_loop(self):
+        while True:
+            try:
+                connection = self._connect()
+                connection.send(("subscribe",))
+                # 断线期间可能错过了失效通知，重新订阅后清理全部本地缓存
+                self._notify(None)
+                while True:
+                    _, tags = connection.recv()
+                    self._notify(tags)
+            except (OSError, EOFError):
+                time.sleep(self.retry_interval)
+
+
+def load_server_config():
+    with open('config/db_config.json') as config_file:
+        config = json.load(config_file)
+    return (config['shared_cache_socket'], config.get('shared_cache_max_bytes', 64 * 1024 * 1024),
+            config.get('shared_cache_max_entries', 100000))
+
+
+if __name__ == "__main__":
+    # 由工作进程启动时通过参数传入配置，单独运行时读取 config/db_config.json
+    if len(sys.argv) == 4:
+        socket_path, max_bytes, max_entries = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+    else:
+        socket_path, max_bytes, max_entries = load_server_config()
+    CacheServer(socket_path, max_bytes, max_entries).serve_forever()
@@ -0,0 +1,93 @@
+"""
+相同只读查询的合并执行
+
+同一时刻相同方法和参数的查询只有第一个调用（leader）真正执行，其余调用等待并共享它的结果。
+ttl 大于 0 时结果在 ttl 秒内继续被复用。调用方拿到的都是结果的深拷贝，修改返回值不会影响其他请求。
+本进程提交写操作后调用 invalidate，之后的调用不会再共享写入之前开始的查询或缓存的结果。
+"""
+import copy
+import threading
+import time
+
+# 缓存的结果超过该数量时清理已过期的结果
+MAX_RESULTS = 1024
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # 执行期间发生了写入，结果不再缓存
+        self.stale = False
+
+
+class SingleFlight:
+    def __init__(self, ttl=0):
+        self.ttl = ttl
+        self.executed = 0
+        self.shared = 0
+        self._flights = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None, retry_errors=()):
+        """
+        执行或等待 key 对应的查询并返回结果
+        等待超过 timeout 秒时抛出 TimeoutError；leader 抛出 retry_errors 中的异常时，等待者自行执行一次
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._results.get(key)
+            if cached and cached[0] > now:
+                self.shared += 1
+                return copy.deepcopy(cached[1])
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.executed += 1
+            else:
+                self.shared += 1
+        if leader:
+            return self._lead(key, flight, fn)
+        if not flight.done.wait(timeout):
+            raise TimeoutError("等待相同查询的结果超时")
+        if isinstance(flight.error, retry_errors):
+            return fn()
+        if flight.error is not None:
+            raise flight.error
+        return copy.deepcopy(flight.result)
+
+    def _lead(self, key, flight, fn):
+        try:
+            result = fn()
+        except BaseException as err:
+            flight.error = err
+            raise
+        else:
+            # 共享的是副本，leader 修改自己的返回值不影响其他调用
+            flight.result = copy.deepcopy(result)
+            return result
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                if flight.error is None and self.ttl > 0 and not flight.stale:
+                    now = time.monotonic()
+                    self._results[key] = (now + self.ttl, flight.result)
+                    if len(self._results) > MAX_RESULTS:
+                        for expired_key in [k for k, (expires, _) in self._results.items() if expires <= now]:
+                            del self._results[expired_key]
+            flight.done.set()
+
+    def invalidate(self):
+        """
+        丢弃缓存的结果，正在执行的查询仍返回给已在等待的调用，但之后的调用重新查询
+        """
+        with self._lock:
+            for flight in self._flights.values():
+                flight.stale = True
+            self._flights.clear()
+            self._results.clear()
@@ -0,0 +1,79 @@
+"""
+任务表按月 RANGE 分区的规划
+
+分区名为 pYYYYMM，保存当月发布的任务，上界为下个月第一天；另有 MAXVALUE 分区 pmax 兜底。
+"""
+import datetime
+from logger import LoggerFactory
+
+logger = LoggerFactory.getLogger()
+
+
+def month_start(moment):
+    return datetime.datetime(moment.year, moment.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return month.strftime("p%Y%m")
+
+
+def partition_month(name):
+    """
+    从分区名解析月份，不是按月命名的分区（如 pmax）返回 None
+    """
+    try:
+        return datetime.datetime.strptime(name, "p%Y%m")
+    except ValueError:
+        return None
+
+
+def plan_partitions(first_month, last_month):
+    """
+    返回 [first_month, last_month] 每个月的 (分区名, 上界时间)
+    """
+    partitions = []
+    month = month_start(first_month)
+    while month <= last_month:
+        partitions.append((partition_name(month), add_months(month, 1)))
+        month = add_months(month, 1)
+    return partitions
+
+
+def missing_partitions(existing, now, future_months):
+    """
+    返回需要补建的分区，保证当前月之后 future_months 个月的分区已存在
+    """
+    months = [month for month in (partition_month(name) for name, _ in existing) if month]
+    target = add_months(month_start(now), future_months)
+    first = add_months(max(months), 1) if months else month_start(now)
+    return plan_partitions(first, target)
+
+
+def expired_partitions(existing, now, retention_months):
+    """
+    返回超过保留月数的分区名，retention_months 为 0 时不删除
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(now), -retention_months)
+    return [name for name, _ in existing if partition_month(name) and partition_month(name) < cutoff]
+
+
+def migrate(dao, future_months):
+    """
+    将未分区的任务表迁移为按月分区，分区从最早任务的发布月份开始建到当前月之后 future_months 个月
+    """
+    if dao.get_task_partitions():
+        logger.info("任务表已经分区，无需迁移")
+        return False
+    now = dao.get_db_now()
+    earliest = dao.get_earliest_task_publish_time() or now
+    partitions = plan_partitions(earliest, add_months(month_start(now), future_months))
+    dao.partition_tasks_table(partitions)
+    logger.info(f"任务表分区迁移完成，共{len(partitions)}个月分区")
+    return True
@@ -1,4 +1,5 @@
 import random
+import secrets
 import string
 import config_manager
 from schemas import *
@@ -55,8 +56,11 @@ def generate_task_data():
     }
     return task_data
 
-def generate_invite_code():
+# 邀请码字符集：组织表使用不区分大小写的排序规则，只用大写字母和数字，并去掉易混淆的 0O1I
+INVITE_CODE_ALPHABET = ''.join(c for c in string.ascii_uppercase + string.digits if c not in '0O1I')
+
+def generate_invite_code(length=6):
     """
-    生成随机的6位大小写字母组合的邀请码
+    使用安全随机数生成邀请码，唯一性由数据库唯一索引保证，冲突时由调用方重新生成
     """
-    return ''.join(random.choices(string.ascii_letters, k=6))
+    return ''.join(secrets.choice(INVITE_CODE_ALPHABET) for _ in range(length))
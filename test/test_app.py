@@ -751,6 +751,643 @@ class TestApp(unittest.TestCase):
         response = requests.get(f'{self.base_url}/users/tasks')
         self.assertEqual(response.status_code, 401)
 
+    def test_get_user_overview(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        org_a = generate_org_data()
+        # 发送POST请求创建用户
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        u_id_a = response.json().get('user_id')
+        # 登录用户a
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        self.assertEqual(response.status_code, 200)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        # 创建组织a
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+        # 发布任务
+        task_data = generate_task_data()
+        task_data['c_id'] = org_id_a
+        task_data['publisher_id'] = u_id_a
+        response = requests.put(f'{self.base_url}/tasks/publish', json=task_data, headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        # 查询成功
+        response = requests.get(f'{self.base_url}/users/me/overview', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json().get('data')
+        self.assertEqual(data['profile']['user_id'], u_id_a)
+        self.assertEqual(len(data['organizations']), 1)
+        self.assertEqual(data['organizations'][0]['task_counts']['pending'], 1)
+        self.assertEqual(data['organizations'][0]['task_counts']['in_progress'], 0)
+        self.assertEqual(len(data['tasks']), 1)
+        self.assertFalse(data['tasks_has_more'])
+
+        # 限制返回的任务数量
+        response = requests.put(f'{self.base_url}/tasks/publish', json=task_data, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(f'{self.base_url}/users/me/overview', params={'limit': 1}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json().get('data')
+        self.assertEqual(len(data['tasks']), 1)
+        self.assertTrue(data['tasks_has_more'])
+
+        # 非法查询，未认证
+        response = requests.get(f'{self.base_url}/users/me/overview')
+        self.assertEqual(response.status_code, 401)
+
+    def test_get_organization_stats(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        user_b = generate_user_data()
+        org_a = generate_org_data()
+        # 发送POST请求创建用户
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        u_id_a = response.json().get('user_id')
+        response = requests.post(f'{self.base_url}/users/create', json=user_b)
+        self.assertEqual(response.status_code, 201)
+        # 登录用户a和用户b
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        self.assertEqual(response.status_code, 200)
+        headers_a = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/users/login', json=user_b)
+        self.assertEqual(response.status_code, 200)
+        headers_b = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        # 创建组织a并发布两个任务
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers_a)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+        task_ids = []
+        for _ in range(2):
+            task_data = generate_task_data()
+            task_data['c_id'] = org_id_a
+            task_data['publisher_id'] = u_id_a
+            response = requests.put(f'{self.base_url}/tasks/publish', json=task_data, headers=headers_a)
+            self.assertEqual(response.status_code, 200)
+            task_ids.append(response.json().get('task_id'))
+        # 接取其中一个任务
+        response = requests.put(f'{self.base_url}/tasks/{task_ids[0]}/accept', headers=headers_a)
+        self.assertEqual(response.status_code, 200)
+
+        # 查询成功，未出现的状态计数为0
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/stats', headers=headers_a)
+        self.assertEqual(response.status_code, 200)
+        task_counts = response.json()['data']['task_counts']
+        self.assertEqual(task_counts['pending'], 1)
+        self.assertEqual(task_counts['in_progress'], 1)
+        self.assertEqual(task_counts['completed'], 0)
+
+        # 非组织成员无法查询
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/stats', headers=headers_b)
+        self.assertEqual(response.status_code, 403)
+
+    def test_organization_leaderboard(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        user_b = generate_user_data()
+        org_a = generate_org_data()
+        # 发送POST请求创建用户
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        u_id_a = response.json().get('user_id')
+        response = requests.post(f'{self.base_url}/users/create', json=user_b)
+        self.assertEqual(response.status_code, 201)
+        # 登录用户a和用户b
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        self.assertEqual(response.status_code, 200)
+        headers_a = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/users/login', json=user_b)
+        self.assertEqual(response.status_code, 200)
+        headers_b = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        # 创建组织a
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers_a)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+
+        # 尚未完成任务时没有名次
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/leaderboard', headers=headers_a)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['data']['me']['rank'])
+
+        # 发布、接取、提交并确认一个任务
+        task_data = generate_task_data()
+        task_data['c_id'] = org_id_a
+        task_data['publisher_id'] = u_id_a
+        response = requests.put(f'{self.base_url}/tasks/publish', json=task_data, headers=headers_a)
+        self.assertEqual(response.status_code, 200)
+        task_id = response.json().get('task_id')
+        response = requests.put(f'{self.base_url}/tasks/{task_id}/accept', headers=headers_a)
+        self.assertEqual(response.status_code, 200)
+        response = requests.put(f'{self.base_url}/tasks/{task_id}/submit', headers=headers_a)
+        self.assertEqual(response.status_code, 200)
+        response = requests.put(f'{self.base_url}/tasks/{task_id}/confirm', headers=headers_a)
+        self.assertEqual(response.status_code, 200)
+
+        # 本周和全部排行榜都计入积分
+        for period in ('week', 'all'):
+            response = requests.get(f'{self.base_url}/organizations/{org_id_a}/leaderboard',
+                                    params={'period': period, 'limit': 5}, headers=headers_a)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()['data']
+            self.assertEqual(data['me'], {'rank': 1, 'score': 1})
+            self.assertEqual(data['entries'][0]['user_id'], u_id_a)
+
+        # 非组织成员无法查询
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/leaderboard', headers=headers_b)
+        self.assertEqual(response.status_code, 403)
+
+    def test_search_organization_tasks(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        org_a = generate_org_data()
+        # 发送POST请求创建用户
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        u_id_a = response.json().get('user_id')
+        # 登录用户a
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        self.assertEqual(response.status_code, 200)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        # 创建组织a并发布任务
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+        task_data = generate_task_data()
+        task_data['c_id'] = org_id_a
+        task_data['publisher_id'] = u_id_a
+        task_data['task_desc'] = '周末去海边清理垃圾'
+        response = requests.put(f'{self.base_url}/tasks/publish', json=task_data, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        task_id = response.json().get('task_id')
+
+        # 搜索成功
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/tasks/search',
+                                params={'q': '清理垃圾', 'page_size': 10}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['tasks'][0]['task_id'], task_id)
+        self.assertFalse(data['has_more'])
+
+        # 缺少关键词
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/tasks/search', headers=headers)
+        self.assertEqual(response.status_code, 422)
+
+    def test_search_users(self):
+        # 准备测试数据，用户名使用相同的随机前缀
+        user_a = generate_user_data()
+        user_b = generate_user_data()
+        user_b['username'] = user_a['username'] + 'b'
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/create', json=user_b)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        self.assertEqual(response.status_code, 200)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+
+        # 搜索成功，按用户名排序
+        response = requests.get(f'{self.base_url}/users/search', params={'prefix': user_a['username']}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        usernames = [user['username'] for user in response.json()['data']]
+        self.assertEqual(usernames, [user_a['username'], user_b['username']])
+
+        # 限制返回数量
+        response = requests.get(f'{self.base_url}/users/search', params={'prefix': user_a['username'], 'limit': 1}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 1)
+
+        # 非法查询，未认证
+        response = requests.get(f'{self.base_url}/users/search', params={'prefix': user_a['username']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_join_organization_by_invite_code(self):
+        # 准备测试数据
+        creator_data = generate_user_data()
+        joiner_data = generate_user_data()
+        organization_data = generate_org_data()
+        response = requests.post(f'{self.base_url}/users/create', json=creator_data)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/create', json=joiner_data)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/login', json=creator_data)
+        self.assertEqual(response.status_code, 200)
+        creator_headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/users/login', json=joiner_data)
+        self.assertEqual(response.status_code, 200)
+        joiner_headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        # 创建组织
+        response = requests.post(f'{self.base_url}/organizations/create', json=organization_data, headers=creator_headers)
+        self.assertEqual(response.status_code, 201)
+        org_id = response.json()['c_id']
+        invite_code = response.json()['invite_code']
+
+        # 非创建者无法更换邀请码
+        response = requests.post(f'{self.base_url}/organizations/{org_id}/invite-code/rotate', headers=joiner_headers)
+        self.assertEqual(response.status_code, 403)
+        # 创建者更换邀请码后旧邀请码失效
+        response = requests.post(f'{self.base_url}/organizations/{org_id}/invite-code/rotate', headers=creator_headers)
+        self.assertEqual(response.status_code, 200)
+        new_invite_code = response.json()['data']['invite_code']
+        self.assertNotEqual(new_invite_code, invite_code)
+        response = requests.post(f'{self.base_url}/organizations/join', json={'invite_code': invite_code}, headers=joiner_headers)
+        self.assertEqual(response.status_code, 404)
+
+        # 凭新邀请码加入组织
+        response = requests.post(f'{self.base_url}/organizations/join', json={'invite_code': new_invite_code}, headers=joiner_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['c_id'], org_id)
+
+        # 重复加入
+        response = requests.post(f'{self.base_url}/organizations/join', json={'invite_code': new_invite_code}, headers=joiner_headers)
+        self.assertEqual(response.status_code, 409)
+
+    def test_get_organization_task_history(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        user_b = generate_user_data()
+        org_a = generate_org_data()
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/create', json=user_b)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        self.assertEqual(response.status_code, 200)
+        headers_a = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/users/login', json=user_b)
+        self.assertEqual(response.status_code, 200)
+        headers_b = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers_a)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+
+        # 新组织没有历史任务
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/tasks/history', headers=headers_a)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['tasks'], [])
+        self.assertFalse(response.json()['data']['has_more'])
+
+        # 非组织成员无法查询
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/tasks/history', headers=headers_b)
+        self.assertEqual(response.status_code, 403)
+
+    def test_batch_requests(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        org_a = generate_org_data()
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        self.assertEqual(response.status_code, 200)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+        task_data = generate_task_data()
+        task_data['c_id'] = org_id_a
+
+        # 非原子模式，逐个返回结果
+        batch = {
+            "requests": [
+                {"method": "PUT", "path": "/tasks/publish", "body": task_data},
+                {"method": "GET", "path": f"/organizations/{org_id_a}/info"},
+                {"method": "GET", "path": "/organizations/0/info"}
+            ]
+        }
+        response = requests.post(f'{self.base_url}/batch', json=batch, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        results = response.json().get('data')
+        self.assertEqual([item['status'] for item in results], [200, 200, 403])
+
+        # 原子模式，失败时回滚已发布的任务
+        batch['atomic'] = True
+        response = requests.post(f'{self.base_url}/batch', json=batch, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/tasks', headers=headers)
+        self.assertEqual(len(response.json().get('data')), 1)
+
+        # 原子模式回滚时，已确认任务的积分不计入排行榜
+        task_id = results[0]['body']['task_id']
+        response = requests.put(f'{self.base_url}/tasks/{task_id}/accept', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.put(f'{self.base_url}/tasks/{task_id}/submit', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        # 先查询一次，使排行榜进入缓存
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/leaderboard', headers=headers)
+        self.assertIsNone(response.json()['data']['me']['rank'])
+        confirm_batch = {
+            "atomic": True,
+            "requests": [
+                {"method": "PUT", "path": f"/tasks/{task_id}/confirm"},
+                {"method": "GET", "path": "/organizations/0/info"}
+            ]
+        }
+        response = requests.post(f'{self.base_url}/batch', json=confirm_batch, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['data'][0]['status'], 200)
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/leaderboard', headers=headers)
+        self.assertIsNone(response.json()['data']['me']['rank'])
+
+        # 未认证
+        response = requests.post(f'{self.base_url}/batch', json=batch)
+        self.assertEqual(response.status_code, 401)
+
+    def test_publish_tasks_bulk(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        user_b = generate_user_data()
+        org_a = generate_org_data()
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/create', json=user_b)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        self.assertEqual(response.status_code, 200)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+
+        # 批量发布
+        tasks = [generate_task_data() for _ in range(3)]
+        bulk = {"c_id": org_id_a, "tasks": tasks}
+        response = requests.post(f'{self.base_url}/tasks/publish/bulk', json=bulk, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+        task_ids = response.json()['task_ids']
+        self.assertEqual(len(task_ids), 3)
+        self.assertEqual((response.json()['first_task_id'], response.json()['last_task_id']), (task_ids[0], task_ids[-1]))
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/tasks', headers=headers)
+        self.assertEqual(len(response.json().get('data')), 3)
+
+        # 空任务列表
+        response = requests.post(f'{self.base_url}/tasks/publish/bulk', json={"c_id": org_id_a, "tasks": []}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+        # 非组织成员
+        response = requests.post(f'{self.base_url}/users/login', json=user_b)
+        headers_b = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/tasks/publish/bulk', json=bulk, headers=headers_b)
+        self.assertEqual(response.status_code, 403)
+
+    def test_import_organization_members(self):
+        # 准备测试数据
+        creator = generate_user_data()
+        members = [generate_user_data() for _ in range(3)]
+        org_a = generate_org_data()
+        response = requests.post(f'{self.base_url}/users/create', json=creator)
+        self.assertEqual(response.status_code, 201)
+        member_ids = []
+        for member in members:
+            response = requests.post(f'{self.base_url}/users/create', json=member)
+            self.assertEqual(response.status_code, 201)
+            member_ids.append(response.json()['user_id'])
+        response = requests.post(f'{self.base_url}/users/login', json=creator)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+
+        # JSON导入，用户名和用户ID混合
+        users = [members[0]['username'], member_ids[1], 'no_such_user_name']
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/members/import', json={"users": users}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['result'] for item in response.json()['data']], ['added', 'added', 'not_found'])
+
+        # CSV导入
+        csv_data = f"username\n{members[1]['username']}\n{members[2]['username']}\n"
+        csv_headers = dict(headers, **{"Content-Type": "text/csv"})
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/members/import', data=csv_data, headers=csv_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['result'] for item in response.json()['data']], ['already_member', 'added'])
+
+        # 超过行数上限时整体拒绝，不导入任何一行
+        late_member = generate_user_data()
+        response = requests.post(f'{self.base_url}/users/create', json=late_member)
+        self.assertEqual(response.status_code, 201)
+        too_many = [late_member['username']] + ['no_such_user_name'] * 10000
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/members/import', json={"users": too_many}, headers=headers)
+        self.assertEqual(response.status_code, 413)
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/members/import', json={"users": [late_member['username']]}, headers=headers)
+        self.assertEqual([item['result'] for item in response.json()['data']], ['added'])
+
+        # 非创建者导入
+        response = requests.post(f'{self.base_url}/users/login', json=members[0])
+        member_headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/members/import', json={"users": users}, headers=member_headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_claim_next_task(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        user_b = generate_user_data()
+        org_a = generate_org_data()
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/create', json=user_b)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+
+        # 发布普通任务和高优先级任务
+        task_data = generate_task_data()
+        task_data['c_id'] = org_id_a
+        response = requests.put(f'{self.base_url}/tasks/publish', json=task_data, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        task_data['priority'] = 9
+        response = requests.put(f'{self.base_url}/tasks/publish', json=task_data, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        urgent_task_id = response.json()['task_id']
+
+        # 领取优先级最高的任务
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/tasks/claim-next', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['task_id'], urgent_task_id)
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/tasks/claim-next', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/tasks/claim-next', headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+        # 非组织成员
+        response = requests.post(f'{self.base_url}/users/login', json=user_b)
+        headers_b = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/tasks/claim-next', headers=headers_b)
+        self.assertEqual(response.status_code, 403)
+
+    def test_task_templates(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        org_a = generate_org_data()
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        u_id_a = response.json().get('user_id')
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.post(f'{self.base_url}/organizations/create', json=org_a, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        org_id_a = response.json().get('c_id')
+
+        # 创建周期任务模板
+        template = {"task_name": "dishes", "cron_rule": "0 19 * * *", "time_limit": 3600, "assignees": [u_id_a]}
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/templates', json=template, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        template_id = response.json()['template_id']
+
+        # 无效规则
+        response = requests.post(f'{self.base_url}/organizations/{org_id_a}/templates', json=dict(template, cron_rule="0 25 * * *"), headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+        # 查询模板列表
+        response = requests.get(f'{self.base_url}/organizations/{org_id_a}/templates', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 1)
+
+        # 删除模板
+        response = requests.delete(f'{self.base_url}/templates/{template_id}/delete', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.delete(f'{self.base_url}/templates/{template_id}/delete', headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_organization_subtree(self):
+        # 准备测试数据
+        user_a = generate_user_data()
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        # 创建国家和下属学校
+        country = generate_org_data()
+        country['c_type'] = 'country'
+        response = requests.post(f'{self.base_url}/organizations/create', json=country, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        country_id = response.json()['c_id']
+        school = generate_org_data()
+        school['c_type'] = 'school'
+        school['parent_id'] = country_id
+        response = requests.post(f'{self.base_url}/organizations/create', json=school, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        school_id = response.json()['c_id']
+
+        # 层级不合法
+        world = generate_org_data()
+        world['c_type'] = 'worldwide'
+        world['parent_id'] = school_id
+        response = requests.post(f'{self.base_url}/organizations/create', json=world, headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+        # 在学校发布任务，从国家查询
+        task_data = generate_task_data()
+        task_data['c_id'] = school_id
+        response = requests.put(f'{self.base_url}/tasks/publish', json=task_data, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(f'{self.base_url}/organizations/{country_id}/subtree/tasks', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 1)
+        response = requests.get(f'{self.base_url}/organizations/{country_id}/subtree/stats', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['organization_count'], 2)
+        self.assertEqual(response.json()['data']['task_counts']['pending'], 1)
+        response = requests.get(f'{self.base_url}/organizations/{country_id}/subtree/members', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 1)
+
+        # 不能移动到自己的子组织下
+        response = requests.put(f'{self.base_url}/organizations/{country_id}/move', json={"parent_id": school_id}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        # 移出后成为顶级组织
+        response = requests.put(f'{self.base_url}/organizations/{school_id}/move', json={"parent_id": None}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(f'{self.base_url}/organizations/{country_id}/subtree/tasks', headers=headers)
+        self.assertEqual(len(response.json()['data']), 0)
+
+    def test_metrics(self):
+        user_a = generate_user_data()
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        # 低优先级请求通过准入控制后计入指标
+        response = requests.get(f'{self.base_url}/users/tasks', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(f'{self.base_url}/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("admission_limit", response.text)
+        self.assertIn('admission_admitted_total{priority="low"}', response.text)
+
+    def test_rate_limit(self):
+        user_a = generate_user_data()
+        response = requests.post(f'{self.base_url}/users/create', json=user_a)
+        self.assertEqual(response.status_code, 201)
+        response = requests.post(f'{self.base_url}/users/login', json=user_a)
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        # 连续请求超过令牌桶容量后返回 429
+        status_codes = []
+        for _ in range(50):
+            response = requests.get(f'{self.base_url}/users/search', params={'prefix': user_a['username']}, headers=headers)
+            status_codes.append(response.status_code)
+        self.assertIn(429, status_codes)
+        self.assertEqual(status_codes[0], 200)
+        self.assertIn('Retry-After', response.headers)
+
+        # 其他用户不受影响
+        user_b = generate_user_data()
+        requests.post(f'{self.base_url}/users/create', json=user_b)
+        response = requests.post(f'{self.base_url}/users/login', json=user_b)
+        headers_b = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        response = requests.get(f'{self.base_url}/users/search', params={'prefix': user_a['username']}, headers=headers_b)
+        self.assertEqual(response.status_code, 200)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,3 +1,7 @@
+import asyncio
+import datetime
+import threading
+import time
 import unittest
 import mysql.connector
 import json
@@ -9,7 +13,10 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..\src')))
 
 # Now you can import from 'src'
-from src.db_dao import EarthFighterDAO
+from src.db_dao import EarthFighterDAO, InviteCodeConflict
+from db_async import AsyncEarthFighterDAO
+from db_local import ThreadLocalDAO
+import request_context
 
 class TestEarthFighterDAO(unittest.TestCase):
     @classmethod
@@ -35,10 +42,22 @@ class TestEarthFighterDAO(unittest.TestCase):
         self.cursor.execute("DELETE FROM user_org_relations")
         self.cursor.execute("DELETE FROM user_role")
         self.cursor.execute("DELETE FROM tasks")
+        self.cursor.execute("DELETE FROM tasks_archive")
+        self.cursor.execute("DELETE FROM org_task_counters")
+        self.cursor.execute("DELETE FROM user_task_counters")
+        self.cursor.execute("DELETE FROM member_scores")
+        self.cursor.execute("DELETE FROM task_templates")
+        self.cursor.execute("DELETE FROM organization_shards")
+        self.cursor.execute("DELETE FROM organization_closure")
+        self.cursor.execute("UPDATE organizations SET parent_id = NULL")
         self.cursor.execute("DELETE FROM organizations")
         self.cursor.execute("DELETE FROM users")
         # self.cursor.execute("DELETE FROM roles")
         self.db.commit()
+        # 清空表不经过 DAO，丢弃之前缓存的查询结果
+        self.dao.flights.invalidate()
+        if self.dao.cache is not None:
+            self.dao.cache.clear()
 
     def test_clear_database(self):
         return
@@ -143,6 +162,42 @@ class TestEarthFighterDAO(unittest.TestCase):
         is_deleted = self.cursor.fetchone()[0]
         self.assertEqual(is_deleted, 1)
 
+    def test_organization_hierarchy(self):
+        u_id = self.dao.add_user("test_user", "test_password")
+        country = self.dao.add_organization("country", "country", u_id, "code1")
+        school_a = self.dao.add_organization("school_a", "school", u_id, "code2", country)
+        school_b = self.dao.add_organization("school_b", "school", u_id, "code3", country)
+        family = self.dao.add_organization("family", "family", u_id, "code4", school_a)
+        self.dao.add_user_to_organization(u_id, family)
+        # 已删除的成员不计入成员列表和成员数
+        deleted_id = self.dao.add_user("deleted_user", "test_password")
+        self.dao.add_user_to_organization(deleted_id, school_b)
+        self.dao.delete_user(deleted_id)
+        self.dao.publish_task("task_name", u_id, None, 0, 3600, family, "task_desc")
+        self.dao.publish_task("task_name", u_id, None, 0, 3600, school_b, "task_desc")
+
+        self.assertTrue(self.dao.is_descendant_organization(family, country))
+        self.assertFalse(self.dao.is_descendant_organization(country, family))
+        self.assertEqual(len(self.dao.get_subtree_tasks(country)), 2)
+        self.assertEqual(len(self.dao.get_subtree_tasks(school_a, task_state=0)), 1)
+        self.assertEqual(self.dao.get_subtree_members(country), [{"user_id": u_id, "username": "test_user"}])
+        stats = self.dao.get_subtree_stats(country)
+        self.assertEqual(stats['organization_count'], 4)
+        self.assertEqual(stats['member_count'], 1)
+        self.assertEqual(stats['task_counts'], {0: 2})
+
+        # 移动子树
+        self.dao.move_organization(family, school_b)
+        self.assertEqual(len(self.dao.get_subtree_tasks(school_a)), 0)
+        self.assertEqual(len(self.dao.get_subtree_tasks(school_b)), 2)
+        self.assertEqual(self.dao.get_organization(family)['parent_id'], school_b)
+
+        # 删除中间组织后子组织上移
+        self.dao.delete_organization(school_b)
+        self.assertTrue(self.dao.is_descendant_organization(family, country))
+        self.assertEqual(self.dao.get_organization(family)['parent_id'], country)
+        self.cursor.execute("SELECT depth FROM organization_closure WHERE ancestor_id = %s AND descendant_id = %s", (country, family))
+        self.assertEqual(self.cursor.fetchone()[0], 1)
 
     def test_publish_task(self):
         publisher_id = self.dao.add_user("publisher", "publisher_password")
@@ -156,6 +211,17 @@ class TestEarthFighterDAO(unittest.TestCase):
         self.assertEqual(task[3], None)
         self.assertEqual(task[4], 0)
 
+    def test_publish_tasks(self):
+        publisher_id = self.dao.add_user("publisher", "publisher_password")
+        org_id = self.dao.add_organization("test_org", "test_type", publisher_id, "test_invite_code")
+        tasks = [{"task_name": f"task_{i}", "time_limit": 3600, "task_desc": "task_desc"} for i in range(5)]
+        task_ids = self.dao.publish_tasks(tasks, publisher_id, 0, org_id)
+        self.assertEqual(len(task_ids), 5)
+        self.cursor.execute("SELECT task_id, task_name FROM tasks WHERE c_id = %s ORDER BY task_id", (org_id,))
+        rows = self.cursor.fetchall()
+        self.assertEqual([row[0] for row in rows], task_ids)
+        self.assertEqual([row[1] for row in rows], [task['task_name'] for task in tasks])
+
     def test_update_task_status(self):
         publisher_id = self.dao.add_user("publisher", "publisher_password")
         receiver_id = self.dao.add_user("receiver", "receiver_password")
@@ -182,6 +248,195 @@ class TestEarthFighterDAO(unittest.TestCase):
         self.assertEqual(task[4], task_state)
         self.assertEqual(task[3], receiver_id)
 
+    def test_expire_tasks(self):
+        publisher_id = self.dao.add_user("publisher", "publisher_password")
+        org_id = self.dao.add_organization("test_org", "test_type", publisher_id, "test_invite_code")
+        task_id1 = self.dao.publish_task("task_name_1", publisher_id, None, 0, 3600, org_id, "task_desc")
+        task_id2 = self.dao.publish_task("task_name_2", publisher_id, None, 2, 3600, org_id, "task_desc")
+        self.dao.publish_task("task_name_3", publisher_id, None, 0, 0, org_id, "task_desc")
+
+        deadlines = dict(self.dao.get_task_deadlines([0, 1]))
+        self.assertEqual(list(deadlines), [task_id1])
+        self.assertAlmostEqual(deadlines[task_id1], self.dao.get_db_timestamp() + 3600, delta=5)
+
+        # 已离开活动状态的任务不会被标记为过期
+        rows_affected = self.dao.expire_tasks([task_id1, task_id2], 3, [0, 1])
+        self.assertEqual(rows_affected, 1)
+        self.assertEqual(self.dao.get_task_status(task_id1), 3)
+        self.assertEqual(self.dao.get_task_status(task_id2), 2)
+
+    def test_claim_next_task(self):
+        publisher_id = self.dao.add_user("publisher", "publisher_password")
+        receiver_id = self.dao.add_user("receiver", "receiver_password")
+        org_id = self.dao.add_organization("test_org", "test_type", publisher_id, "test_invite_code")
+        task_id1 = self.dao.publish_task("task_name_1", publisher_id, None, 0, 3600, org_id, "task_desc")
+        task_id2 = self.dao.publish_task("task_name_2", publisher_id, None, 0, 3600, org_id, "task_desc", priority=5)
+        task_id3 = self.dao.publish_task("task_name_3", publisher_id, None, 0, 3600, org_id, "task_desc")
+
+        # 优先级高的先领取，同优先级按发布顺序领取
+        self.assertEqual(self.dao.claim_next_task(org_id, receiver_id, 0, 1), task_id2)
+        self.assertEqual(self.dao.claim_next_task(org_id, receiver_id, 0, 1), task_id1)
+        self.assertEqual(self.dao.claim_next_task(org_id, receiver_id, 0, 1), task_id3)
+        self.assertIsNone(self.dao.claim_next_task(org_id, receiver_id, 0, 1))
+        task = self.dao.get_task_by_id(task_id2)
+        self.assertEqual(task['task_state'], 1)
+        self.assertEqual(task['receiver_id'], receiver_id)
+        self.assertEqual(task['priority'], 5)
+
+    def test_complete_task(self):
+        publisher_id = self.dao.add_user("publisher", "publisher_password")
+        org_id = self.dao.add_organization("test_org", "test_type", publisher_id, "test_invite_code")
+        task_id1 = self.dao.publish_task("task_name_1", publisher_id, None, 6, 3600, org_id, "task_desc")
+        task_id2 = self.dao.publish_task("task_name_2", publisher_id, None, 6, 3600, org_id, "task_desc")
+        self.cursor.execute("UPDATE tasks SET publish_time = NOW() - INTERVAL 2 HOUR WHERE task_id = %s", (task_id2,))
+        self.db.commit()
+
+        self.assertEqual(self.dao.complete_task(task_id1, 6, 2, 4), 2)
+        self.assertEqual(self.dao.complete_task(task_id2, 6, 2, 4), 4)
+        self.assertIsNone(self.dao.complete_task(task_id1, 6, 2, 4))
+        self.assertIsNotNone(self.dao.get_task_by_id(task_id1)['completion_time'])
+
+    def test_task_counters(self):
+        publisher_id = self.dao.add_user("publisher", "publisher_password")
+        receiver_id = self.dao.add_user("receiver", "receiver_password")
+        org_id = self.dao.add_organization("test_org", "test_type", publisher_id, "test_invite_code")
+        task_id1 = self.dao.publish_task("task_name_1", publisher_id, None, 0, 3600, org_id, "task_desc")
+        task_id2 = self.dao.publish_task("task_name_2", publisher_id, None, 0, 3600, org_id, "task_desc")
+        self.dao.publish_tasks([{"task_name": "task_name_3", "time_limit": 0, "task_desc": "task_desc"}], publisher_id, 0, org_id)
+        self.assertEqual(self.dao.get_organization_task_counters(org_id), {0: 3})
+
+        # 状态流转时旧状态减一、新状态加一，用户计数按接收者统计
+        self.dao.update_task_status_and_receiver(task_id1, 1, receiver_id)
+        self.dao.update_task_status(task_id1, 6)
+        self.assertEqual(self.dao.complete_task(task_id1, 6, 2, 4), 2)
+        self.dao.expire_tasks([task_id2], 3, [0, 1])
+        self.assertEqual(self.dao.get_organization_task_counters(org_id), {0: 1, 2: 1, 3: 1})
+        self.assertEqual(self.dao.get_user_task_counters(receiver_id), {2: 1})
+
+        self.dao.delete_task(task_id1)
+        self.assertEqual(self.dao.get_organization_task_counters(org_id), {0: 1, 3: 1})
+        self.assertEqual(self.dao.get_user_task_counters(receiver_id), {})
+
+        # 重建后的计数与增量维护的结果一致
+        self.dao.rebuild_task_counters()
+        self.assertEqual(self.dao.get_organization_task_counters(org_id), {0: 1, 3: 1})
+
+    def test_member_scores(self):
+        publisher_id = self.dao.add_user("publisher", "publisher_password")
+        receiver_id = self.dao.add_user("receiver", "receiver_password")
+        org_id = self.dao.add_organization("test_org", "test_type", publisher_id, "test_invite_code")
+        task_id1 = self.dao.publish_task("task_name_1", publisher_id, receiver_id, 6, 3600, org_id, "task_desc")
+        task_id2 = self.dao.publish_task("task_name_2", publisher_id, receiver_id, 6, 3600, org_id, "task_desc")
+        self.cursor.execute("UPDATE tasks SET publish_time = NOW() - INTERVAL 2 HOUR WHERE task_id = %s", (task_id2,))
+        self.db.commit()
+
+        # 只有按时完成的任务计分
+        completed_at = datetime.datetime(2024, 2, 1, 12, 0, 0)
+        self.assertEqual(self.dao.complete_task(task_id1, 6, 2, 4, ["all", "2024-W05"], completed_at), 2)
+        self.assertEqual(self.dao.complete_task(task_id2, 6, 2, 4, ["all", "2024-W06"]), 4)
+        self.assertEqual(self.dao.get_task_by_id(task_id1)['completion_time'], completed_at)
+        self.assertEqual(self.dao.get_member_scores(org_id, "all"), [(receiver_id, 1)])
+        self.assertEqual(self.dao.get_member_scores(org_id, "2024-W05"), [(receiver_id, 1)])
+        self.assertEqual(self.dao.get_user_names([receiver_id]), {receiver_id: "receiver"})
+
+        # 周积分按完成时间计算，重建后仍在同一周
+        self.dao.rebuild_member_scores(2)
+        self.assertEqual(self.dao.get_member_scores(org_id, "all"), [(receiver_id, 1)])
+        self.assertEqual(self.dao.get_member_scores(org_id, "2024-W05"), [(receiver_id, 1)])
+
+    def test_search_tasks(self):
+        publisher_id = self.dao.add_user("publisher", "publisher_password")
+        org_id = self.dao.add_organization("test_org", "test_type", publisher_id, "test_invite_code")
+        other_org_id = self.dao.add_organization("other_org", "test_type", publisher_id, "other_invite_code")
+        task_id1 = self.dao.publish_task("清理河道垃圾", publisher_id, None, 0, 3600, org_id, "周末一起去河边捡垃圾")
+        self.dao.publish_task("植树活动", publisher_id, None, 0, 3600, org_id, "在公园种树")
+        self.dao.publish_task("清理河道垃圾", publisher_id, None, 0, 3600, other_org_id, "其他组织的任务")
+
+        tasks = self.dao.search_tasks(org_id, "垃圾")
+        self.assertEqual([task['task_id'] for task in tasks], [task_id1])
+        self.assertGreater(tasks[0]['relevance'], 0)
+        # 单字关键词退化为 LIKE 匹配
+        self.assertEqual(len(self.dao.search_tasks(org_id, "树")), 1)
+        self.assertEqual(self.dao.search_tasks(org_id, "不存在"), [])
+
+    def test_search_users_by_prefix(self):
+        alice_id = self.dao.add_user("alice", "test_password")
+        alina_id = self.dao.add_user("alina", "test_password")
+        deleted_id = self.dao.add_user("alison", "test_password")
+        self.dao.add_user("bob", "test_password")
+        self.dao.add_user("al_x", "test_password")
+        self.dao.delete_user(deleted_id)
+
+        users = self.dao.search_users_by_prefix("ali", 10)
+        self.assertEqual([user['user_id'] for user in users], [alice_id, alina_id])
+        self.assertEqual(len(self.dao.search_users_by_prefix("ali", 1)), 1)
+        # 通配符按字面匹配
+        self.assertEqual([user['username'] for user in self.dao.search_users_by_prefix("al_", 10)], ["al_x"])
+
+    def test_invite_codes(self):
+        creator_id = self.dao.add_user("creator", "test_password")
+        joiner_id = self.dao.add_user("joiner", "test_password")
+        c_id = self.dao.add_organization("test_org", "test_type", creator_id, "CODE1", invite_ttl=3600)
+        self.assertIsNotNone(self.dao.get_organization(c_id)['invite_expire_time'])
+
+        # 邀请码唯一
+        with self.assertRaises(InviteCodeConflict):
+            self.dao.add_organization("other_org", "test_type", creator_id, "CODE1")
+
+        # 凭邀请码加入，重复加入不会重复写入
+        self.assertEqual(self.dao.join_organization_by_invite_code(joiner_id, "CODE1"), (c_id, True))
+        self.assertEqual(self.dao.join_organization_by_invite_code(joiner_id, "CODE1"), (c_id, False))
+        self.assertEqual(self.dao.join_organization_by_invite_code(joiner_id, "NOCODE"), (None, False))
+
+        # 更换后旧邀请码失效
+        self.assertEqual(self.dao.rotate_invite_code(c_id, "CODE2"), 1)
+        self.assertIsNone(self.dao.get_organization_id_by_invite_code("CODE1"))
+        self.assertEqual(self.dao.get_organization_id_by_invite_code("CODE2"), c_id)
+        self.assertIsNone(self.dao.get_organization(c_id)['invite_expire_time'])
+
+        # 过期的邀请码无法使用
+        self.cursor.execute("UPDATE organizations SET invite_expire_time = NOW() - INTERVAL 1 SECOND WHERE c_id = %s", (c_id,))
+        self.db.commit()
+        self.assertIsNone(self.dao.get_organization_id_by_invite_code("CODE2"))
+
+    def test_archive_tasks(self):
+        publisher_id = self.dao.add_user("publisher", "publisher_password")
+        org_id = self.dao.add_organization("test_org", "test_type", publisher_id, "test_invite_code")
+        old_done = self.dao.publish_task("old_done", publisher_id, None, 2, 3600, org_id, "task_desc")
+        old_pending = self.dao.publish_task("old_pending", publisher_id, None, 0, 3600, org_id, "task_desc")
+        new_done = self.dao.publish_task("new_done", publisher_id, None, 2, 3600, org_id, "task_desc")
+        self.cursor.execute("UPDATE tasks SET publish_time = NOW() - INTERVAL 100 DAY WHERE task_id IN (%s, %s)", (old_done, old_pending))
+        self.db.commit()
+
+        # 只归档主键区间内已结束且超过保留期的任务
+        min_id, max_id = self.dao.get_task_id_range()
+        self.assertEqual(self.dao.archive_tasks(min_id - 1, max_id, [2, 7], 90), 1)
+        self.assertIsNone(self.dao.get_task_by_id(old_done))
+        self.assertIsNotNone(self.dao.get_task_by_id(old_pending))
+        self.assertIsNotNone(self.dao.get_task_by_id(new_done))
+        history = self.dao.get_archived_tasks(org_id)
+        self.assertEqual([task['task_id'] for task in history], [old_done])
+        self.assertEqual(history[0]['task_name'], "old_done")
+
+        # 归档的任务仍计入统计
+        self.dao.rebuild_task_counters()
+        self.assertEqual(self.dao.get_organization_task_counters(org_id), {0: 1, 2: 2})
+
+    def test_get_tasks_since(self):
+        publisher_id = self.dao.add_user("publisher", "publisher_password")
+        org_id = self.dao.add_organization("test_org", "test_type", publisher_id, "test_invite_code")
+        old_task = self.dao.publish_task("old_task", publisher_id, None, 0, 3600, org_id, "task_desc")
+        new_task = self.dao.publish_task("new_task", publisher_id, None, 0, 3600, org_id, "task_desc")
+        self.cursor.execute("UPDATE tasks SET publish_time = NOW() - INTERVAL 40 DAY WHERE task_id = %s", (old_task,))
+        self.db.commit()
+
+        # 按发布时间下界过滤，分区表上只扫描相应的分区
+        since = datetime.datetime.now() - datetime.timedelta(days=30)
+        self.assertEqual([task['task_id'] for task in self.dao.get_tasks_by_organization(org_id, since)], [new_task])
+        self.assertEqual([task['task_id'] for task in self.dao.get_tasks_by_user(publisher_id, since)], [new_task])
+        self.assertEqual([task['task_id'] for task in self.dao.get_subtree_tasks(org_id, since=since)], [new_task])
+        self.assertEqual(len(self.dao.get_tasks_by_organization(org_id)), 2)
+
     def test_get_task_status(self):
         publisher_id = self.dao.add_user("publisher", "publisher_password")
         receiver_id = self.dao.add_user("receiver", "receiver_password")
@@ -198,6 +453,18 @@ class TestEarthFighterDAO(unittest.TestCase):
         relation = self.cursor.fetchone()
         self.assertIsNotNone(relation)
 
+    def test_add_users_to_organization(self):
+        creator_id = self.dao.add_user("creator", "test_password")
+        user_ids = [self.dao.add_user(f"user_{i}", "test_password") for i in range(3)]
+        c_id = self.dao.add_organization("test_org", "test_type", creator_id, "test_invite_code")
+        self.dao.add_user_to_organization(user_ids[0], c_id)
+
+        self.assertEqual(self.dao.get_user_ids_by_names(["user_1", "nobody"]), {"user_1": user_ids[1]})
+        self.assertEqual(self.dao.get_existing_user_ids(user_ids + [0]), set(user_ids))
+        self.assertEqual(self.dao.get_organization_member_ids(c_id, user_ids), {user_ids[0]})
+        self.assertEqual(self.dao.add_users_to_organization(user_ids, c_id), 2)
+        self.assertEqual(self.dao.get_organization_member_ids(c_id, user_ids), set(user_ids))
+
     def test_remove_user_from_organization(self):
         u_id = self.dao.add_user("test_user", "test_password")
         c_id = self.dao.add_organization("test_org", "test_type", u_id, "test_invite_code")
@@ -291,8 +558,8 @@ class TestEarthFighterDAO(unittest.TestCase):
         org_list = self.dao.get_user_organizations(u_id)
         self.assertEqual(len(org_list), 0)
         
-        org_id1 = self.dao.add_organization("c_name_1", "family", u_id, 'code')
-        org_id2 = self.dao.add_organization("c_name_2", "family", u_id, 'code')
+        org_id1 = self.dao.add_organization("c_name_1", "family", u_id, 'code1')
+        org_id2 = self.dao.add_organization("c_name_2", "family", u_id, 'code2')
         self.dao.add_user_to_organization(u_id, org_id1)
         org_list = self.dao.get_user_organizations(u_id) 
         self.assertEqual(len(org_list), 1)
@@ -303,11 +570,11 @@ class TestEarthFighterDAO(unittest.TestCase):
         self.assertEqual(org_list[0]['c_id'], org_id1)
         self.assertEqual(org_list[0]['c_name'], 'c_name_1')
         self.assertEqual(org_list[0]['c_type'], 'family')
-        self.assertEqual(org_list[0]['invite_code'], 'code')
+        self.assertEqual(org_list[0]['invite_code'], 'code1')
         self.assertEqual(org_list[1]['c_id'], org_id2)
         self.assertEqual(org_list[1]['c_name'], 'c_name_2')
         self.assertEqual(org_list[1]['c_type'], 'family')
-        self.assertEqual(org_list[1]['invite_code'], 'code')
+        self.assertEqual(org_list[1]['invite_code'], 'code2')
 
     def test_get_tasks_by_organization(self):
         # 创建用户
@@ -343,9 +610,219 @@ class TestEarthFighterDAO(unittest.TestCase):
         task_id = self.dao.publish_task("task_name_2", u_id, None, 0, 3600, org_id1, "task_desc")
         task_list = self.dao.get_tasks_by_user(u_id)
         self.assertEqual(len(task_list), 2)
+        # 限制数量时只返回最新的任务
+        task_list = self.dao.get_tasks_by_user(u_id, limit=1)
+        self.assertEqual([task['task_id'] for task in task_list], [task_id])
 
         task_list = self.dao.get_tasks_by_user(0)
         self.assertEqual(len(task_list), 0)
+
+    def test_get_task_counts_by_organizations(self):
+        u_id = self.dao.add_user("test_user", "test_password")
+        org_id1 = self.dao.add_organization("c_name_1", "family", u_id, 'code1')
+        org_id2 = self.dao.add_organization("c_name_2", "family", u_id, 'code2')
+        self.dao.publish_task("task_name_1", u_id, None, 0, 3600, org_id1, "task_desc")
+        self.dao.publish_task("task_name_2", u_id, None, 0, 3600, org_id1, "task_desc")
+        task_id = self.dao.publish_task("task_name_3", u_id, None, 0, 3600, org_id2, "task_desc")
+        self.dao.update_task_status_and_receiver(task_id, 1, u_id)
+
+        counts = self.dao.get_task_counts_by_organizations([org_id1, org_id2], [0, 1])
+        self.assertEqual(counts[org_id1][0], 2)
+        self.assertEqual(counts[org_id2][1], 1)
+        self.assertNotIn(0, counts[org_id2])
+        self.assertEqual(self.dao.get_task_counts_by_organizations([], [0, 1]), {})
+
+    def test_transaction_rollback(self):
+        u_id = self.dao.add_user("test_user", "test_password")
+        c_id = self.dao.add_organization("test_org", "test_type", u_id, "test_invite_code")
+        with self.assertRaises(RuntimeError):
+            with self.dao.transaction():
+                self.dao.publish_task("task_name", u_id, None, 0, 3600, c_id, "task_desc")
+                raise RuntimeError("rollback")
+        self.assertEqual(len(self.dao.get_tasks_by_organization(c_id)), 0)
+
+        with self.dao.transaction():
+            self.dao.publish_task("task_name", u_id, None, 0, 3600, c_id, "task_desc")
+        self.assertEqual(len(self.dao.get_tasks_by_organization(c_id)), 1)
+
+    def test_read_your_writes(self):
+        request_context.begin("1")
+        try:
+            self.assertFalse(request_context.should_read_primary(5))
+            u_id = self.dao.add_user("test_user", "test_password")
+            # 写入后本请求和该用户在窗口期内的读取都走主库
+            self.assertTrue(request_context.should_read_primary(5))
+            self.assertEqual(self.dao.get_user_base_info(u_id)["username"], "test_user")
+            request_context.end()
+            request_context.begin("1")
+            self.assertTrue(request_context.should_read_primary(5))
+            self.assertFalse(request_context.should_read_primary(0))
+            # 写入发生在其他工作进程时，通过共享缓存中的写入时间判断
+            request_context._last_writes.clear()
+            self.assertFalse(request_context.should_read_primary(5))
+            self.assertTrue(self.dao._read_own_writes())
+        finally:
+            request_context.end()
+
+    def test_organization_shards(self):
+        self.assertIsNone(self.dao.get_organization_shard(1))
+        self.dao.set_organization_shard(1, "shard0", True)
+        self.dao.set_organization_shard(2, "shard0")
+        self.assertEqual(self.dao.get_organization_shard(1), ("shard0", True))
+        self.dao.set_organization_shard(1, "shard1")
+        self.assertEqual(self.dao.get_organization_shard(1), ("shard1", False))
+        self.assertEqual(self.dao.get_shard_organization_counts(), {"shard0": 1, "shard1": 1})
+
+    def test_copy_organization_rows(self):
+        u_id = self.dao.add_user("test_user", "test_password")
+        c_id = self.dao.add_organization("test_org", "test_type", u_id, "test_invite_code")
+        child_id = self.dao.add_organization("child_org", "test_type", u_id, "child_code", c_id)
+        task_id = self.dao.publish_task("task_name", u_id, None, 0, 3600, child_id, "task_desc")
+        self.dao.update_task_status_and_receiver(task_id, 1, u_id)
+        self.assertEqual(self.dao.get_subtree_organization_ids(c_id), [c_id, child_id])
+
+        columns, rows = self.dao.fetch_rows("tasks", "c_id", [c_id, child_id], "task_id", 10)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][columns.index("task_id")], task_id)
+        # 扣除后再计入，模拟迁移时源分片和目标分片的用户计数调整
+        self.dao.adjust_user_task_counters([child_id], -1)
+        self.assertEqual(self.dao.get_user_task_counters(u_id), {})
+        self.dao.adjust_user_task_counters([child_id], 1)
+        self.assertEqual(self.dao.get_user_task_counters(u_id), {1: 1})
+
+        self.assertEqual(self.dao.delete_rows("tasks", "c_id", [child_id]), 1)
+        self.assertIsNone(self.dao.get_task_by_id(task_id))
+        self.assertEqual(self.dao.upsert_rows("tasks", columns, rows), 1)
+        self.assertEqual(self.dao.get_task_by_id(task_id)['receiver_id'], u_id)
+
+    def test_failover_stats(self):
+        with open('config/db_config.json') as config_file:
+            config = json.load(config_file)
+        stats = self.dao.get_failover_stats()
+        self.assertEqual(stats['active_host'], f"{config['host']}:{config.get('port', 3306)}")
+        self.assertEqual(stats['connected_host'], stats['active_host'])
+        self.assertTrue(stats['hosts'][0]['healthy'])
+        # 重新连接同一主机不计为故障转移
+        self.dao.connect()
+        self.assertEqual(self.dao.get_failover_stats()['failover_count'], stats['failover_count'])
+
+    def test_request_deadline(self):
+        u_id = self.dao.add_user("test_user", "test_password")
+        request_context.begin(None, 5)
+        try:
+            # 未超时的查询带执行时间提示正常执行
+            self.assertEqual(self.dao.get_tasks_by_user(u_id), [])
+        finally:
+            request_context.end()
+        request_context.begin(None, 0.001)
+        try:
+            time.sleep(0.01)
+            with self.assertRaises(request_context.DeadlineExceeded):
+                self.dao.get_tasks_by_user(u_id)
+            self.assertTrue(request_context.deadline_exceeded())
+        finally:
+            request_context.end()
+
+    def test_single_flight(self):
+        u_id = self.dao.add_user("test_user", "test_password")
+        c_id = self.dao.add_organization("test_org", "test_type", u_id, "test_invite_code")
+        executed, shared = self.dao.flights.executed, self.dao.flights.shared
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.dao.get_tasks_by_organization(c_id)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [[]] * 10)
+        # 并发和短时间内的重复查询只执行了一次
+        self.assertEqual(self.dao.flights.executed - executed, 1)
+        self.assertEqual(self.dao.flights.shared - shared, 9)
+        # 写入后重新查询
+        task_id = self.dao.publish_task("task_name", u_id, u_id, 1, 3600, c_id, "task_desc")
+        self.assertEqual([task['task_id'] for task in self.dao.get_tasks_by_organization(c_id)], [task_id])
+
+    def test_shared_cache(self):
+        if self.dao.cache is None:
+            self.skipTest("未配置共享缓存")
+        u_id = self.dao.add_user("test_user", "test_password")
+        c_id = self.dao.add_organization("test_org", "test_type", u_id, "test_invite_code")
+        self.assertEqual(self.dao.get_organization(c_id)['invite_code'], "test_invite_code")
+        hits = self.dao.cache.hits
+        self.dao.flights.invalidate()
+        self.assertEqual(self.dao.get_organization(c_id)['invite_code'], "test_invite_code")
+        self.assertEqual(self.dao.cache.hits, hits + 1)
+        # 写操作提交后缓存失效
+        self.dao.rotate_invite_code(c_id, "new_invite_code")
+        self.assertEqual(self.dao.get_organization(c_id)['invite_code'], "new_invite_code")
+        self.assertEqual(self.dao.get_user_base_info(u_id)['username'], "test_user")
+        self.dao.update_user(u_id, "new_user")
+        self.assertEqual(self.dao.get_user_base_info(u_id)['username'], "new_user")
+
+    def test_async_dao(self):
+        u_id = self.dao.add_user("test_user", "test_password")
+        c_id = self.dao.add_organization("test_org", "test_type", u_id, "test_invite_code")
+        async_dao = AsyncEarthFighterDAO(2, EarthFighterDAO)
+
+        async def check():
+            return await asyncio.gather(async_dao.get_organization(c_id),
+                                        async_dao.is_user_in_organization(u_id, c_id))
+        try:
+            org_info, is_member = asyncio.run(check())
+            self.assertEqual(org_info['c_name'], "test_org")
+            self.assertFalse(is_member)
+            # 多步操作在同一连接上执行
+            asyncio.run(async_dao.run(lambda dao: dao.add_user_to_organization(u_id, c_id)))
+            self.assertTrue(self.dao.is_user_in_organization(u_id, c_id))
+        finally:
+            async_dao.close()
+
+    def test_thread_local_dao(self):
+        local_dao = ThreadLocalDAO(EarthFighterDAO)
+        connection_ids = []
+
+        def work():
+            with local_dao.transaction():
+                connection_ids.append(local_dao.db.connection_id)
+        try:
+            threads = [threading.Thread(target=work) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # 每个线程使用自己的连接，同一线程多次调用使用同一个 DAO
+            self.assertEqual(len(set(connection_ids)), 2)
+            self.assertIs(local_dao.current(), local_dao.current())
+        finally:
+            local_dao.close()
+
+    def test_task_templates(self):
+        u_id = self.dao.add_user("test_user", "test_password")
+        c_id = self.dao.add_organization("test_org", "test_type", u_id, "test_invite_code")
+        now = self.dao.get_db_now().replace(microsecond=0)
+        template_id = self.dao.add_task_template(c_id, u_id, "task_name", "task_desc", 3600, 0, "0 * * * *", [u_id], now)
+        template = self.dao.get_task_template(template_id)
+        self.assertEqual(template['assignees'], [u_id])
+        self.assertEqual(len(self.dao.get_task_templates(c_id)), 1)
+
+        with self.dao.transaction():
+            templates = self.dao.claim_due_templates(now, 10)
+            self.assertEqual([item['template_id'] for item in templates], [template_id])
+            occurrence = {
+                "task_name": "task_name", "publisher_id": u_id, "receiver_id": u_id, "task_state": 1,
+                "publish_time": now, "time_limit": 3600, "c_id": c_id, "task_desc": "task_desc",
+                "priority": 0, "template_id": template_id
+            }
+            self.assertEqual(self.dao.insert_task_occurrences([occurrence]), 1)
+            # 同一发布时间重复生成会被忽略
+            self.assertEqual(self.dao.insert_task_occurrences([occurrence]), 0)
+            self.dao.advance_templates([(template_id, now + datetime.timedelta(hours=1), 1)])
+        self.assertEqual(self.dao.get_task_template(template_id)['rotation_index'], 1)
+        self.assertEqual(self.dao.claim_due_templates(now, 10), [])
+        self.assertEqual(self.dao.get_tasks_by_organization(c_id)[0]['template_id'], template_id)
+
+        self.assertEqual(self.dao.delete_task_template(template_id), 1)
+        self.assertIsNone(self.dao.get_task_template(template_id))
    
 if __name__ == '__main__':
     unittest.main()